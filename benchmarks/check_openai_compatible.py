@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# check_openai_compatible.py
+#
+# Round trips of the self-hosted backend (services.openai_compatible_services)
+# against benchmarks/stub_openai_server.py on a free local port: a plain and a
+# streamed answer, a batched answer, an error response, and a call abandoned
+# at its deadline, which must give its concurrency slot back right away.
+# Run from the repository root:  python -m benchmarks.check_openai_compatible
+#
+# No network access is needed; exits with 1 when a check fails.
+
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from benchmarks.stub_openai_server import StubHandler, serve  # noqa: E402
+from services.cancellation import RequestTimeoutError  # noqa: E402
+from services.client_pool import ModelEndpoint  # noqa: E402
+from services.openai_compatible_services import OpenAICompatibleAltTextGenerator  # noqa: E402
+from utils.image_payload import ImagePayload  # noqa: E402
+
+
+PROMPT = "Activity: Plumber | Address: Lyon | number_of_suggestions: 2 | max_length: 60"
+EXPECTED = {"1": "Photo 1, vue 1 à Lyon", "2": "Photo 1, vue 2 à Lyon"}
+
+
+def _image() -> ImagePayload:
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), (200, 120, 40)).save(buffer, "JPEG")
+    return ImagePayload(buffer.getvalue(), "image/jpeg")
+
+
+def _check(name: str, ok: bool, detail="") -> int:
+    print(f"{'ok  ' if ok else 'FAIL'} {name}{f': {detail}' if detail and not ok else ''}")
+    return 0 if ok else 1
+
+
+def run_checks(base_url: str) -> int:
+    image = _image()
+    failures = 0
+
+    endpoint = ModelEndpoint(OpenAICompatibleAltTextGenerator, base_url, "stub-plain")
+    answer = endpoint(image, PROMPT)
+    failures += _check("round trip", answer == EXPECTED, answer)
+
+    streamed = []
+    answer = endpoint(image, PROMPT, on_suggestion=lambda key, text: streamed.append(key))
+    failures += _check("streamed round trip", answer == EXPECTED and streamed == ["1", "2"], (answer, streamed))
+
+    batch = ModelEndpoint(OpenAICompatibleAltTextGenerator, base_url, "stub-batch", max_images_per_call=2)
+    answer = batch.generate_batch([image, image], PROMPT)
+    failures += _check("batched round trip", sorted(answer) == ["1", "2"] and answer["2"]["1"].startswith("Photo 2"),
+                       answer)
+
+    missing = ModelEndpoint(OpenAICompatibleAltTextGenerator, f"{base_url}/missing", "stub-error")
+    try:
+        answer = missing(image, PROMPT)
+        failures += _check("error response", False, f"no error, got {answer!r}")
+    except RuntimeError as e:
+        failures += _check("error response", "404" in str(e), e)
+
+    StubHandler.delay = 2.0
+    try:
+        slow = ModelEndpoint(OpenAICompatibleAltTextGenerator, base_url, "stub-slow", max_concurrency=1, deadline=0.3)
+        try:
+            slow(image, PROMPT)
+            timed_out = False
+        except RequestTimeoutError:
+            timed_out = True
+        slots = slow.generator._slots
+        slot_free = slots.acquire(blocking=False)
+        if slot_free:
+            slots.release()
+        failures += _check("deadline frees the slot", timed_out and slot_free, (timed_out, slot_free))
+    finally:
+        StubHandler.delay = 0.0
+    return failures
+
+
+if __name__ == "__main__":
+    server = serve(0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        failed = run_checks(f"http://127.0.0.1:{server.server_address[1]}/v1")
+    finally:
+        server.shutdown()
+        server.server_close()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# json_extraction.py
+#
+# Corpus, fuzz run and timing for services.json_extraction.
+# Run from the repository root:  python -m benchmarks.json_extraction
+#
+# The corpus collects answer shapes seen from the Gemini, Gemma, HuggingFace
+# and g4f backends; each case lists the suggestions it must yield (None when
+# the answer holds no usable object and extraction must raise ValueError).
+
+import random
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.json_extraction import extract_json_object  # noqa: E402
+
+
+CORPUS = [
+    # Plain answers
+    ('{"1": "Atelier de menuiserie à Lyon", "2": "Menuisier au travail à Lyon"}',
+     {"1": "Atelier de menuiserie à Lyon", "2": "Menuisier au travail à Lyon"}),
+    ('{"1": "Façade rénovée à Nantes"}', {"1": "Façade rénovée à Nantes"}),
+    ('{"1": "Salon de coiffure à Lille", "2": "Coiffeuse à Lille", "3": "Bac à shampoing à Lille"}',
+     {"1": "Salon de coiffure à Lille", "2": "Coiffeuse à Lille", "3": "Bac à shampoing à Lille"}),
+    # Markdown fences (Gemini, g4f)
+    ('```json\n{\n  "1": "Cuisine équipée à Rennes",\n  "2": "Plan de travail à Rennes"\n}\n```\n',
+     {"1": "Cuisine équipée à Rennes", "2": "Plan de travail à Rennes"}),
+    ('```\n{"1": "Toiture en ardoise à Brest"}\n```', {"1": "Toiture en ardoise à Brest"}),
+    # Preamble and trailing commentary (HF, g4f)
+    ('Voici les descriptions demandées :\n{"1": "Garage automobile à Metz", "2": "Pont élévateur à Metz"}\n'
+     'J\'espère que cela vous convient !',
+     {"1": "Garage automobile à Metz", "2": "Pont élévateur à Metz"}),
+    ('Sure! Here is the JSON:\n\n```json\n{"1": "Boulangerie artisanale à Caen"}\n```\nLet me know {if} you need more.',
+     {"1": "Boulangerie artisanale à Caen"}),
+    # Typographic quotes as delimiters (aya vision, Llama 4)
+    ('{“1”: “Plombier à Toulouse”, “2”: “Salle de bain rénovée à Toulouse”}',
+     {"1": "Plombier à Toulouse", "2": "Salle de bain rénovée à Toulouse"}),
+    ('{"1": “Jardin paysager à Nice”, "2": "Taille de haies à Nice"}',
+     {"1": "Jardin paysager à Nice", "2": "Taille de haies à Nice"}),
+    # Smart quotes and braces inside a properly quoted value stay untouched
+    ('{"1": "Enseigne “Chez Paul” à Dijon", "2": "Vitrine {bois} à Dijon"}',
+     {"1": "Enseigne “Chez Paul” à Dijon", "2": "Vitrine {bois} à Dijon"}),
+    ('{"1": "Carreleur \\"pro\\" à Reims"}', {"1": 'Carreleur "pro" à Reims'}),
+    # Trailing commas
+    ('{"1": "Peintre en bâtiment à Tours", "2": "Façade repeinte à Tours",}',
+     {"1": "Peintre en bâtiment à Tours", "2": "Façade repeinte à Tours"}),
+    ('{\n  "1": "Serrurier à Nîmes",\n}\n', {"1": "Serrurier à Nîmes"}),
+    # Raw newline inside a value
+    ('{"1": "Électricien à Pau,\ntableau électrique"}', {"1": "Électricien à Pau,\ntableau électrique"}),
+    # Two objects: the first one wins
+    ('{"1": "Fleuriste à Angers"} {"1": "autre"}', {"1": "Fleuriste à Angers"}),
+    # Batched answers (nested objects)
+    ('```json\n{"1": {"1": "Cave à vin à Bordeaux"}, "2": {"1": "Tonneaux à Bordeaux", "2": "Chai à Bordeaux",},}\n```',
+     {"1": {"1": "Cave à vin à Bordeaux"}, "2": {"1": "Tonneaux à Bordeaux", "2": "Chai à Bordeaux"}}),
+    # Unusable answers
+    ("Je ne peux pas décrire cette image.", None),
+    ('{"1": "Réponse tronquée à Li', None),
+    ("```json\n```", None),
+    ('["Atelier à Lyon"]', None),
+]
+
+
+def run_corpus() -> int:
+    failures = 0
+    for text, expected in CORPUS:
+        try:
+            result = extract_json_object(text)
+        except ValueError:
+            result = None
+        if result != expected:
+            failures += 1
+            print(f"MISMATCH\n  input:    {text!r}\n  expected: {expected!r}\n  got:      {result!r}")
+    print(f"corpus: {len(CORPUS) - failures}/{len(CORPUS)} cases passed")
+    return failures
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.random()
+        if operation < 0.4:
+            chars.insert(position, rng.choice('{}[]",:\\“”` \n'))
+        elif operation < 0.7 and chars:
+            del chars[min(position, len(chars) - 1)]
+        else:
+            chars[position:position] = list(rng.choice(["```json\n", "\n```", "Voici : ", ",", "}"]))
+    return "".join(chars)
+
+
+def run_fuzz(iterations: int = 20000, seed: int = 1234) -> int:
+    """Mutated corpus entries may parse or raise ValueError, but nothing else."""
+    rng = random.Random(seed)
+    crashes = 0
+    for _ in range(iterations):
+        text = mutate(rng.choice(CORPUS)[0], rng)
+        try:
+            extract_json_object(text)
+        except ValueError:
+            pass
+        except Exception as e:
+            crashes += 1
+            print(f"CRASH {type(e).__name__}: {e}\n  input: {text!r}")
+    print(f"fuzz: {iterations} mutated inputs, {crashes} unexpected exceptions")
+    return crashes
+
+
+def run_timing(repeat: int = 2000) -> None:
+    texts = [text for text, expected in CORPUS if expected is not None]
+    long_answer = "Voici : " + "x" * 20000 + '{"1": "' + "mot " * 5000 + '"}'
+    for label, inputs in (("corpus", texts), ("30 KB answer", [long_answer])):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in inputs:
+                extract_json_object(text)
+        elapsed = time.perf_counter() - started
+        print(f"timing ({label}): {elapsed / (repeat * len(inputs)) * 1e6:.1f} us per answer")
+
+
+if __name__ == "__main__":
+    failed = run_corpus() + run_fuzz()
+    run_timing()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# stub_openai_server.py
+#
+# Minimal OpenAI-compatible server for trying the local model backend
+# (services.openai_compatible_services) without a GPU box.
+# Run from the repository root:  python -m benchmarks.stub_openai_server --port 8080
+# then set Settings > Local Model > Base URL to http://127.0.0.1:8080/v1.
+#
+# Every request gets canned French suggestions, after `--delay` seconds;
+# "stream": true answers are sent as server-sent events, one token per chunk.
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def canned_answer(body: dict) -> str:
+    user_content = body["messages"][-1]["content"]
+    texts = [part.get("text", "") for part in user_content if part.get("type") == "text"]
+    images = sum(part.get("type") == "image_url" for part in user_content)
+    prompt = " ".join(texts)
+    count = re.search(r"number_of_suggestions:\s*(\d+)", prompt)
+    address = re.search(r"(?:Address|Adress):\s*([^|\n\"]+)", prompt, re.IGNORECASE)
+    count = int(count.group(1)) if count else 3
+    place = address.group(1).strip() if address else "Lyon"
+
+    def suggestions(image_number):
+        return {str(i): f"Photo {image_number}, vue {i} à {place}" for i in range(1, count + 1)}
+
+    if images > 1:
+        return json.dumps({str(n): suggestions(n) for n in range(1, images + 1)}, ensure_ascii=False)
+    return json.dumps(suggestions(1), ensure_ascii=False)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real server
+    delay = 0.0
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.delay)
+        answer = canned_answer(body)
+        if body.get("stream"):
+            self._send_stream(body["model"], answer)
+        else:
+            self._send_json({
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                             "finish_reason": "stop"}],
+            })
+
+    def _send_json(self, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, answer: str) -> None:
+        events = [
+            {"object": "chat.completion.chunk", "model": model,
+             "choices": [{"index": 0, "delta": {"content": token}}]}
+            for token in re.findall(r"\s*\S+", answer)
+        ]
+        data = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+        data = (data + "data: [DONE]\n\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 8080, delay: float = 0.0) -> ThreadingHTTPServer:
+    StubHandler.delay = delay
+    return ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible chat completions server.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds before each answer")
+    arguments = parser.parse_args()
+    server = serve(arguments.port, arguments.delay)
+    print(f"Serving on http://127.0.0.1:{arguments.port}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
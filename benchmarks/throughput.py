@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# throughput.py
+#
+# End-to-end throughput of the SendTo batch path against the offline mock
+# provider (services.mock_services): a synthetic image corpus goes through
+# the same preprocess -> infer -> parse -> rename pipeline as the mini app's
+# WorkerThread, and the run reports images/sec, request latency percentiles,
+# the app's overhead over the simulated provider time, and peak RSS.
+# Run from the repository root:  python -m benchmarks.throughput --images 200
+#
+# No network access is needed; --json writes the report for CI and
+# --min-images-per-sec turns it into a pass/fail check. --trace records
+# telemetry for the run, prints the time spent per stage and exports a
+# Chrome trace.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from services.async_runner import async_runner  # noqa: E402
+from services.batching import submit_batch_generation  # noqa: E402
+from services.client_pool import ModelEndpoint  # noqa: E402
+from services.mock_services import LATENCY_DISTRIBUTIONS, MockAltTextGenerator  # noqa: E402
+from services.resilience import FallbackChain, circuit_breakers  # noqa: E402
+from services.validation import ValidatedEndpoint  # noqa: E402
+from utils.batch_pipeline import BatchPipeline  # noqa: E402
+from utils.image_processing import ImageProfile  # noqa: E402
+from utils.telemetry import export_chrome_trace, read_records, telemetry  # noqa: E402
+
+
+# Same prompt shape as MiniAltInterface.construct_prompt()
+PROMPT = "Activity: Plumber | Address: 12 rue des Lilas, Lyon | number_of_suggestions: 1 | max_length: 25"
+PROFILE = ImageProfile(768, 300, "JPEG", 85)
+
+
+def make_corpus(folder: str, count: int, size, seed: int) -> List[str]:
+    """Writes `count` distinct seeded JPEGs (random shapes on a plain background) and returns their paths."""
+    rng = random.Random(seed)
+    width, height = size
+    paths = []
+    for index in range(count):
+        image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(width), rng.randrange(height)
+            box = (x, y, x + rng.randrange(20, width // 3), y + rng.randrange(20, height // 3))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            if rng.random() < 0.5:
+                draw.rectangle(box, fill=color)
+            else:
+                draw.ellipse(box, fill=color)
+        path = os.path.join(folder, f"IMG_{index:05d}.jpg")
+        image.save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(p / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident memory of this process and (outside Windows) of its reaped children."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+        )
+        return {"self": counters.PeakWorkingSetSize / 2 ** 20}
+
+    import resource
+    unit = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2 ** 20,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2 ** 20,
+    }
+
+
+def stage_totals(records: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """{stage: {"count", "total", "mean"}} in milliseconds; stages overlap across images."""
+    totals: Dict[str, List[float]] = {}
+    for record in records:
+        if record["name"] != "tokens":
+            totals.setdefault(record["name"], []).append(record["ms"])
+    return {
+        name: {"count": len(values), "total": sum(values), "mean": sum(values) / len(values)}
+        for name, values in totals.items()
+    }
+
+
+def build_model(args):
+    """The mock endpoint wrapped the way Constants.get_model() wraps registered models."""
+    endpoint = ModelEndpoint(
+        MockAltTextGenerator,
+        model=f"bench-{args.seed}",
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        per_image_ms=args.per_image_ms,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_length=args.burst_length,
+        seed=args.seed,
+        max_images_per_call=max(1, args.images_per_call),
+    )
+    circuit_breakers.configure(args.breaker_threshold, args.breaker_cooldown)
+    chain = FallbackChain([endpoint])
+    return endpoint, (chain if args.no_validation else ValidatedEndpoint(chain))
+
+
+def run(args) -> Dict:
+    endpoint, model = build_model(args)
+    request_seconds: List[float] = []
+    failed_requests: List[float] = []
+
+    def timed_submit(model, images, input_json):
+        started = time.perf_counter()
+        future = submit_batch_generation(model, images, input_json)
+
+        def done(future):
+            # Fast-failing requests (429s, open circuit) would flatter the percentiles.
+            failed = future.cancelled() or future.exception() is not None
+            (failed_requests if failed else request_seconds).append(time.perf_counter() - started)
+
+        future.add_done_callback(done)
+        return future
+
+    with tempfile.TemporaryDirectory(prefix="altify-bench-") as folder:
+        paths = make_corpus(folder, args.images, args.size, args.seed)
+        if args.trace:
+            telemetry.configure(True, os.path.join(folder, "telemetry.jsonl"))
+        async_runner.set_max_concurrency(args.concurrency)
+
+        started = time.perf_counter()
+        pipeline = BatchPipeline(
+            paths,
+            preprocess_options={**PROFILE.options(), "compute_hash": args.dedupe is not None},
+            max_workers=args.workers,
+        )
+        report = pipeline.run(
+            model,
+            PROMPT,
+            args.dedupe,
+            max_in_flight=args.concurrency,
+            submit=timed_submit,
+            images_per_call=args.images_per_call,
+        )
+        elapsed = time.perf_counter() - started
+
+        stages = {}
+        if args.trace:
+            telemetry.close()
+            stages = stage_totals(read_records(telemetry.path))
+            export_chrome_trace(args.trace, telemetry.path)
+
+    simulated = list(endpoint.generator.simulated_seconds)
+    return {
+        "images": len(paths),
+        "renamed": len(report.renamed),
+        "failed": len(report.failed),
+        "saved_calls": report.saved_calls,
+        "requests": len(request_seconds) + len(failed_requests),
+        "failed_requests": len(failed_requests),
+        "elapsed_seconds": elapsed,
+        "images_per_second": len(paths) / elapsed if elapsed else 0.0,
+        "request_latency_ms": {
+            f"p{p}": percentile(request_seconds, p) * 1000 for p in (50, 95, 99)
+        },
+        "provider_latency_ms": {
+            f"p{p}": percentile(simulated, p) * 1000 for p in (50, 95, 99)
+        },
+        "overhead_ms_p50": (percentile(request_seconds, 50) - percentile(simulated, 50)) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_ms": stages,
+    }
+
+
+def print_report(result: Dict) -> None:
+    print(f"images:      {result['images']} ({result['renamed']} renamed, {result['failed']} failed, "
+          f"{result['saved_calls']} calls saved by dedupe)")
+    print(f"requests:    {result['requests']} ({result['failed_requests']} failed) "
+          f"in {result['elapsed_seconds']:.2f} s")
+    print(f"throughput:  {result['images_per_second']:.2f} images/s")
+    for label, key in (("request", "request_latency_ms"), ("provider", "provider_latency_ms")):
+        # request: successful requests as seen by the pipeline; provider: simulated service time
+        latencies = result[key]
+        print(f"{label + ':':<13}p50 {latencies['p50']:.0f} ms, p95 {latencies['p95']:.0f} ms, "
+              f"p99 {latencies['p99']:.0f} ms")
+    print(f"overhead:    {result['overhead_ms_p50']:.0f} ms at p50 (queueing, validation, parsing)")
+    print("peak RSS:    " + ", ".join(f"{name} {mb:.0f} MB" for name, mb in result["peak_rss_mb"].items()))
+    for name, stage in result["stage_ms"].items():
+        print(f"  {name:<12}{stage['count']:>6} x {stage['mean']:8.2f} ms  (total {stage['total']:.0f} ms)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark of the batch rename pipeline.")
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--size", type=lambda text: tuple(int(part) for part in text.split("x")),
+                        default=(1600, 1200), help="corpus image size, e.g. 1600x1200")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--images-per-call", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="preprocessing processes")
+    parser.add_argument("--dedupe", type=int, default=None, help="near-duplicate threshold (off by default)")
+    parser.add_argument("--no-validation", action="store_true")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--latency-spread", type=float, default=0.4)
+    parser.add_argument("--per-image-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0, help="a 429 burst every N requests")
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--breaker-threshold", type=int, default=3)
+    parser.add_argument("--breaker-cooldown", type=float, default=60.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--trace", help="record telemetry and export it as a Chrome trace to this file")
+    parser.add_argument("--min-images-per-sec", type=float, default=None, help="exit 1 below this throughput")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = run(arguments)
+    print_report(result)
+    if arguments.json:
+        with open(arguments.json, "w", encoding="utf-8") as report_file:
+            json.dump(result, report_file, indent=2)
+    if arguments.min_images_per_sec is not None and result["images_per_second"] < arguments.min_images_per_sec:
+        print(f"FAIL: below {arguments.min_images_per_sec} images/s")
+        sys.exit(1)
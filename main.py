@@ -1,21 +1,8 @@
 import sys
 import os
 import ctypes
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QApplication, QFrame, QVBoxLayout
-from qfluentwidgets import (
-    SplitFluentWindow, SubtitleLabel, setFont, FluentIcon,
-    NavigationItemPosition, isDarkTheme, SwitchButton 
-)
-from qframelesswindow import FramelessWindow
-from utils.theme_utils import apply_theme, load_saved_theme
-from widgets.altTextAiInterface import AltTextAiInterface
-from widgets.SettingsInterface import SettingsInterface
-from widgets.mini_alt import MiniAltInterface
-from PySide6.QtGui import QIcon
-from utils.utils import create_crea_folders
-from utils.context_menu import register_crea_context_menu , create_sendto_shortcut
-from utils.config import Config
+import multiprocessing
+
 
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
@@ -36,72 +23,20 @@ def run_as_admin():
     ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, f'"{script}" {params}', None, 1)
 
 
-class HomeWidget(QFrame):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setObjectName("homeInterface")
-
-        self.altTextInterface = AltTextAiInterface(self)
-
-        self.themeSwitch = SwitchButton("Dark Mode", self)
-        self.themeSwitch.setChecked(isDarkTheme())
-        self.themeSwitch.checkedChanged.connect(self.toggleTheme)
-
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 48, 0, 0)
-        layout.addWidget(self.altTextInterface)
-        layout.addWidget(self.themeSwitch, alignment=Qt.AlignCenter)
-
-    def toggleTheme(self, checked: bool):
-        apply_theme(checked)
-
-
-class SettingsWidget(QFrame):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setObjectName("settingsInterface")
-
-        self.settingsInterface = SettingsInterface(self)
-        self.settingsInterface.setObjectName("settingsInterface")
-
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 48, 0, 0)
-        layout.addWidget(self.settingsInterface)
-
-
-class Window(SplitFluentWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle('Altify App')
-        icon_path = resource_path("assets/Logo/logo.png")
-        self.setWindowIcon(QIcon(icon_path))
-
-        self.resize(900, 700)
-
-        self.homeInterface = HomeWidget(self)
-        self.settingsInterface = SettingsWidget(self)
-        self.addSubInterface(self.homeInterface, FluentIcon.HOME, "Home")
-        self.addSubInterface(self.settingsInterface, FluentIcon.SETTING, "Settings", NavigationItemPosition.BOTTOM)
-
-
-class MiniWindow(FramelessWindow):
-    def __init__(self, image_paths=None):
-        super().__init__()
-        self.setWindowTitle('Altify App')
-        icon_path = resource_path("assets/Logo/logo.png")
-        self.setWindowIcon(QIcon(icon_path))
-        self.setFixedSize(700, 250)
-        self.titleBar.maxBtn.hide()
-        self.titleBar.minBtn.hide()
-        self.titleBar.closeBtn.raise_()
-
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(20, 20, 20, 20)
-        self.homeInterface = MiniAltInterface(self, image_paths)
-        layout.addWidget(self.homeInterface)
-
-
 if __name__ == '__main__':
+    # Image preprocessing uses a process pool; required for the frozen exe.
+    multiprocessing.freeze_support()
+
+    # Imported here, not at module level: spawned preprocessing workers
+    # re-import this module and must not pay for Qt and the provider SDKs.
+    from PySide6.QtWidgets import QApplication
+    from utils.theme_utils import load_saved_theme
+    from utils.utils import create_crea_folders
+    from utils.context_menu import register_crea_context_menu, create_sendto_shortcut
+    from utils.config import Config
+    from utils.telemetry import telemetry
+    from widgets.windows import MiniWindow, Window
+
     config = Config()
 
     if not config.is_configured() and not is_admin():
@@ -120,6 +55,7 @@ if __name__ == '__main__':
 
 
     load_saved_theme()
+    telemetry.configure(config.is_telemetry_enabled())
 
     args = sys.argv[1:]
     mini_mode = False
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# async_runner.py
+#
+# One background asyncio event loop shared by every async generation, with a
+# semaphore bounding how many requests are in flight. Keeping a single loop
+# alive means the pooled async SDK clients (bound to the loop they were first
+# used on) can be reused for the whole session.
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional, Union
+
+from services.cancellation import run_blocking
+from services.rate_limiter import estimate_request_tokens, rate_limiter
+from utils.image_payload import ImagePayload
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+async def agenerate(model, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+    """Awaits `model`'s native agenerate(), or runs a plain callable in a daemon worker thread."""
+    native = getattr(model, "agenerate", None)
+    if native is not None:
+        return await native(image, input_json)
+    return await run_blocking(model, image=image, input_json=input_json)
+
+
+async def acquire_quota(model, input_json: Union[str, Dict], images: int = 1) -> None:
+    """Waits until `model`'s provider allows one more request of that size."""
+    provider_key = getattr(model, "provider_key", None)
+    if provider_key:
+        prompt = input_json if isinstance(input_json, str) else str(input_json)
+        await rate_limiter.acquire(provider_key, estimate_request_tokens(prompt, images))
+
+
+class AsyncRunner:
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="altify-async", daemon=True).start()
+            return self._loop
+
+    def set_max_concurrency(self, max_concurrency: int) -> None:
+        """Applies to requests submitted from now on."""
+        if max_concurrency != self.max_concurrency:
+            self.max_concurrency = max_concurrency
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _bounded(self, coro):
+        async with self._semaphore:
+            return await coro
+
+    def submit(self, coro) -> Future:
+        """Schedules `coro` on the shared loop; returns a thread-safe Future."""
+        return asyncio.run_coroutine_threadsafe(self._bounded(coro), self.loop)
+
+    async def _limited(self, model, input_json, coro, images: int = 1):
+        # Wait for quota before taking a concurrency slot, so a throttled
+        # provider does not hold slots other providers could use.
+        try:
+            await acquire_quota(model, input_json, images)
+        except BaseException:
+            coro.close()
+            raise
+        async with self._semaphore:
+            return await coro
+
+    def submit_generation(self, model, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                          rate_limited: bool = True) -> Future:
+        """Schedules one generation, throttled by the provider's rate limits unless told otherwise."""
+        if not rate_limited:
+            return self.submit(agenerate(model, image, input_json))
+        return self.submit_limited(model, input_json, agenerate(model, image, input_json))
+
+    def submit_limited(self, model, input_json: Union[str, Dict], coro, images: int = 1) -> Future:
+        """Schedules `coro` once `model`'s provider has quota for a request with `images` images."""
+        return asyncio.run_coroutine_threadsafe(self._limited(model, input_json, coro, images), self.loop)
+
+async_runner = AsyncRunner()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# batching.py
+#
+# Multi-image prompts: K images share one request, so the system instruction
+# and the round-trip are paid once per K images. The model answers with one
+# JSON object keyed by image number; entries that come back missing or
+# malformed are re-requested one image at a time.
+
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Union
+
+from services.async_runner import acquire_quota, agenerate, async_runner
+from services.json_extraction import extract_json_object
+from utils.image_payload import ImagePayload
+
+
+BATCH_INSTRUCTION = (
+    "You will receive {count} images, numbered 1 to {count} in the order they are given. "
+    "Apply the parameters to each image independently and return a single JSON object whose keys are "
+    "the image numbers (\"1\" to \"{count}\") and whose values are the JSON objects of suggestions for "
+    "that image, for example:\n"
+    "{{\n  \"1\": {{\"1\": \"Description 1\", \"2\": \"Description 2\"}},\n"
+    "  \"2\": {{\"1\": \"Description 1\", \"2\": \"Description 2\"}}\n}}\n"
+    "Return only this JSON object."
+)
+
+
+def batch_instruction(count: int) -> str:
+    return BATCH_INSTRUCTION.format(count=count)
+
+
+def image_label(index: int) -> str:
+    return f"Image {index + 1}:"
+
+
+def parse_batch_response(text: str) -> Dict:
+    """The JSON object of a batched answer, keyed by image number."""
+    return extract_json_object(text)
+
+
+def split_batch_response(parsed: Dict, count: int) -> List[Optional[Dict[str, str]]]:
+    """
+    Returns one suggestions dict per image, or None for entries that are
+    missing, empty or not a {key: text} object.
+    """
+    entries = []
+    for index in range(count):
+        entry = parsed.get(str(index + 1))
+        if (isinstance(entry, dict) and entry
+                and all(isinstance(value, str) and value.strip() for value in entry.values())):
+            entries.append(entry)
+        else:
+            entries.append(None)
+    return entries
+
+
+def max_images_per_call(model) -> int:
+    return max(1, getattr(model, "max_images_per_call", 1))
+
+
+def _retry_one(model, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+    """One single-image call; its error is returned in place of the entry, so the other images keep theirs."""
+    try:
+        return model(image=image, input_json=input_json)
+    except Exception as e:
+        return e
+
+
+def generate_batch(model, images: Sequence[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> List:
+    """
+    Generates suggestions for every image with as few calls as `model` allows,
+    falling back to single-image calls for entries the batched answer got wrong.
+    An image whose single-image call failed gets that exception as its entry.
+    """
+    if len(images) == 1:
+        return [model(image=images[0], input_json=input_json)]
+    if max_images_per_call(model) == 1:
+        return [_retry_one(model, image, input_json) for image in images]
+
+    try:
+        entries = split_batch_response(model.generate_batch(images, input_json), len(images))
+    except ValueError as e:
+        logging.debug("Batched response unusable, retrying images one by one: %s", e)
+        entries = [None] * len(images)
+
+    return [
+        entry if entry is not None else _retry_one(model, image, input_json)
+        for image, entry in zip(images, entries)
+    ]
+
+
+async def agenerate_batch(model, images: Sequence[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> List:
+    """
+    Asyncio variant of generate_batch(). Single-image fallbacks run
+    concurrently, each waiting for its own rate limit quota; a failed one
+    gets its exception as its entry.
+    """
+    if len(images) == 1:
+        return [await agenerate(model, images[0], input_json)]
+    if max_images_per_call(model) == 1:
+        return list(await asyncio.gather(
+            *(agenerate(model, image, input_json) for image in images), return_exceptions=True
+        ))
+
+    try:
+        entries = split_batch_response(await model.agenerate_batch(images, input_json), len(images))
+    except ValueError as e:
+        logging.debug("Batched response unusable, retrying images one by one: %s", e)
+        entries = [None] * len(images)
+
+    async def retry(image):
+        await acquire_quota(model, input_json)
+        return await agenerate(model, image, input_json)
+
+    retries = {
+        index: retry(image)
+        for index, (image, entry) in enumerate(zip(images, entries))
+        if entry is None
+    }
+    if retries:
+        results = await asyncio.gather(*retries.values(), return_exceptions=True)
+        for index, result in zip(retries, results):
+            entries[index] = result
+    return entries
+
+
+def submit_batch_generation(model, images: Sequence[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Future:
+    """Schedules agenerate_batch() on the shared loop as one rate-limited request."""
+    if len(images) == 1:
+        return async_runner.submit_limited(
+            model, input_json, _as_list(agenerate(model, images[0], input_json))
+        )
+    return async_runner.submit_limited(
+        model, input_json, agenerate_batch(model, images, input_json), images=len(images)
+    )
+
+
+async def _as_list(coro) -> List:
+    return [await coro]
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# cancellation.py
+#
+# Deadlines and cancellation for model calls. Blocking provider SDKs (g4f,
+# huggingface_hub, requests) cannot be interrupted while they wait on a
+# socket, so every blocking call runs in a daemon thread that the caller only
+# waits on: the wait ends at the model's deadline or as soon as the current
+# CancelToken is cancelled, and an abandoned call can never keep the process
+# alive after its window closed. Streaming loops also check the token between
+# chunks, so an abandoned call stops reading early.
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, Iterator, Optional
+
+
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 90.0
+# How often a blocked wait looks at its cancel token; bounds how long a Cancel takes.
+CANCEL_POLL_SECONDS = 0.1
+# A batched request gets this share of the deadline again for every extra image.
+BATCH_IMAGE_TIMEOUT_SHARE = 0.25
+
+
+class RequestTimeoutError(RuntimeError):
+    pass
+
+
+class GenerationCancelled(asyncio.CancelledError):
+    """
+    Raised in blocking code when the user cancelled. An asyncio.CancelledError
+    (and so not an Exception), so fallbacks, retries and breakers let it
+    through exactly like a cancelled asyncio task.
+    """
+
+
+class CancelToken:
+    """Set once by cancel(); every call made in its cancel_scope() gives up within CANCEL_POLL_SECONDS."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Calls `callback` (from the cancelling thread) on cancel(); right away if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleeps up to `timeout` seconds; returns True as soon as the token is cancelled."""
+        return self._event.wait(timeout)
+
+
+_current: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "altify_cancel_token", default=None
+)
+
+
+@contextlib.contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """Makes `token` the current one for calls made inside the block (and the threads they start)."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def check_cancelled() -> None:
+    """Raises GenerationCancelled if the current call was cancelled; for loops over streamed chunks."""
+    token = _current.get()
+    if token is not None and token.cancelled:
+        raise GenerationCancelled()
+
+
+def sleep(seconds: float) -> None:
+    """time.sleep() that wakes up and raises GenerationCancelled when the current call is cancelled."""
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise GenerationCancelled()
+
+
+@contextlib.contextmanager
+def hold(semaphore: threading.Semaphore) -> Iterator[None]:
+    """
+    Holds `semaphore` for the block. An abandoned blocking call cannot be
+    interrupted, so the slot is given back as soon as the current token is
+    cancelled (which is what abandoning a call does) rather than when the
+    call finally returns. Waiting for a slot raises GenerationCancelled.
+    """
+    while not semaphore.acquire(timeout=CANCEL_POLL_SECONDS):
+        check_cancelled()
+    lock = threading.Lock()
+    held = [True]
+
+    def give_back():
+        with lock:
+            if held[0]:
+                held[0] = False
+                semaphore.release()
+
+    token = _current.get()
+    if token is not None:
+        token.add_callback(give_back)
+    try:
+        check_cancelled()
+        yield
+    finally:
+        if token is not None:
+            token.remove_callback(give_back)
+        give_back()
+
+
+class Deadlines:
+    """Per-request time limits: a model's own deadline, else the default from Settings."""
+
+    def __init__(self, default_seconds: float = DEFAULT_REQUEST_TIMEOUT_SECONDS):
+        self.default_seconds = default_seconds
+
+    def configure(self, default_seconds: float) -> None:
+        if default_seconds > 0:
+            self.default_seconds = default_seconds
+
+    def seconds(self, deadline: Optional[float] = None, images: int = 1) -> float:
+        base = deadline or self.default_seconds
+        return base * (1 + BATCH_IMAGE_TIMEOUT_SHARE * max(0, images - 1))
+
+
+deadlines = Deadlines()
+
+
+def _start(fn: Callable, args, kwargs, token: CancelToken) -> Future:
+    """Runs fn(*args, **kwargs) in a new daemon thread, in a copy of the caller's context with `token` current."""
+    future = Future()
+    context = contextvars.copy_context()
+
+    def scoped():
+        with cancel_scope(token):
+            return fn(*args, **kwargs)
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = context.run(scoped)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=target, name="altify-call", daemon=True).start()
+    return future
+
+
+def wait_future(future: Future, timeout: Optional[float] = None, on_abandon: Optional[Callable[[], None]] = None):
+    """
+    Blocking future.result() that raises RequestTimeoutError after `timeout`
+    seconds and GenerationCancelled as soon as the current token is cancelled.
+    Either way the future is cancelled (which cancels an asyncio task behind
+    it) and `on_abandon` is called.
+    """
+    token = _current.get()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = CANCEL_POLL_SECONDS if deadline is None else min(CANCEL_POLL_SECONDS, deadline - time.monotonic())
+        if remaining > 0:
+            done, _ = wait([future], timeout=remaining)
+            if done:
+                return future.result()
+        if token is not None and token.cancelled:
+            error = GenerationCancelled()
+        elif deadline is not None and time.monotonic() >= deadline:
+            error = RequestTimeoutError(f"No answer within {timeout:g} s.")
+        else:
+            continue
+        future.cancel()
+        if on_abandon is not None:
+            on_abandon()
+        raise error
+
+
+def call_with_deadline(timeout: float, fn: Callable, *args, **kwargs):
+    """Blocking call of fn(*args, **kwargs), abandoned at its deadline or on cancellation."""
+    call_token = CancelToken()
+    return wait_future(_start(fn, args, kwargs, call_token), timeout, on_abandon=call_token.cancel)
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """
+    Like asyncio.to_thread(), but in a daemon thread, and cancelling the
+    awaiting task cancels the call's token, so streaming loops stop early.
+    """
+    call_token = CancelToken()
+    try:
+        return await asyncio.wrap_future(_start(fn, args, kwargs, call_token))
+    except asyncio.CancelledError:
+        call_token.cancel()
+        raise
+
+
+async def await_with_deadline(coro, timeout: float):
+    """Awaits `coro`, cancelling it with RequestTimeoutError after `timeout` seconds."""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise RequestTimeoutError(f"No answer within {timeout:g} s.") from None
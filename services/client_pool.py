@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# client_pool.py
+#
+# Process-wide registry of provider SDK clients and alt text generators.
+# Clients are created once per (provider, options, API key) and reused for every
+# image so their HTTP connections stay open; they are only rebuilt when the key
+# for that provider changes in Settings.
+
+import asyncio
+import contextlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.cancellation import (
+    RequestTimeoutError, await_with_deadline, call_with_deadline, deadlines,
+)
+from services.latency import latency_tracker
+from utils.config import Config
+from utils.image_payload import ImagePayload
+from utils.telemetry import telemetry
+
+
+class ClientPool:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._api_keys: Dict[str, str] = {}
+        self._clients: Dict[Tuple, Any] = {}
+        self._generators: Dict[Tuple, Any] = {}
+
+    def api_key(self, provider: str) -> str:
+        """Current API key for `provider`, read from Config once and then kept in memory."""
+        with self._lock:
+            if provider not in self._api_keys:
+                self._api_keys[provider] = Config().get_api_key(provider)
+            return self._api_keys[provider]
+
+    def update_api_keys(self, **keys: str) -> None:
+        """
+        Stores new keys (e.g. gemini="...", huggingface="...") and drops the
+        clients built with an outdated key; they are recreated on next use.
+        """
+        with self._lock:
+            for provider, key in keys.items():
+                if self._api_keys.get(provider) == key:
+                    continue
+                self._api_keys[provider] = key
+                for client_key in [k for k in self._clients if k[0] == provider]:
+                    del self._clients[client_key]
+
+    def client(self, provider: str, factory: Callable[..., Any], *options) -> Any:
+        """
+        Returns the shared client for `provider` and `options`, creating it with
+        factory(api_key, *options) the first time or after the key changed.
+        """
+        api_key = self.api_key(provider)
+        client_key = (provider, options, api_key)
+        with self._lock:
+            client = self._clients.get(client_key)
+            if client is None:
+                client = factory(api_key, *options)
+                self._clients[client_key] = client
+            return client
+
+    def generator(self, generator_cls: type, *args, **kwargs) -> Any:
+        """Returns the shared generator_cls(*args, **kwargs) instance."""
+        generator_key = (generator_cls, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            generator = self._generators.get(generator_key)
+            if generator is None:
+                generator = generator_cls(*args, **kwargs)
+                self._generators[generator_key] = generator
+            return generator
+
+    def clear(self) -> None:
+        with self._lock:
+            self._api_keys.clear()
+            self._clients.clear()
+            self._generators.clear()
+
+
+client_pool = ClientPool()
+
+
+def _image_kb(images) -> float:
+    """Payload size for telemetry tags; base64 strings are estimated from their length."""
+    total = 0
+    for image in images:
+        if isinstance(image, (ImagePayload, bytes)):
+            total += len(image)
+        elif isinstance(image, str):
+            total += len(image) * 3 // 4
+    return round(total / 1024, 1)
+
+
+class ModelEndpoint:
+    """
+    A model as registered in Constants.AI_MODELS_DICT. Calling it generates
+    with the pooled generator instance; agenerate() is the asyncio variant.
+    Successful single-image calls are timed into services.latency.latency_tracker.
+    Every call gives up with RequestTimeoutError after `deadline` seconds
+    (None: the default from Settings) and is abandoned as soon as the
+    current services.cancellation token is cancelled.
+    """
+
+    def __init__(self, generator_cls: type, *args, deadline: Optional[float] = None, **kwargs):
+        self.generator_cls = generator_cls
+        self.args = args
+        self.deadline = deadline
+        self.kwargs = kwargs
+
+    @property
+    def generator(self) -> Any:
+        return client_pool.generator(self.generator_cls, *self.args, **self.kwargs)
+
+    @property
+    def model(self) -> str:
+        return self.generator.model
+
+    @property
+    def provider_key(self) -> str:
+        """Identifies the backend account/host, e.g. 'gemini' or 'huggingface/groq'."""
+        return self.generator.provider_key
+
+    @property
+    def identity(self) -> str:
+        """Stable name used for latency and cache bookkeeping, e.g. 'gemini:gemini-1.5-flash'."""
+        return f"{self.provider_key}:{self.model}"
+
+    @property
+    def max_images_per_call(self) -> int:
+        """How many images generate_batch() may pack into one request (1: no batching)."""
+        return getattr(self.generator, "max_images_per_call", 1)
+
+    def timeout(self, images: int = 1) -> float:
+        """Seconds a request with `images` images may take."""
+        return deadlines.seconds(self.deadline, images)
+
+    @contextlib.contextmanager
+    def _request_span(self, images):
+        """Tags everything recorded during the request with this model and the payload size."""
+        with telemetry.tags(model=self.identity, image_kb=_image_kb(images)):
+            with telemetry.span("request", images=len(images)):
+                yield
+
+    def __call__(self, image, input_json, on_suggestion=None):
+        started = time.perf_counter()
+        generator = self.generator
+        try:
+            with self._request_span([image]):
+                if on_suggestion is not None:
+                    result = call_with_deadline(
+                        self.timeout(), generator.generate, image, input_json, on_suggestion=on_suggestion
+                    )
+                else:
+                    result = call_with_deadline(self.timeout(), generator.generate, image, input_json)
+        except (asyncio.CancelledError, RequestTimeoutError):
+            latency_tracker.record(self.identity, time.perf_counter() - started)
+            raise
+        latency_tracker.record(self.identity, time.perf_counter() - started)
+        return result
+
+    async def agenerate(self, image, input_json):
+        started = time.perf_counter()
+        try:
+            with self._request_span([image]):
+                result = await await_with_deadline(self.generator.agenerate(image, input_json), self.timeout())
+        except (asyncio.CancelledError, RequestTimeoutError):
+            # Cancelled (e.g. lost a hedge race) or timed out: the time so far
+            # is a lower bound, but dropping it would hide exactly the slow calls.
+            latency_tracker.record(self.identity, time.perf_counter() - started)
+            raise
+        latency_tracker.record(self.identity, time.perf_counter() - started)
+        return result
+
+    def generate_batch(self, images, input_json):
+        with self._request_span(images):
+            return call_with_deadline(self.timeout(len(images)), self.generator.generate_batch, images, input_json)
+
+    async def agenerate_batch(self, images, input_json):
+        with self._request_span(images):
+            return await await_with_deadline(
+                self.generator.agenerate_batch(images, input_json), self.timeout(len(images))
+            )
+
+    def __repr__(self) -> str:
+        return f"ModelEndpoint({self.generator_cls.__name__}, {self.args!r}, {self.kwargs!r})"
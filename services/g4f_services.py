@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 # g4f_services.py
 
-import base64
 import json
-from typing import Dict, Union
+import logging
+from typing import Dict, Optional, Union
 import g4f
 from g4f import Provider
+from utils.image_payload import ImagePayload
+from services.cancellation import check_cancelled, deadlines, run_blocking
+from services.client_pool import ModelEndpoint
+from services.json_extraction import extract_json_object
+from services.streaming import SuggestionCallback, SuggestionStreamParser
+from utils.telemetry import telemetry
+
+
+DEFAULT_TIMEOUT_SECONDS = 60
+G4F_DEADLINE_SECONDS = 60.0
 
 
 class G4FBaseAltTextGenerator:
@@ -31,9 +41,16 @@ class G4FBaseAltTextGenerator:
         "7. IMPORTANT: Each description MUST strictly adhere to the 'max_length' limit. If necessary, shorten sentences without losing the meaning."
     )
 
-    def __init__(self, model: str, provider: Provider):
+    def __init__(self, model: str, provider: Provider, timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS):
         self.model = model
         self.provider = provider
+        # Passed to the provider's HTTP client; the endpoint deadline bounds the whole call.
+        # None follows the request timeout configured in Settings.
+        self.timeout = timeout
+
+    @property
+    def provider_key(self) -> str:
+        return f"g4f/{getattr(self.provider, '__name__', self.provider)}"
 
     @staticmethod
     def _normalize_json(input_json: Union[str, Dict]) -> str:
@@ -41,84 +58,68 @@ class G4FBaseAltTextGenerator:
             raise ValueError("input_json cannot be None.")
         return input_json if isinstance(input_json, str) else json.dumps(input_json, ensure_ascii=False, indent=2)
 
-    @staticmethod
-    def _decode_image(base64_image_str: Union[str, Dict]) -> str:
-        if isinstance(base64_image_str, dict):
-        # Try to extract value if user passed {'image': base64_str}
-            base64_image_str = base64_image_str.get("image")
-
-        if not isinstance(base64_image_str, str):
-            raise ValueError("Image must be a base64 string.")
-
-        try:
-            base64.b64decode(base64_image_str) 
-            return base64_image_str
-        except base64.binascii.Error as e:
-            raise ValueError("Invalid base64 image data.") from e
-
-
-    def generate(self, base64_image_str: str, input_json: Union[str, Dict]) -> Dict[str, str]:
+    def generate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                 on_suggestion: Optional[SuggestionCallback] = None) -> Dict[str, str]:
+        """
+        Returns the parsed suggestions. With `on_suggestion`, the answer is
+        streamed and each suggestion is reported as soon as it is complete.
+        """
         input_json_str = self._normalize_json(input_json)
-        image_base64 = self._decode_image(base64_image_str)
+        with telemetry.span("payload"):
+            image = ImagePayload.coerce(image)
+            messages = [
+                {"role": "system", "content": self.SYSTEM_INSTRUCTION},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": f"Voici les paramètres utilisateur :\n{input_json_str}"},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image.data_url
+                            }
+                        }
+                    ]
+                }
+            ]
 
+        first_token = telemetry.first_token_timer()
         try:
             response = g4f.ChatCompletion.create(
                 model=self.model,
                 provider=self.provider,
-                messages=[
-                    {"role": "system", "content": self.SYSTEM_INSTRUCTION},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": f"Voici les paramètres utilisateur :\n{input_json_str}"},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ]
+                messages=messages,
+                stream=on_suggestion is not None,
+                timeout=self.timeout or deadlines.seconds()
             )
+            if on_suggestion is not None:
+                parser = SuggestionStreamParser(on_suggestion)
+                response_text = ""
+                for chunk in response:
+                    check_cancelled()
+                    first_token.chunk()
+                    response_text += str(chunk)
+                    parser.feed(str(chunk))
+                response = response_text
         except Exception as e:
             raise RuntimeError(f"g4f request failed: {str(e)}") from e
 
-        print(f"g4f raw response: {response}")  # Debug
-        try:
-            cleaned = str(response).replace("```json", "").replace("```", "").strip()
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            raise ValueError(f"Failed to parse JSON response:\n{response}")
-
-
-# Wrappers for specific providers and models
-def qwen_vision_72b(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = G4FBaseAltTextGenerator(
-        model="qwen-2.5-vl-72b",
-        provider=Provider.Together
-    )
-    return generator.generate(base64_image_str, input_json)
-
-
-def gpt_4o(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = G4FBaseAltTextGenerator(
-        model="gpt-4o-mini",
-        provider= Provider.OIVSCodeSer2
-    )
-    return generator.generate(base64_image_str, input_json)
-
-def gpt_4_1_mini(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = G4FBaseAltTextGenerator(
-        model="gpt-4.1-mini",
-        provider= Provider.OIVSCodeSer0501
-    )
-    return generator.generate(base64_image_str, input_json)
-
-
-def gpt_o4_mini(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = G4FBaseAltTextGenerator(
-        model="o4-mini",
-        provider=Provider.PollinationsAI
-    )
-    return generator.generate(base64_image_str, input_json)
\ No newline at end of file
+        logging.debug("g4f raw response: %s", response)
+        return extract_json_object(response)
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> Dict[str, str]:
+        # g4f providers are not reliably async-capable, so run the blocking call in a worker thread.
+        return await run_blocking(self.generate, image, input_json)
+
+
+# Wrappers for specific providers and models. Free providers tend to hang
+# rather than fail, so they get a shorter deadline than the default; o4-mini
+# is slow even when healthy and keeps the configured one.
+qwen_vision_72b = ModelEndpoint(G4FBaseAltTextGenerator, model="qwen-2.5-vl-72b", provider=Provider.Together,
+                                deadline=G4F_DEADLINE_SECONDS)
+gpt_4o = ModelEndpoint(G4FBaseAltTextGenerator, model="gpt-4o-mini", provider=Provider.OIVSCodeSer2,
+                       deadline=G4F_DEADLINE_SECONDS)
+gpt_4_1_mini = ModelEndpoint(G4FBaseAltTextGenerator, model="gpt-4.1-mini", provider=Provider.OIVSCodeSer0501,
+                             deadline=G4F_DEADLINE_SECONDS)
+gpt_o4_mini = ModelEndpoint(G4FBaseAltTextGenerator, model="o4-mini", provider=Provider.PollinationsAI,
+                            timeout=None)
@@ -2,12 +2,18 @@
 # gemini_services.py
 
 
-import base64
 import json
-from typing import Dict, Union
+import logging
+from typing import Dict, List, Optional, Union
 from google import genai
 from google.genai import types
-from utils.config import Config
+from services.batching import batch_instruction, image_label, parse_batch_response
+from services.cancellation import check_cancelled
+from services.client_pool import ModelEndpoint, client_pool
+from services.json_extraction import extract_json_object
+from services.streaming import SuggestionCallback, SuggestionStreamParser
+from utils.image_payload import ImagePayload
+from utils.telemetry import telemetry
 
 
 class BaseAltTextGenerator:
@@ -35,10 +41,18 @@ class BaseAltTextGenerator:
 
     )
 
-    def __init__(self, model: str):
-        self.config = Config()
-        self.client = genai.Client(api_key=self.config.get_gemini_key())
+    provider_key = "gemini"
+    # Images sent together in one request by generate_batch().
+    max_images_per_call = 8
+
+    def __init__(self, model: str, max_images_per_call: Optional[int] = None):
         self.model = model
+        if max_images_per_call is not None:
+            self.max_images_per_call = max_images_per_call
+
+    @property
+    def client(self) -> genai.Client:
+        return client_pool.client("gemini", lambda api_key: genai.Client(api_key=api_key))
 
     @staticmethod
     def _normalize_json(input_json: Union[str, Dict]) -> str:
@@ -46,15 +60,8 @@ class BaseAltTextGenerator:
             raise ValueError("input_json cannot be None.")
         return input_json if isinstance(input_json, str) else json.dumps(input_json, ensure_ascii=False, indent=2)
 
-    @staticmethod
-    def _decode_image(base64_image_str: str) -> bytes:
-        try:
-            return base64.b64decode(base64_image_str)
-        except base64.binascii.Error as e:
-            raise ValueError("Invalid base64 image data.") from e
-
     def _prepare_request(
-        self, image_data: bytes, input_json_str: str
+        self, image: ImagePayload, input_json_str: str
     ) -> (list):
         """
         To be overridden in subclasses!
@@ -62,36 +69,108 @@ class BaseAltTextGenerator:
         """
         raise NotImplementedError
 
-    def generate(self, base64_image_str: str, input_json: Union[str, Dict]) -> Dict[str, str]:
-        input_json_str = self._normalize_json(input_json)
-        image_data = self._decode_image(base64_image_str)
+    def _prepare_batch_request(self, images: List[ImagePayload], input_json_str: str):
+        """Same as _prepare_request, with numbered images and the batch instruction."""
+        raise NotImplementedError
 
-        contents, generation_config = self._prepare_request(image_data, input_json_str)
+    @staticmethod
+    def _image_parts(images: List[ImagePayload]) -> list:
+        parts = []
+        for index, image in enumerate(images):
+            parts.append(types.Part.from_text(text=image_label(index)))
+            parts.append(types.Part.from_bytes(mime_type=image.mime_type, data=image.data))
+        return parts
+
+    @staticmethod
+    def _record_usage(usage) -> None:
+        if usage is not None:
+            telemetry.tokens(getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
 
+    def _stream_text(self, contents, generation_config, on_suggestion: Optional[SuggestionCallback] = None) -> str:
+        parser = SuggestionStreamParser(on_suggestion) if on_suggestion is not None else None
         response_text = ""
+        usage = None
+        first_token = telemetry.first_token_timer()
         try:
             for chunk in self.client.models.generate_content_stream(
                 model=self.model, contents=contents, config=generation_config
             ):
-                response_text += getattr(chunk, "text", "") or ""
+                check_cancelled()
+                first_token.chunk()
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, "text", "") or ""
+                response_text += text
+                if parser is not None:
+                    parser.feed(text)
         except Exception as e:
             raise RuntimeError(f"Model request failed: {str(e)}") from e
-        print(f"Gemini response: {response_text}")  # Debugging output
-        cleaned = response_text.replace("```json", "").replace("```", "").strip()
-        print(f"Cleaned response: {cleaned}")  # Debugging output
+        self._record_usage(usage)
+        return response_text
+
+    async def _astream_text(self, contents, generation_config) -> str:
+        response_text = ""
+        usage = None
+        first_token = telemetry.first_token_timer()
         try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            raise ValueError(f"Failed to parse JSON response:\n{cleaned}")
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model, contents=contents, config=generation_config
+            )
+            async for chunk in stream:
+                first_token.chunk()
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                response_text += getattr(chunk, "text", "") or ""
+        except Exception as e:
+            raise RuntimeError(f"Model request failed: {str(e)}") from e
+        self._record_usage(usage)
+        return response_text
+
+    def generate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                 on_suggestion: Optional[SuggestionCallback] = None) -> Dict[str, str]:
+        """
+        Returns the parsed suggestions. With `on_suggestion`, each suggestion is
+        also reported as on_suggestion(key, text) as soon as it has streamed in.
+        """
+        input_json_str = self._normalize_json(input_json)
+        with telemetry.span("payload"):
+            image = ImagePayload.coerce(image)
+            contents, generation_config = self._prepare_request(image, input_json_str)
+        return self._parse_response(self._stream_text(contents, generation_config, on_suggestion))
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> Dict[str, str]:
+        input_json_str = self._normalize_json(input_json)
+        with telemetry.span("payload"):
+            image = ImagePayload.coerce(image)
+            contents, generation_config = self._prepare_request(image, input_json_str)
+        return self._parse_response(await self._astream_text(contents, generation_config))
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """One request for several images; returns the answer keyed by image number ("1", "2", ...)."""
+        input_json_str = self._normalize_json(input_json)
+        with telemetry.span("payload"):
+            images = [ImagePayload.coerce(image) for image in images]
+            contents, generation_config = self._prepare_batch_request(images, input_json_str)
+        return parse_batch_response(self._stream_text(contents, generation_config))
+
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        input_json_str = self._normalize_json(input_json)
+        with telemetry.span("payload"):
+            images = [ImagePayload.coerce(image) for image in images]
+            contents, generation_config = self._prepare_batch_request(images, input_json_str)
+        return parse_batch_response(await self._astream_text(contents, generation_config))
+
+    @staticmethod
+    def _parse_response(response_text: str) -> Dict[str, str]:
+        logging.debug("Gemini raw response: %s", response_text)
+        return extract_json_object(response_text)
 
 
 class GemmaAltTextGenerator(BaseAltTextGenerator):
-    def _prepare_request(self, image_data: bytes, input_json_str: str):
+    def _prepare_request(self, image: ImagePayload, input_json_str: str):
         instruction = self.SYSTEM_INSTRUCTION + f"\n\nHere is the JSON object:\n{input_json_str}"
         contents = [
             types.Content(role="user", parts=[
                 types.Part.from_text(text=instruction),
-                types.Part.from_bytes(mime_type="image/png", data=image_data)
+                types.Part.from_bytes(mime_type=image.mime_type, data=image.data)
             ])
         ]
         generation_config = types.GenerateContentConfig(
@@ -99,12 +178,26 @@ class GemmaAltTextGenerator(BaseAltTextGenerator):
         )
         return contents, generation_config
 
+    def _prepare_batch_request(self, images: List[ImagePayload], input_json_str: str):
+        instruction = (
+            self.SYSTEM_INSTRUCTION
+            + f"\n\n{batch_instruction(len(images))}"
+            + f"\n\nHere is the JSON object:\n{input_json_str}"
+        )
+        contents = [
+            types.Content(role="user", parts=[types.Part.from_text(text=instruction), *self._image_parts(images)])
+        ]
+        generation_config = types.GenerateContentConfig(
+            temperature=0.7, max_output_tokens=1000 * len(images), response_mime_type="text/plain"
+        )
+        return contents, generation_config
+
 
 class GeminiAltTextGenerator(BaseAltTextGenerator):
-    def _prepare_request(self, image_data: bytes, input_json_str: str):
+    def _prepare_request(self, image: ImagePayload, input_json_str: str):
         contents = [
             types.Content(role="user", parts=[
-                types.Part.from_bytes(mime_type="image/png", data=image_data),
+                types.Part.from_bytes(mime_type=image.mime_type, data=image.data),
                 types.Part.from_text(text=input_json_str)
             ])
         ]
@@ -118,23 +211,26 @@ class GeminiAltTextGenerator(BaseAltTextGenerator):
         )
         return contents, generation_config
 
-
-# Example usage wrappers
-def gemini_flash(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = GeminiAltTextGenerator("gemini-1.5-flash")
-    return generator.generate(base64_image_str, input_json)
-
-
-def learnlm_2_0(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = GeminiAltTextGenerator("learnlm-2.0-flash-experimental")
-    return generator.generate(base64_image_str, input_json)
-
-
-def gemma_3(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = GemmaAltTextGenerator("gemma-3-27b-it")
-    return generator.generate(base64_image_str, input_json)
+    def _prepare_batch_request(self, images: List[ImagePayload], input_json_str: str):
+        contents = [
+            types.Content(role="user", parts=[
+                *self._image_parts(images),
+                types.Part.from_text(text=f"{batch_instruction(len(images))}\n\n{input_json_str}")
+            ])
+        ]
+        generation_config = types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=1000 * len(images),
+            response_mime_type="text/plain",
+            system_instruction=types.Content(role="system", parts=[
+                types.Part.from_text(text=self.SYSTEM_INSTRUCTION)
+            ])
+        )
+        return contents, generation_config
 
 
-def gemma_3_4b(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = GemmaAltTextGenerator("gemma-3-4b-it")
-    return generator.generate(base64_image_str, input_json)
+# Models registered in Constants.AI_MODELS_DICT
+gemini_flash = ModelEndpoint(GeminiAltTextGenerator, "gemini-1.5-flash")
+learnlm_2_0 = ModelEndpoint(GeminiAltTextGenerator, "learnlm-2.0-flash-experimental")
+gemma_3 = ModelEndpoint(GemmaAltTextGenerator, "gemma-3-27b-it", max_images_per_call=4)
+gemma_3_4b = ModelEndpoint(GemmaAltTextGenerator, "gemma-3-4b-it", max_images_per_call=4)
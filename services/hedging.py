@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# hedging.py
+#
+# Hedged requests: when the primary model has not answered within its usual
+# (percentile) latency, the same request is sent to a secondary model and the
+# first valid answer wins. Trades a few extra calls for a much shorter tail on
+# models with erratic latency (g4f providers, the Beta models).
+
+import asyncio
+import logging
+import threading
+from typing import Dict, Union
+
+from services.async_runner import acquire_quota, agenerate, async_runner
+from services.cancellation import run_blocking, wait_future
+from services.latency import latency_tracker
+from utils.image_payload import ImagePayload
+
+
+DEFAULT_HEDGE_PERCENTILE = 90
+DEFAULT_HEDGE_DELAY_SECONDS = 10.0
+# Below this many observed calls the default delay is used instead of a percentile.
+MIN_LATENCY_SAMPLES = 5
+
+
+def _is_valid(result) -> bool:
+    return isinstance(result, dict) and bool(result)
+
+
+class HedgedEndpoint:
+    """
+    Behaves like a ModelEndpoint (callable, agenerate, provider_key, model).
+    The hedge delay is the primary's `percentile` latency as recorded by
+    services.latency, or `default_delay` until enough calls were observed.
+    The slower request is cancelled; a blocking provider call already running
+    in a worker thread stops at its next streamed chunk, or its answer is
+    just discarded.
+    """
+
+    max_images_per_call = 1
+
+    def __init__(self, primary, secondary, percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 default_delay: float = DEFAULT_HEDGE_DELAY_SECONDS):
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.hedges = 0
+        self.secondary_wins = 0
+
+    @property
+    def model(self) -> str:
+        return self.primary.model
+
+    @property
+    def provider_key(self) -> str:
+        return self.primary.provider_key
+
+    @property
+    def identity(self) -> str:
+        return self.primary.identity
+
+    def hedge_delay(self) -> float:
+        delay = latency_tracker.percentile(self.primary.identity, self.percentile, MIN_LATENCY_SAMPLES)
+        return delay if delay is not None else self.default_delay
+
+    async def _race(self, primary_coro, image: ImagePayload, input_json: Union[str, Dict]):
+        primary = asyncio.ensure_future(primary_coro)
+        tasks = {primary}
+        try:
+            delay = self.hedge_delay()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if primary in done and primary.exception() is None and _is_valid(primary.result()):
+                return primary.result()
+
+            # The primary keeps running while the backup waits for its provider's
+            # quota; an answer in that window makes the backup unnecessary.
+            quota = asyncio.ensure_future(acquire_quota(self.secondary, input_json))
+            tasks.add(quota)
+            if not primary.done():
+                await asyncio.wait({primary, quota}, return_when=asyncio.FIRST_COMPLETED)
+                if primary.done() and primary.exception() is None and _is_valid(primary.result()):
+                    return primary.result()
+            await quota
+
+            logging.debug("Hedging %s with %s after %.1fs", self.primary.identity, self.secondary.identity, delay)
+            self.hedges += 1
+            secondary = asyncio.ensure_future(agenerate(self.secondary, image, input_json))
+            tasks.add(secondary)
+
+            errors = []
+            remaining = {primary, secondary}
+            while remaining:
+                done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.exception() is None and _is_valid(task.result()):
+                        if task is secondary:
+                            self.secondary_wins += 1
+                        return task.result()
+                    errors.append(task.exception() or ValueError("Model returned no suggestions."))
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+        image = ImagePayload.coerce(image)
+        return await self._race(agenerate(self.primary, image, input_json), image, input_json)
+
+    def __call__(self, image: Union[ImagePayload, str], input_json: Union[str, Dict], on_suggestion=None):
+        """
+        Blocking variant. With `on_suggestion`, the primary streams its
+        suggestions until the race is decided; the final answer is returned.
+        """
+        image = ImagePayload.coerce(image)
+        if on_suggestion is None:
+            return wait_future(async_runner.submit(self.agenerate(image, input_json)))
+
+        decided = threading.Event()
+
+        def forward(key: str, text: str) -> None:
+            if not decided.is_set():
+                on_suggestion(key, text)
+
+        primary_coro = run_blocking(self.primary, image, input_json, forward)
+        try:
+            return wait_future(async_runner.submit(self._race(primary_coro, image, input_json)))
+        finally:
+            decided.set()
+
+    def __repr__(self) -> str:
+        return f"HedgedEndpoint({self.primary!r}, {self.secondary!r})"
@@ -1,12 +1,19 @@
-import base64
 import json
 import logging
-import re
-from typing import Dict, Union
-from huggingface_hub import InferenceClient
-from utils.config import Config
+from typing import Dict, List, Optional, Union
+from huggingface_hub import AsyncInferenceClient, InferenceClient
+from services.batching import batch_instruction, image_label, parse_batch_response
+from services.cancellation import check_cancelled
+from services.client_pool import ModelEndpoint, client_pool
+from services.json_extraction import extract_json_object
+from services.streaming import SuggestionCallback, SuggestionStreamParser
+from utils.image_payload import ImagePayload
+from utils.telemetry import telemetry
 
 
+# Socket timeout of the inference clients; the endpoint deadline bounds the whole call.
+HTTP_TIMEOUT_SECONDS = 60
+
 
 class HFAltTextGenerator:
     SYSTEM_INSTRUCTION = (
@@ -33,48 +40,49 @@ class HFAltTextGenerator:
         "sans texte avant ni après, sans balisage Markdown."
     )
 
-    def __init__(self, model_id: str, provider: str = "hf-inference"):
-        self.config = Config()
-        self.client = InferenceClient(
-            provider=provider,
-            api_key=self.config.get_huggingface_key()
-        )
+    def __init__(self, model_id: str, provider: str = "hf-inference", max_images_per_call: int = 1):
+        self.provider = provider
         self.model = model_id
+        # Images the provider accepts in one message; generate_batch() packs up to this many.
+        self.max_images_per_call = max_images_per_call
+
+    @property
+    def client(self) -> InferenceClient:
+        return client_pool.client(
+            "huggingface",
+            lambda api_key, provider: InferenceClient(provider=provider, api_key=api_key, timeout=HTTP_TIMEOUT_SECONDS),
+            self.provider,
+        )
 
-    def _decode_base64(self, b64: str) -> str:
-        image_data = base64.b64decode(b64)
-        data_url = "data:image/png;base64," + base64.b64encode(image_data).decode("utf-8")
-        return data_url
+    @property
+    def async_client(self) -> AsyncInferenceClient:
+        return client_pool.client(
+            "huggingface",
+            lambda api_key, provider, _: AsyncInferenceClient(
+                provider=provider, api_key=api_key, timeout=HTTP_TIMEOUT_SECONDS
+            ),
+            self.provider,
+            "async",
+        )
+
+    @property
+    def provider_key(self) -> str:
+        return f"huggingface/{self.provider}"
 
     def _extract_json_from_response(self, text: str) -> Dict[str, str]:
-        # Essayez de trouver un JSON structuré {"1": "...", "2": "..."}
-        json_match = re.search(r"\{\s*\"1\"\s*:\s*\".*?\"\s*,\s*\"2\"\s*:\s*\".*?\"\s*\}", text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-
-        # Nettoyage manuel si Markdown ou guillemets spéciaux
-        cleaned = text.replace("“", "\"").replace("”", "\"").replace("```json", "").replace("```", "").strip()
-        start = cleaned.find("{")
-        end = cleaned.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            json_part = cleaned[start:end+1]
-            try:
-                return json.loads(json_part)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Parsing failed after cleanup: {e}\nContent: {json_part}")
-        
-        raise ValueError(f"No valid JSON found in response:\n{text}")
-
-    def generate(self, base64_image_str: str, input_json: Union[str, Dict]) -> Dict[str, str]:
+        return extract_json_object(text)
+
+    def _build_messages(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> list:
         if isinstance(input_json, dict):
             input_json_str = json.dumps(input_json, ensure_ascii=False)
         else:
             input_json_str = input_json
 
         full_prompt = self.SYSTEM_INSTRUCTION + "\n\n" + "Voici le JSON d'entrée :\n" + input_json_str
-        image_data_url = self._decode_base64(base64_image_str)
+        with telemetry.span("payload"):
+            image_data_url = ImagePayload.coerce(image).data_url
 
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": [
@@ -84,6 +92,33 @@ class HFAltTextGenerator:
             }
         ]
 
+    def _build_batch_messages(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> list:
+        if isinstance(input_json, dict):
+            input_json_str = json.dumps(input_json, ensure_ascii=False)
+        else:
+            input_json_str = input_json
+
+        full_prompt = (
+            self.SYSTEM_INSTRUCTION + "\n\n" + batch_instruction(len(images))
+            + "\n\n" + "Voici le JSON d'entrée :\n" + input_json_str
+        )
+        content = [{"type": "text", "text": full_prompt}]
+        with telemetry.span("payload"):
+            for index, image in enumerate(images):
+                content.append({"type": "text", "text": image_label(index)})
+                content.append({"type": "image_url", "image_url": {"url": ImagePayload.coerce(image).data_url}})
+
+        return [{"role": "user", "content": content}]
+
+    def generate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                 on_suggestion: Optional[SuggestionCallback] = None) -> Dict[str, str]:
+        """
+        Returns the parsed suggestions. With `on_suggestion`, the answer is
+        streamed and each suggestion is reported as soon as it is complete.
+        """
+        messages = self._build_messages(image, input_json)
+        if on_suggestion is not None:
+            return self._generate_streaming(messages, on_suggestion)
         try:
             completion = self.client.chat.completions.create(
                 model=self.model,
@@ -92,25 +127,87 @@ class HFAltTextGenerator:
         except Exception as e:
             raise RuntimeError(f"HuggingFace model request failed: {str(e)}")
 
-        response_text = completion.choices[0].message.content
-        logging.debug("HF raw response: %s", response_text)
+        return self._parse_completion(completion)
+
+    def _generate_streaming(self, messages: list, on_suggestion: SuggestionCallback) -> Dict[str, str]:
+        parser = SuggestionStreamParser(on_suggestion)
+        response_text = ""
+        first_token = telemetry.first_token_timer()
+        try:
+            for chunk in self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True
+            ):
+                check_cancelled()
+                first_token.chunk()
+                self._record_usage(chunk)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ""
+                response_text += text
+                parser.feed(text)
+        except Exception as e:
+            raise RuntimeError(f"HuggingFace model request failed: {str(e)}")
 
+        logging.debug("HF raw response: %s", response_text)
         return self._extract_json_from_response(response_text)
 
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> Dict[str, str]:
+        messages = self._build_messages(image, input_json)
+        try:
+            completion = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+        except Exception as e:
+            raise RuntimeError(f"HuggingFace model request failed: {str(e)}")
+
+        return self._parse_completion(completion)
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """One request for several images; returns the answer keyed by image number ("1", "2", ...)."""
+        messages = self._build_batch_messages(images, input_json)
+        try:
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+        except Exception as e:
+            raise RuntimeError(f"HuggingFace model request failed: {str(e)}")
+
+        self._record_usage(completion)
+        return parse_batch_response(completion.choices[0].message.content)
 
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        messages = self._build_batch_messages(images, input_json)
+        try:
+            completion = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+        except Exception as e:
+            raise RuntimeError(f"HuggingFace model request failed: {str(e)}")
 
-def Qwen2(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = HFAltTextGenerator("Qwen/Qwen2-VL-72B-Instruct", provider="fireworks-ai")
-    return generator.generate(base64_image_str, input_json)
+        self._record_usage(completion)
+        return parse_batch_response(completion.choices[0].message.content)
+
+    @staticmethod
+    def _record_usage(completion) -> None:
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            telemetry.tokens(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+
+    def _parse_completion(self, completion) -> Dict[str, str]:
+        self._record_usage(completion)
+        response_text = completion.choices[0].message.content
+        logging.debug("HF raw response: %s", response_text)
+
+        return self._extract_json_from_response(response_text)
 
-def aya_vision_8(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = HFAltTextGenerator("CohereLabs/aya-vision-8b", provider="cohere")
-    return generator.generate(base64_image_str, input_json)
 
-def aya_vision_32(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = HFAltTextGenerator("CohereLabs/aya-vision-32b", provider="cohere")
-    return generator.generate(base64_image_str, input_json)
 
-def llama_4_12(base64_image_str: str, input_json: Union[str, Dict]):
-    generator = HFAltTextGenerator("meta-llama/Llama-4-Maverick-17B-128E-Instruct", provider="groq")
-    return generator.generate(base64_image_str, input_json)
+Qwen2 = ModelEndpoint(HFAltTextGenerator, "Qwen/Qwen2-VL-72B-Instruct", provider="fireworks-ai", max_images_per_call=4)
+aya_vision_8 = ModelEndpoint(HFAltTextGenerator, "CohereLabs/aya-vision-8b", provider="cohere", max_images_per_call=4)
+aya_vision_32 = ModelEndpoint(HFAltTextGenerator, "CohereLabs/aya-vision-32b", provider="cohere", max_images_per_call=4)
+llama_4_12 = ModelEndpoint(HFAltTextGenerator, "meta-llama/Llama-4-Maverick-17B-128E-Instruct", provider="groq", max_images_per_call=5)
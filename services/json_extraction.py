@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# json_extraction.py
+#
+# Tolerant extraction of the JSON object from a model answer, shared by every
+# backend. One linear scan finds the first balanced {...} (skipping preambles
+# and Markdown fences), turns typographic quotes used as JSON delimiters into
+# plain ones and drops trailing commas, then json.loads runs once on the result.
+
+import json
+import re
+from typing import Dict
+
+from utils.telemetry import telemetry
+
+
+_OPENING_SMART_QUOTES = "“”„"
+_CLOSING_SMART_QUOTES = "“”"
+_SPECIAL_CHARS = re.compile(r'["\\{}\[\]“”„]')
+
+
+def extract_json_text(text: str) -> str:
+    """
+    Returns the first balanced JSON object in `text`, normalized. Raises
+    ValueError when there is no opening brace or the object never closes.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"No JSON object found in response:\n{text}")
+
+    out = []
+    depth = 0
+    quote = None  # delimiter of the string being scanned, None outside strings
+    segment_start = start
+    index = start
+
+    # Jump from one structural character to the next instead of stepping
+    # through every character of long descriptions.
+    while True:
+        match = _SPECIAL_CHARS.search(text, index)
+        if match is None:
+            break
+        index = match.start()
+        char = text[index]
+        index += 1
+
+        if quote is not None:
+            if char == "\\":
+                index += 1  # skip the escaped character
+            elif char == '"' and quote == '"':
+                quote = None
+            elif quote != '"' and (char == '"' or char in _CLOSING_SMART_QUOTES):
+                # Smart-quoted string: emit a plain closing quote.
+                out.append(text[segment_start:index - 1])
+                out.append('"')
+                segment_start = index
+                quote = None
+            continue
+
+        if char == '"':
+            quote = '"'
+        elif char in _OPENING_SMART_QUOTES:
+            out.append(text[segment_start:index - 1])
+            out.append('"')
+            segment_start = index
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            # Drop a trailing comma before the closing bracket.
+            out.append(text[segment_start:index - 1])
+            segment_start = index - 1
+            _strip_trailing_comma(out)
+            depth -= 1
+            if depth == 0:
+                out.append("}")
+                return "".join(out)
+
+    raise ValueError(f"Unterminated JSON object in response:\n{text}")
+
+
+def _strip_trailing_comma(out: list) -> None:
+    while out:
+        stripped = out[-1].rstrip()
+        if stripped.endswith(","):
+            out[-1] = stripped[:-1]
+            return
+        if stripped:
+            out[-1] = stripped
+            return
+        out.pop()
+
+
+def extract_json_object(text: str) -> Dict:
+    """Parses the first JSON object of a model answer; raises ValueError if there is none."""
+    with telemetry.span("parse"):
+        json_text = extract_json_text(str(text))
+        try:
+            parsed = json.loads(json_text, strict=False)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse JSON response: {e}\n{text}") from e
+        if not isinstance(parsed, dict):
+            raise ValueError(f"Response is not a JSON object:\n{text}")
+        return parsed
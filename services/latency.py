@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# latency.py
+#
+# Per-model latency histograms, fed by every successful single-image call
+# (see ModelEndpoint) and used to pick hedge delays from observed percentiles.
+
+import bisect
+import math
+import threading
+from typing import Dict, List, Optional
+
+
+# Log-spaced bucket upper bounds from 100 ms to ~10 min, ~12% apart.
+_BUCKET_GROWTH = 1.12
+BUCKET_BOUNDS: List[float] = [0.1 * _BUCKET_GROWTH ** i for i in range(int(math.log(6000, _BUCKET_GROWTH)) + 1)]
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets: constant memory, percentiles within ~12%."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile (0-100), or None when empty."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKET_BOUNDS[min(index, len(BUCKET_BOUNDS) - 1)]
+        return BUCKET_BOUNDS[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class LatencyTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def record(self, model_key: str, seconds: float) -> None:
+        with self._lock:
+            self._histograms.setdefault(model_key, LatencyHistogram()).record(seconds)
+
+    def percentile(self, model_key: str, p: float, min_samples: int = 1) -> Optional[float]:
+        """p-th percentile latency of `model_key`, or None with fewer than `min_samples` calls."""
+        with self._lock:
+            histogram = self._histograms.get(model_key)
+            if histogram is None or histogram.count < min_samples:
+                return None
+            return histogram.percentile(p)
+
+    def count(self, model_key: str) -> int:
+        with self._lock:
+            histogram = self._histograms.get(model_key)
+            return histogram.count if histogram else 0
+
+
+latency_tracker = LatencyTracker()
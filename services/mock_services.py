@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# mock_services.py
+#
+# Offline backend for benchmarks and CI: answers with schema-valid suggestions
+# after a simulated latency drawn from a seeded distribution, fails at a
+# configurable rate, and can answer 429 bursts like a throttled provider.
+# The answers go through the same JSON extraction as the real backends.
+# Set ALTIFY_MOCK_MODELS=1 to list the mock models in the app.
+
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+from typing import Dict, List, Optional, Union
+
+from services import cancellation
+from services.batching import parse_batch_response
+from services.client_pool import ModelEndpoint
+from services.json_extraction import extract_json_object
+from services.streaming import SuggestionCallback, SuggestionStreamParser
+from services.validation import parse_prompt_params
+from utils.image_payload import ImagePayload
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+# Short enough that "<variant> <request number> à <city>" fits the default max_length.
+_VARIANTS = ["Atelier", "Outils", "Chantier", "Façade", "Intérieur", "Matériel", "Équipe", "Travaux", "Détail", "Vue"]
+
+
+class MockRateLimitError(RuntimeError):
+    pass
+
+
+class MockAltTextGenerator:
+    """
+    Simulated provider. Request n (counted from 0) waits a latency drawn from
+    Random(f"{seed}:{n}"), so a run is reproducible call for call. Requests
+    whose number falls in the first `burst_length` of every `burst_every`
+    fail immediately with MockRateLimitError; others fail with RuntimeError
+    with probability `error_rate` after their latency.
+    """
+
+    def __init__(self, model: str = "mock", latency: str = "lognormal", latency_ms: float = 500,
+                 latency_spread: float = 0.4, per_image_ms: float = 100, error_rate: float = 0.0,
+                 burst_every: int = 0, burst_length: int = 0, seed: int = 0, max_images_per_call: int = 4):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{latency}', expected one of {LATENCY_DISTRIBUTIONS}.")
+        self.model = model
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.per_image_ms = per_image_ms
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.seed = seed
+        self.max_images_per_call = max_images_per_call
+        self.simulated_seconds: List[float] = []
+        self._calls = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def provider_key(self) -> str:
+        return f"mock/{self.model}"
+
+    def _draw_latency(self, rng: random.Random) -> float:
+        """Seconds: `latency_ms` is the fixed value, the uniform midpoint or the lognormal median."""
+        if self.latency == "fixed":
+            milliseconds = self.latency_ms
+        elif self.latency == "uniform":
+            milliseconds = rng.uniform(self.latency_ms * (1 - self.latency_spread),
+                                       self.latency_ms * (1 + self.latency_spread))
+        else:
+            milliseconds = rng.lognormvariate(math.log(self.latency_ms), self.latency_spread)
+        return max(0.0, milliseconds) / 1000
+
+    def _plan(self, images: int):
+        """Returns (request number, rng, seconds to wait, error to raise after waiting or None)."""
+        with self._lock:
+            number = next(self._calls)
+        rng = random.Random(f"{self.seed}:{number}")
+        if self.burst_every and number % self.burst_every < self.burst_length:
+            raise MockRateLimitError(f"429 Too Many Requests (simulated burst, request {number})")
+        seconds = self._draw_latency(rng) + self.per_image_ms * max(0, images - 1) / 1000
+        with self._lock:
+            self.simulated_seconds.append(seconds)
+        error = None
+        if rng.random() < self.error_rate:
+            error = RuntimeError(f"Mock request {number} failed (simulated error)")
+        return number, rng, seconds, error
+
+    @staticmethod
+    def _suggestions(params: Dict[str, str], rng: random.Random, tag: str) -> Dict[str, str]:
+        """Distinct suggestions per request (`tag`), so renamed files do not collide."""
+        try:
+            count = int(params.get("number_of_suggestions", 3))
+        except ValueError:
+            count = 3
+        try:
+            max_length = int(params.get("max_length", 0))
+        except ValueError:
+            max_length = 0
+        place = params.get("address", "").split(",")[-1].strip()
+        suggestions = {}
+        for index, variant in enumerate(rng.sample(_VARIANTS, min(max(count, 1), len(_VARIANTS))), start=1):
+            text = f"{variant} {tag} à {place}" if place else f"{variant} {tag}"
+            if max_length and len(text) > max_length:
+                text = text[:max_length].rstrip()
+            suggestions[str(index)] = text
+        return suggestions
+
+    @staticmethod
+    def _as_answer(payload: Dict) -> str:
+        # Fenced like most real answers, so extraction does its usual work.
+        return "```json\n" + json.dumps(payload, ensure_ascii=False, indent=2) + "\n```"
+
+    def generate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                 on_suggestion: Optional[SuggestionCallback] = None) -> Dict[str, str]:
+        number, rng, seconds, error = self._plan(1)
+        cancellation.sleep(seconds)
+        if error is not None:
+            raise error
+        answer = self._as_answer(self._suggestions(parse_prompt_params(input_json), rng, str(number)))
+        if on_suggestion is not None:
+            parser = SuggestionStreamParser(on_suggestion)
+            for start in range(0, len(answer), 16):
+                parser.feed(answer[start:start + 16])
+        return extract_json_object(answer)
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> Dict[str, str]:
+        number, rng, seconds, error = self._plan(1)
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+        suggestions = self._suggestions(parse_prompt_params(input_json), rng, str(number))
+        return extract_json_object(self._as_answer(suggestions))
+
+    def _batch_answer(self, images: List, input_json: Union[str, Dict], number: int, rng: random.Random) -> Dict:
+        params = parse_prompt_params(input_json)
+        answer = self._as_answer({
+            str(index + 1): self._suggestions(params, rng, f"{number}-{index + 1}")
+            for index in range(len(images))
+        })
+        return parse_batch_response(answer)
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        number, rng, seconds, error = self._plan(len(images))
+        cancellation.sleep(seconds)
+        if error is not None:
+            raise error
+        return self._batch_answer(images, input_json, number, rng)
+
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        number, rng, seconds, error = self._plan(len(images))
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+        return self._batch_answer(images, input_json, number, rng)
+
+
+# Registered in Constants.AI_MODELS_DICT when ALTIFY_MOCK_MODELS is set
+mock_fast = ModelEndpoint(MockAltTextGenerator, model="mock-fast", latency_ms=300)
+mock_slow = ModelEndpoint(MockAltTextGenerator, model="mock-slow", latency_ms=4000, latency_spread=0.8)
+mock_flaky = ModelEndpoint(MockAltTextGenerator, model="mock-flaky", latency_ms=1500, error_rate=0.1,
+                           burst_every=40, burst_length=5)
+
+MOCK_MODELS = {
+    "Mock (fast)": mock_fast,
+    "Mock (slow)": mock_slow,
+    "Mock (flaky)": mock_flaky,
+}
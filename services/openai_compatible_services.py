@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# openai_compatible_services.py
+#
+# Self-hosted backend: any server exposing an OpenAI-compatible
+# /v1/chat/completions route (llama.cpp server, vLLM, Ollama). Requests go
+# through one pooled keep-alive requests.Session per base URL, and a semaphore
+# caps how many run at once so a small GPU box is never oversubscribed. A call
+# abandoned at its deadline or cancelled gives its slot back right away.
+# benchmarks/check_openai_compatible.py exercises it against the stub server.
+
+import json
+import threading
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.batching import batch_instruction, image_label, parse_batch_response
+from services.cancellation import check_cancelled, hold, run_blocking
+from services.client_pool import ModelEndpoint, client_pool
+from services.huggingface_services import HFAltTextGenerator
+from services.json_extraction import extract_json_object
+from services.streaming import SuggestionCallback, SuggestionStreamParser
+from utils.config import Config
+from utils.image_payload import ImagePayload
+from utils.telemetry import telemetry
+
+
+DEFAULT_MAX_CONCURRENCY = 2
+DEFAULT_TIMEOUT_SECONDS = 120
+# Longer than the default deadline: a cold server loads the weights on its first request.
+DEFAULT_DEADLINE_SECONDS = 240.0
+
+
+def _build_session(api_key: str, base_url: str, pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if api_key:
+        session.headers["Authorization"] = f"Bearer {api_key}"
+    return session
+
+
+class OpenAICompatibleAltTextGenerator:
+    SYSTEM_INSTRUCTION = HFAltTextGenerator.SYSTEM_INSTRUCTION
+
+    def __init__(self, base_url: str, model: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_images_per_call: int = 1, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_images_per_call = max_images_per_call
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def provider_key(self) -> str:
+        return f"local/{urlparse(self.base_url).netloc or self.base_url}"
+
+    @property
+    def session(self) -> requests.Session:
+        return client_pool.client("openai_compatible", _build_session, self.base_url, self.max_concurrency)
+
+    @staticmethod
+    def _normalize_json(input_json: Union[str, Dict]) -> str:
+        if input_json is None:
+            raise ValueError("input_json cannot be None.")
+        return input_json if isinstance(input_json, str) else json.dumps(input_json, ensure_ascii=False)
+
+    def _build_messages(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict],
+                        batched: bool = False) -> list:
+        text = "Voici le JSON d'entrée :\n" + self._normalize_json(input_json)
+        if batched:
+            text = batch_instruction(len(images)) + "\n\n" + text
+        content = [{"type": "text", "text": text}]
+        with telemetry.span("payload"):
+            for index, image in enumerate(images):
+                if batched:
+                    content.append({"type": "text", "text": image_label(index)})
+                content.append({"type": "image_url", "image_url": {"url": ImagePayload.coerce(image).data_url}})
+        return [
+            {"role": "system", "content": self.SYSTEM_INSTRUCTION},
+            {"role": "user", "content": content},
+        ]
+
+    def _complete(self, messages: list, on_suggestion: Optional[SuggestionCallback] = None) -> str:
+        """Posts one chat completion and returns the answer text, streamed when a callback is given."""
+        payload = {"model": self.model, "messages": messages, "stream": on_suggestion is not None}
+        with hold(self._slots):
+            first_token = telemetry.first_token_timer()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    json=payload,
+                    timeout=self.timeout,
+                    stream=on_suggestion is not None,
+                )
+                response.raise_for_status()
+                if on_suggestion is None:
+                    answer = response.json()
+                    self._record_usage(answer)
+                    return answer["choices"][0]["message"]["content"] or ""
+                return self._read_stream(response, on_suggestion, first_token)
+            except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+                raise RuntimeError(f"Local model request failed: {str(e)}") from e
+
+    @staticmethod
+    def _record_usage(answer: Dict) -> None:
+        usage = answer.get("usage") or {}
+        telemetry.tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    def _read_stream(self, response: requests.Response, on_suggestion: SuggestionCallback, first_token) -> str:
+        parser = SuggestionStreamParser(on_suggestion)
+        response_text = ""
+        # Server-sent events are always UTF-8, charset header or not.
+        response.encoding = "utf-8"
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                check_cancelled()
+                first_token.chunk()
+                event = json.loads(data)
+                self._record_usage(event)  # only the last event carries usage, if the server sends it
+                choices = event.get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content") or ""
+                response_text += text
+                parser.feed(text)
+        return response_text
+
+    def generate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict],
+                 on_suggestion: Optional[SuggestionCallback] = None) -> Dict[str, str]:
+        """
+        Returns the parsed suggestions. With `on_suggestion`, the answer is
+        streamed and each suggestion is reported as soon as it is complete.
+        """
+        return extract_json_object(self._complete(self._build_messages([image], input_json), on_suggestion))
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]) -> Dict[str, str]:
+        # requests is blocking; the semaphore still bounds concurrent calls.
+        return await run_blocking(self.generate, image, input_json)
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """One request for several images; returns the answer keyed by image number ("1", "2", ...)."""
+        return parse_batch_response(self._complete(self._build_messages(images, input_json, batched=True)))
+
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        return await run_blocking(self.generate_batch, images, input_json)
+
+
+def models_from_config() -> Dict[str, ModelEndpoint]:
+    """The local model configured in Settings as {display name: endpoint}, or {} when none is set."""
+    config = Config()
+    base_url = config.get_local_base_url()
+    model = config.get_local_model()
+    if not base_url or not model:
+        return {}
+    endpoint = ModelEndpoint(
+        OpenAICompatibleAltTextGenerator,
+        base_url,
+        model,
+        max_concurrency=config.get_local_max_concurrency(),
+        deadline=DEFAULT_DEADLINE_SECONDS,
+    )
+    return {config.get_local_model_name() or f"{model} (Local)": endpoint}
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# rate_limiter.py
+#
+# Per-provider token buckets (requests/minute and tokens/minute) so concurrent
+# batches stay under each backend's quota instead of collecting 429s.
+# Buckets live on the shared async loop (services.async_runner) and are awaited
+# before every request.
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.config import Config
+
+
+# (requests per minute, tokens per minute); 0 means unlimited.
+# Defaults follow the free tiers; override them with Config.set_rate_limit().
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gemini": (15, 1_000_000),
+    "huggingface/groq": (30, 6_000),
+    "huggingface/fireworks-ai": (60, 0),
+    "huggingface/cohere": (20, 0),
+}
+FALLBACK_RATE_LIMIT = (60, 0)
+# Self-hosted servers (services.openai_compatible_services) have no quota;
+# their own concurrency limit is what protects them. Mock providers
+# (services.mock_services) simulate their own 429s. "auto"
+# (services.scheduler) takes quota from the model it picks.
+UNLIMITED_PROVIDER_PREFIXES = ("local/", "mock/", "auto")
+
+# Rough token cost of an alt text request: system instruction + JSON answer,
+# plus each attached image. Prompt text is added at ~4 characters per token.
+BASE_REQUEST_TOKENS = 450
+IMAGE_TOKENS = 750
+
+
+def estimate_request_tokens(prompt: str, images: int = 1) -> int:
+    return BASE_REQUEST_TOKENS + IMAGE_TOKENS * images + len(prompt or "") // 4
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens, refilled continuously at `rate_per_minute`.
+    acquire() waits until enough tokens are available.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # A request larger than the whole bucket only waits for a full bucket.
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate_per_second)
+
+
+class ProviderRateLimiter:
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+
+    def _limits(self, provider_key: str) -> Tuple[int, int]:
+        if provider_key.startswith(UNLIMITED_PROVIDER_PREFIXES):
+            default = (0, 0)
+        else:
+            default = DEFAULT_RATE_LIMITS.get(provider_key, FALLBACK_RATE_LIMIT)
+        return Config().get_rate_limit(provider_key, default)
+
+    def _get_buckets(self, provider_key: str):
+        if provider_key not in self._buckets:
+            rpm, tpm = self._limits(provider_key)
+            self._buckets[provider_key] = (
+                TokenBucket(rpm) if rpm > 0 else None,
+                TokenBucket(tpm) if tpm > 0 else None,
+            )
+        return self._buckets[provider_key]
+
+    async def acquire(self, provider_key: str, tokens: int) -> None:
+        """Waits for one request slot and `tokens` tokens of `provider_key`'s quota."""
+        request_bucket, token_bucket = self._get_buckets(provider_key)
+        if request_bucket is not None:
+            await request_bucket.acquire(1)
+        if token_bucket is not None:
+            await token_bucket.acquire(tokens)
+
+    def reset(self) -> None:
+        """Drops the buckets so changed limits in Config take effect."""
+        self._buckets.clear()
+
+
+rate_limiter = ProviderRateLimiter()
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# resilience.py
+#
+# Per-provider circuit breakers and model fallback chains. After a few
+# consecutive failures a provider's breaker opens and requests to it fail
+# immediately (so a chain moves straight on to the next model) until a
+# cooldown has passed; then a single trial request decides whether it closes.
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Union
+
+from services.async_runner import acquire_quota, agenerate
+from utils.image_payload import ImagePayload
+
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN_SECONDS = 60.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 cooldown: float = DEFAULT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """False while open; after the cooldown, lets exactly one trial request through."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._state = CLOSED
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """The request let through was abandoned (cancelled) without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self.failure_threshold = DEFAULT_FAILURE_THRESHOLD
+        self.cooldown = DEFAULT_COOLDOWN_SECONDS
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, failure_threshold: int, cooldown: float) -> None:
+        """Applies to every breaker, existing ones included."""
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.cooldown = cooldown
+            for breaker in self._breakers.values():
+                breaker.failure_threshold = failure_threshold
+                breaker.cooldown = cooldown
+
+    def breaker(self, provider_key: str) -> CircuitBreaker:
+        with self._lock:
+            if provider_key not in self._breakers:
+                self._breakers[provider_key] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self._breakers[provider_key]
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {provider_key: breaker.state for provider_key, breaker in breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
+
+
+class _PassThroughBreaker(CircuitBreaker):
+    """Never opens; for endpoints that already guard each provider they call."""
+
+    def allow_request(self) -> bool:
+        return True
+
+    def record_failure(self) -> None:
+        pass
+
+
+def _breaker_for(model) -> CircuitBreaker:
+    # AutoEndpoint records every failure on the breaker of the model it picked;
+    # a second breaker around it would count them twice and hide healthy models.
+    if getattr(model, "guards_providers", False):
+        return _PassThroughBreaker()
+    return circuit_breakers.breaker(model.provider_key)
+
+
+def counts_as_outage(error: Exception) -> bool:
+    # A ValueError is an unparsable answer: the provider is up, so try the
+    # next model without tripping the breaker.
+    return not isinstance(error, ValueError)
+
+
+class FallbackChain:
+    """
+    Behaves like a ModelEndpoint. Tries `models` in order, skipping those whose
+    provider's breaker is open, and returns the first answer. Raises the last
+    error when every model failed, or CircuitOpenError when none was tried.
+    """
+
+    def __init__(self, models: List):
+        if not models:
+            raise ValueError("A fallback chain needs at least one model.")
+        self.models = models
+
+    @property
+    def primary(self):
+        return self.models[0]
+
+    @property
+    def model(self) -> str:
+        return self.primary.model
+
+    @property
+    def provider_key(self) -> str:
+        return self.primary.provider_key
+
+    @property
+    def identity(self) -> str:
+        return self.primary.identity
+
+    @property
+    def max_images_per_call(self) -> int:
+        return getattr(self.primary, "max_images_per_call", 1)
+
+    def _candidates(self, images: int = 1):
+        """
+        Yields (index, model, breaker) for every model that takes `images`
+        images per call and whose breaker lets a request through.
+        """
+        for index, model in enumerate(self.models):
+            if images > 1 and getattr(model, "max_images_per_call", 1) < images:
+                continue
+            breaker = _breaker_for(model)
+            if breaker.allow_request():
+                yield index, model, breaker
+            else:
+                logging.debug("Skipping %s: circuit open for %s", model.identity, model.provider_key)
+
+    def _failed(self, model, breaker: CircuitBreaker, error: Exception) -> None:
+        logging.debug("%s failed, trying the next model: %s", model.identity, error)
+        if counts_as_outage(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _all_failed(self, last_error):
+        if last_error is not None:
+            return last_error
+        return CircuitOpenError("Every model in the fallback chain is unavailable; try again later.")
+
+    def __call__(self, image: Union[ImagePayload, str], input_json: Union[str, Dict], on_suggestion=None):
+        last_error = None
+        for _, model, breaker in self._candidates():
+            try:
+                if on_suggestion is not None:
+                    result = model(image=image, input_json=input_json, on_suggestion=on_suggestion)
+                else:
+                    result = model(image=image, input_json=input_json)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, e)
+                last_error = e
+                continue
+            breaker.record_success()
+            return result
+        raise self._all_failed(last_error)
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+        last_error = None
+        for index, model, breaker in self._candidates():
+            try:
+                # The caller already waited for the primary's quota.
+                if index:
+                    await acquire_quota(model, input_json)
+                result = await agenerate(model, image, input_json)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, e)
+                last_error = e
+                continue
+            breaker.record_success()
+            return result
+        raise self._all_failed(last_error)
+
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """
+        Batched request to the first available model able to take all images.
+        Raises ValueError otherwise, so services.batching retries image by image
+        through agenerate() and its fallbacks.
+        """
+        for index, model, breaker in self._candidates(len(images)):
+            try:
+                if index:
+                    await acquire_quota(model, input_json, len(images))
+                result = await model.agenerate_batch(images, input_json)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, e)
+                continue
+            breaker.record_success()
+            return result
+        raise ValueError("No model in the fallback chain could answer the batch.")
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """Blocking variant of agenerate_batch()."""
+        for _, model, breaker in self._candidates(len(images)):
+            try:
+                result = model.generate_batch(images, input_json)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, e)
+                continue
+            breaker.record_success()
+            return result
+        raise ValueError("No model in the fallback chain could answer the batch.")
+
+    def __repr__(self) -> str:
+        return f"FallbackChain({self.models!r})"
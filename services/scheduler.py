@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# scheduler.py
+#
+# "Auto (fastest healthy)": every request goes to the registered model with
+# the best expected latency, from exponentially weighted moving averages of
+# each model's latency and error rate. Requests already in flight count
+# against a model, so a large batch spreads over several models as soon as
+# the best one slows down or starts failing. Models whose stats have gone
+# stale are re-tried now and then, so a provider that recovered wins its
+# traffic back.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Union
+
+from services.async_runner import acquire_quota, agenerate
+from services.latency import latency_tracker
+from services.resilience import OPEN, CircuitOpenError, circuit_breakers, counts_as_outage
+from utils.image_payload import ImagePayload
+
+
+DEFAULT_ALPHA = 0.3
+DEFAULT_EXPLORATION_RATE = 0.05
+DEFAULT_STALE_AFTER_SECONDS = 300.0
+# Expected latency of a model never observed in this session.
+DEFAULT_PRIOR_SECONDS = 10.0
+# Each request already in flight on a model adds this fraction to its expected latency.
+IN_FLIGHT_PENALTY = 0.5
+# Models tried for one request before giving up (the fallback chain takes over).
+MAX_ATTEMPTS = 2
+
+
+@dataclass
+class ModelStats:
+    latency: Optional[float] = None  # EWMA of successful call durations, seconds
+    error_rate: float = 0.0          # EWMA of outcomes, 1 for a failure and 0 for a success
+    samples: int = 0
+    updated_at: float = 0.0          # time.monotonic() of the last outcome
+    in_flight: int = 0
+
+
+class AdaptiveScheduler:
+    """
+    Ranks `models` ({name: endpoint}) for each request. `candidates` limits
+    the ranking to some names (None: all). Exploration moves one model to
+    the front of a ranking: a model whose stats are older than `stale_after`
+    seconds and that has nothing in flight, or, with probability
+    `exploration_rate`, a random eligible model.
+    """
+
+    def __init__(self, models: Dict, alpha: float = DEFAULT_ALPHA,
+                 exploration_rate: float = DEFAULT_EXPLORATION_RATE,
+                 stale_after: float = DEFAULT_STALE_AFTER_SECONDS, seed: Optional[int] = None):
+        self.models = models
+        self.candidates: Optional[List[str]] = None
+        self.alpha = alpha
+        self.exploration_rate = exploration_rate
+        self.stale_after = stale_after
+        self.explorations = 0
+        self._stats: Dict[str, ModelStats] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, candidates: Optional[List[str]]) -> None:
+        """Restricts Auto to these model names; None or an empty list allows every model."""
+        self.candidates = [name for name in candidates if name in self.models] if candidates else None
+
+    def stats(self, name: str) -> ModelStats:
+        with self._lock:
+            return replace(self._stats.get(name, ModelStats()))
+
+    def _expected_seconds(self, name: str, stats: ModelStats) -> float:
+        latency = stats.latency
+        if latency is None:
+            # Manual use of the model earlier in the session is a better prior than a constant.
+            latency = latency_tracker.percentile(self.models[name].identity, 50) or DEFAULT_PRIOR_SECONDS
+        return latency * (1 + IN_FLIGHT_PENALTY * stats.in_flight) / max(0.05, 1 - stats.error_rate)
+
+    def _eligible(self, images: int) -> List[str]:
+        names = self.candidates if self.candidates is not None else list(self.models)
+        eligible = []
+        for name in names:
+            model = self.models[name]
+            if images > 1 and getattr(model, "max_images_per_call", 1) < images:
+                continue
+            if circuit_breakers.breaker(model.provider_key).state == OPEN:
+                continue
+            eligible.append(name)
+        return eligible
+
+    def ranking(self, images: int = 1) -> List[str]:
+        """Eligible model names, best first (after exploration, if any)."""
+        eligible = self._eligible(images)
+        now = time.monotonic()
+        with self._lock:
+            stats = {name: self._stats.get(name, ModelStats()) for name in eligible}
+            ranked = sorted(eligible, key=lambda name: self._expected_seconds(name, stats[name]))
+            stale = [
+                name for name in ranked
+                if stats[name].samples and not stats[name].in_flight
+                and now - stats[name].updated_at > self.stale_after
+            ]
+            explore = None
+            if stale:
+                explore = min(stale, key=lambda name: stats[name].updated_at)
+            elif len(ranked) > 1 and self._rng.random() < self.exploration_rate:
+                explore = self._rng.choice(ranked[1:])
+            if explore is not None and explore != ranked[0]:
+                self.explorations += 1
+                ranked.remove(explore)
+                ranked.insert(0, explore)
+        return ranked
+
+    def best(self, images: int = 1) -> Optional[str]:
+        """The model that would get the next request, without exploration."""
+        eligible = self._eligible(images)
+        with self._lock:
+            stats = {name: self._stats.get(name, ModelStats()) for name in eligible}
+            return min(eligible, key=lambda name: self._expected_seconds(name, stats[name]), default=None)
+
+    def started(self, name: str) -> None:
+        with self._lock:
+            self._stats.setdefault(name, ModelStats()).in_flight += 1
+
+    def finished(self, name: str, seconds: Optional[float], ok: bool) -> None:
+        """Records an outcome; `seconds` None means abandoned (cancelled) without one."""
+        with self._lock:
+            stats = self._stats.setdefault(name, ModelStats())
+            stats.in_flight = max(0, stats.in_flight - 1)
+            if seconds is None:
+                return
+            if ok:
+                stats.latency = seconds if stats.latency is None else (
+                    self.alpha * seconds + (1 - self.alpha) * stats.latency
+                )
+            elif stats.latency is not None and seconds > stats.latency:
+                # A slow failure (a timeout) says the model is slow, too.
+                stats.latency = self.alpha * seconds + (1 - self.alpha) * stats.latency
+            stats.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * stats.error_rate
+            stats.samples += 1
+            stats.updated_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, ModelStats]:
+        with self._lock:
+            return {name: replace(stats) for name, stats in self._stats.items()}
+
+
+class AutoEndpoint:
+    """
+    Behaves like a ModelEndpoint. Each request goes to the scheduler's best
+    model (behind that provider's circuit breaker and rate limit); a failure
+    moves on to the next-ranked model, up to MAX_ATTEMPTS models.
+    """
+
+    model = "auto"
+    # Quota is taken per chosen model, see services.rate_limiter.
+    provider_key = "auto"
+    # Each chosen model goes through its provider's breaker, so FallbackChain adds none.
+    guards_providers = True
+
+    def __init__(self, scheduler: AdaptiveScheduler):
+        self.scheduler = scheduler
+
+    @property
+    def identity(self) -> str:
+        return "auto"
+
+    @property
+    def max_images_per_call(self) -> int:
+        best = self.scheduler.best()
+        return getattr(self.scheduler.models[best], "max_images_per_call", 1) if best else 1
+
+    def _attempts(self, images: int = 1):
+        """Yields (name, endpoint, breaker) in ranking order while breakers let requests through."""
+        attempts = 0
+        for name in self.scheduler.ranking(images):
+            if attempts >= MAX_ATTEMPTS:
+                return
+            endpoint = self.scheduler.models[name]
+            breaker = circuit_breakers.breaker(endpoint.provider_key)
+            if not breaker.allow_request():
+                continue
+            attempts += 1
+            yield name, endpoint, breaker
+
+    # Batches are recorded per image, so they compare with single-image calls.
+    def _failed(self, name: str, endpoint, breaker, started: float, error: Exception, images: int = 1) -> None:
+        logging.debug("Auto: %s failed: %s", endpoint.identity, error)
+        self.scheduler.finished(name, (time.perf_counter() - started) / images, ok=False)
+        if counts_as_outage(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _succeeded(self, name: str, breaker, started: float, images: int = 1) -> None:
+        self.scheduler.finished(name, (time.perf_counter() - started) / images, ok=True)
+        breaker.record_success()
+
+    @staticmethod
+    def _no_answer(last_error: Optional[Exception]) -> Exception:
+        return last_error or CircuitOpenError("No model is available for Auto; try again later.")
+
+    def __call__(self, image: Union[ImagePayload, str], input_json: Union[str, Dict], on_suggestion=None):
+        last_error = None
+        for name, endpoint, breaker in self._attempts():
+            self.scheduler.started(name)
+            started = time.perf_counter()
+            try:
+                if on_suggestion is not None:
+                    result = endpoint(image=image, input_json=input_json, on_suggestion=on_suggestion)
+                else:
+                    result = endpoint(image=image, input_json=input_json)
+            except asyncio.CancelledError:
+                self.scheduler.finished(name, None, ok=False)
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(name, endpoint, breaker, started, e)
+                last_error = e
+                continue
+            self._succeeded(name, breaker, started)
+            return result
+        raise self._no_answer(last_error)
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+        last_error = None
+        for name, endpoint, breaker in self._attempts():
+            self.scheduler.started(name)
+            started = time.perf_counter()
+            try:
+                await acquire_quota(endpoint, input_json)
+                result = await agenerate(endpoint, image, input_json)
+            except asyncio.CancelledError:
+                self.scheduler.finished(name, None, ok=False)
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(name, endpoint, breaker, started, e)
+                last_error = e
+                continue
+            self._succeeded(name, breaker, started)
+            return result
+        raise self._no_answer(last_error)
+
+    async def agenerate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """Batched request to the best model able to take all images; ValueError lets batching go image by image."""
+        for name, endpoint, breaker in self._attempts(len(images)):
+            self.scheduler.started(name)
+            started = time.perf_counter()
+            try:
+                await acquire_quota(endpoint, input_json, len(images))
+                result = await endpoint.agenerate_batch(images, input_json)
+            except asyncio.CancelledError:
+                self.scheduler.finished(name, None, ok=False)
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(name, endpoint, breaker, started, e, len(images))
+                continue
+            self._succeeded(name, breaker, started, len(images))
+            return result
+        raise ValueError("No model available to Auto could answer the batch.")
+
+    def generate_batch(self, images: List[Union[ImagePayload, str]], input_json: Union[str, Dict]) -> Dict:
+        """Blocking variant of agenerate_batch()."""
+        for name, endpoint, breaker in self._attempts(len(images)):
+            self.scheduler.started(name)
+            started = time.perf_counter()
+            try:
+                result = endpoint.generate_batch(images, input_json)
+            except asyncio.CancelledError:
+                self.scheduler.finished(name, None, ok=False)
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(name, endpoint, breaker, started, e, len(images))
+                continue
+            self._succeeded(name, breaker, started, len(images))
+            return result
+        raise ValueError("No model available to Auto could answer the batch.")
+
+    def __repr__(self) -> str:
+        return f"AutoEndpoint({list(self.scheduler.models)!r})"
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# streaming.py
+#
+# Incremental parsing of the {"1": "...", "2": "..."} answer while it streams
+# in, so each suggestion can be shown as soon as its closing quote arrives
+# instead of after the whole response has been received.
+
+import json
+from typing import Callable, Dict, Optional
+
+
+SuggestionCallback = Callable[[str, str], None]
+
+
+class SuggestionStreamParser:
+    """
+    Feed it text chunks in order; on_suggestion(key, text) is called once for
+    every top-level string value of the first JSON object in the stream.
+    Anything before the opening brace (Markdown fences, preamble) is skipped
+    and nested values are ignored. The complete answer is still parsed by the
+    generator; this only drives the live preview.
+    """
+
+    def __init__(self, on_suggestion: Optional[SuggestionCallback] = None):
+        self.on_suggestion = on_suggestion
+        self.suggestions: Dict[str, str] = {}
+        self._depth = 0
+        self._done = False
+        self._in_string = False
+        self._escaped = False
+        self._buffer = []
+        self._key: Optional[str] = None
+        self._expect_value = False
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk or "":
+            if self._done:
+                return
+            if self._in_string:
+                self._feed_string(char)
+            elif char == "{":
+                self._depth += 1
+                self._expect_value = False
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                self._done = self._depth == 0
+            elif char == "[" and self._depth:
+                self._depth += 1
+            elif char == "]" and self._depth > 1:
+                self._depth -= 1
+            elif char == '"' and self._depth:
+                self._in_string = True
+                self._buffer = []
+            elif char == ":" and self._depth == 1:
+                self._expect_value = True
+            elif char == "," and self._depth == 1:
+                self._key, self._expect_value = None, False
+
+    def _feed_string(self, char: str) -> None:
+        if self._escaped:
+            self._escaped = False
+        elif char == "\\":
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+            if self._depth == 1:
+                self._close_string("".join(self._buffer))
+            return
+        self._buffer.append(char)
+
+    def _close_string(self, raw: str) -> None:
+        try:
+            text = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            text = raw
+        if not self._expect_value:
+            self._key = text
+            return
+        if self._key is not None:
+            self.suggestions[self._key] = text
+            if self.on_suggestion is not None:
+                self.on_suggestion(self._key, text)
+        self._key, self._expect_value = None, False
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# validation.py
+#
+# Local checks of every answer against what the prompt asked for (length,
+# address, French, no duplicates). When only some suggestions fail, a short
+# follow-up request asks for replacements of just those keys instead of the
+# user regenerating everything. Each follow-up is a paid request, so they are
+# capped per endpoint and small length overruns are let through.
+
+import asyncio
+import logging
+import re
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Union
+
+from services.async_runner import acquire_quota, agenerate
+from utils.image_payload import ImagePayload
+from utils.telemetry import telemetry
+
+
+ADDRESS_MATCH_RATIO = 0.8
+DUPLICATE_RATIO = 0.9
+# Characters over max_length that are accepted without a follow-up request.
+DEFAULT_LENGTH_TOLERANCE = 10
+# Follow-up requests one ValidatedEndpoint makes at most (one mini-app batch).
+DEFAULT_MAX_FOLLOWUPS = 20
+
+_ADDRESS_STOPWORDS = {
+    "rue", "avenue", "boulevard", "bd", "av", "chemin", "route", "place", "impasse", "allee",
+    "quai", "cours", "zone", "za", "zi", "bis", "ter", "cedex", "france",
+    "de", "du", "des", "la", "le", "les", "l", "d", "et", "sur", "sous", "en", "aux", "au",
+}
+_FRENCH_WORDS = {
+    "le", "la", "les", "des", "du", "de", "un", "une", "et", "au", "aux", "en", "pour",
+    "avec", "sur", "dans", "par", "son", "sa", "ses", "ce", "cette", "est", "d", "l", "a",
+}
+_ENGLISH_WORDS = {
+    "the", "and", "of", "with", "for", "in", "on", "at", "an", "is", "to", "from", "by",
+    "this", "its", "their", "near", "inside", "outside",
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accents stripped: 'Façade à Nîmes' -> 'facade a nimes'."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(normalize(text))
+
+
+def parse_prompt_params(input_json: Union[str, Dict]) -> Dict[str, str]:
+    """
+    Reads the parameters out of a prompt built by the UIs
+    ("Activity: ... | Address: ... | max_length: 25") or a JSON-like dict.
+    Keys are lowercased ('adress' is accepted for 'address').
+    """
+    if isinstance(input_json, dict):
+        items = input_json.items()
+    else:
+        items = (part.split(":", 1) for part in str(input_json).split(" | ") if ":" in part)
+    params = {}
+    for key, value in items:
+        key = str(key).strip().lower()
+        params["address" if key == "adress" else key] = str(value).strip()
+    return params
+
+
+def _int_param(params: Dict[str, str], key: str) -> Optional[int]:
+    try:
+        return int(params[key])
+    except (KeyError, ValueError):
+        return None
+
+
+def _address_tokens(address: str) -> List[str]:
+    return [word for word in _words(address) if len(word) >= 3 and not word.isdigit() and word not in _ADDRESS_STOPWORDS]
+
+
+def mentions_address(text: str, address: str) -> bool:
+    """True when the text contains the address or one of its place names, allowing small typos."""
+    if normalize(address) in normalize(text):
+        return True
+    tokens = _address_tokens(address)
+    if not tokens:
+        return True
+    words = _words(text)
+    return any(
+        SequenceMatcher(None, token, word).ratio() >= ADDRESS_MATCH_RATIO
+        for token in tokens
+        for word in words
+    )
+
+
+def looks_french(text: str) -> bool:
+    """Rejects only text that is clearly English; short alt texts often have few function words."""
+    words = _words(text)
+    english = sum(word in _ENGLISH_WORDS for word in words)
+    french = sum(word in _FRENCH_WORDS for word in words)
+    return not (english >= 2 and english > french)
+
+
+def validate_suggestions(suggestions: Dict[str, str], params: Dict[str, str],
+                         length_tolerance: int = 0) -> Dict[str, List[str]]:
+    """
+    Returns {key: [problems]} for every failing suggestion. Suggestions that
+    were asked for but are missing are reported as well. A suggestion up to
+    `length_tolerance` characters over max_length passes.
+    """
+    max_length = _int_param(params, "max_length")
+    expected = _int_param(params, "number_of_suggestions")
+    address = params.get("address", "")
+
+    problems: Dict[str, List[str]] = {}
+    seen: List[str] = []
+    for key, text in suggestions.items():
+        issues = []
+        if not isinstance(text, str) or not text.strip():
+            problems[key] = ["empty"]
+            continue
+        if max_length and len(text) > max_length + length_tolerance:
+            issues.append(f"longer than {max_length} characters ({len(text)})")
+        if address and not mentions_address(text, address):
+            issues.append(f"does not mention '{address}'")
+        if not looks_french(text):
+            issues.append("not written in French")
+        normalized = normalize(text)
+        if any(SequenceMatcher(None, normalized, other).ratio() >= DUPLICATE_RATIO for other in seen):
+            issues.append("duplicates another suggestion")
+        seen.append(normalized)
+        if issues:
+            problems[key] = issues
+
+    if expected:
+        for index in range(1, expected + 1):
+            if str(index) not in suggestions:
+                problems[str(index)] = ["missing"]
+    return problems
+
+
+def follow_up_prompt(input_json: Union[str, Dict], params: Dict[str, str], suggestions: Dict[str, str],
+                     problems: Dict[str, List[str]]) -> str:
+    """Same parameters, asking only for len(problems) new suggestions that avoid the listed problems."""
+    kept = [text for key, text in suggestions.items() if key not in problems and isinstance(text, str)]
+    parts = [
+        f"{key}: {value}" for key, value in parse_prompt_params(input_json).items()
+        if key != "number_of_suggestions"
+    ]
+    parts.append(f"number_of_suggestions: {len(problems)}")
+    issues = sorted({issue for key_issues in problems.values() for issue in key_issues if issue != "missing"})
+    if issues:
+        parts.append(f"avoid: {'; '.join(issues)}")
+    if kept:
+        parts.append(f"different_from: {' / '.join(kept)}")
+    return " | ".join(parts)
+
+
+def merge_replacements(suggestions: Dict[str, str], problems: Dict[str, List[str]],
+                       replacements: Dict[str, str], params: Dict[str, str],
+                       length_tolerance: int = 0) -> Dict[str, str]:
+    """
+    Puts the replacement answers (keyed "1", "2", ...) in place of the failing
+    keys, keeping an original when its replacement is no better.
+    """
+    merged = dict(suggestions)
+    for key, replacement in zip(sorted(problems, key=_key_order), replacements.values()):
+        candidate = dict(merged)
+        candidate[key] = replacement
+        issues = validate_suggestions(candidate, params, length_tolerance).get(key, [])
+        if len(issues) < len(problems[key]) or key not in merged:
+            merged[key] = replacement
+    return dict(sorted(merged.items(), key=lambda item: _key_order(item[0])))
+
+
+def _key_order(key: str):
+    return (0, int(key)) if key.isdigit() else (1, key)
+
+
+class ValidatedEndpoint:
+    """
+    Behaves like a ModelEndpoint. Every answer is validated locally against
+    the prompt; failing suggestions are re-asked once, on their own, until
+    `max_followups` follow-up requests were made (None: no limit).
+    """
+
+    def __init__(self, model, length_tolerance: int = DEFAULT_LENGTH_TOLERANCE,
+                 max_followups: Optional[int] = DEFAULT_MAX_FOLLOWUPS):
+        self.inner = model
+        self.length_tolerance = length_tolerance
+        self.max_followups = max_followups
+        self.followups = 0
+        self.repaired = 0
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.inner.model
+
+    @property
+    def provider_key(self) -> str:
+        return self.inner.provider_key
+
+    @property
+    def identity(self) -> str:
+        return self.inner.identity
+
+    @property
+    def max_images_per_call(self) -> int:
+        return getattr(self.inner, "max_images_per_call", 1)
+
+    def _plan(self, input_json, suggestions):
+        with telemetry.span("validation", model=self.identity):
+            params = parse_prompt_params(input_json)
+            problems = validate_suggestions(suggestions, params, self.length_tolerance)
+        if not problems:
+            return params, problems, None
+        with self._lock:
+            if self.max_followups is not None and self.followups >= self.max_followups:
+                logging.debug("Follow-up budget used up, keeping %s: %s", sorted(problems), problems)
+                return params, problems, None
+            self.followups += 1
+        logging.debug("Re-asking %s: %s", sorted(problems), problems)
+        return params, problems, follow_up_prompt(input_json, params, suggestions, problems)
+
+    def _apply(self, suggestions, problems, replacements, params):
+        merged = merge_replacements(suggestions, problems, replacements, params, self.length_tolerance)
+        remaining = validate_suggestions(merged, params, self.length_tolerance)
+        with self._lock:
+            self.repaired += max(0, len(problems) - len(remaining))
+        return merged
+
+    def __call__(self, image: Union[ImagePayload, str], input_json: Union[str, Dict], on_suggestion=None):
+        if on_suggestion is not None:
+            suggestions = self.inner(image=image, input_json=input_json, on_suggestion=on_suggestion)
+        else:
+            suggestions = self.inner(image=image, input_json=input_json)
+        return self._repair(image, input_json, suggestions)
+
+    def _repair(self, image, input_json, suggestions):
+        params, problems, prompt = self._plan(input_json, suggestions)
+        if prompt is None:
+            return suggestions
+        try:
+            with telemetry.span("followup", model=self.identity, keys=len(problems)):
+                replacements = self.inner(image=image, input_json=prompt)
+        except Exception as e:
+            logging.debug("Follow-up request failed, keeping the original suggestions: %s", e)
+            return suggestions
+        return self._apply(suggestions, problems, replacements, params)
+
+    async def agenerate(self, image: Union[ImagePayload, str], input_json: Union[str, Dict]):
+        suggestions = await agenerate(self.inner, image, input_json)
+        return await self._arepair(image, input_json, suggestions)
+
+    async def _arepair(self, image, input_json, suggestions):
+        params, problems, prompt = self._plan(input_json, suggestions)
+        if prompt is None:
+            return suggestions
+        try:
+            await acquire_quota(self.inner, prompt)
+            with telemetry.span("followup", model=self.identity, keys=len(problems)):
+                replacements = await agenerate(self.inner, image, prompt)
+        except Exception as e:
+            logging.debug("Follow-up request failed, keeping the original suggestions: %s", e)
+            return suggestions
+        return self._apply(suggestions, problems, replacements, params)
+
+    def generate_batch(self, images, input_json) -> Dict:
+        """Batched answer with each image's entry validated and repaired on its own."""
+        answer = self.inner.generate_batch(images, input_json)
+        for index, image in enumerate(images):
+            key = str(index + 1)
+            if isinstance(answer.get(key), dict) and answer[key]:
+                answer[key] = self._repair(image, input_json, answer[key])
+        return answer
+
+    async def agenerate_batch(self, images, input_json) -> Dict:
+        """Batched answer with each image's entry validated and repaired on its own."""
+        answer = await self.inner.agenerate_batch(images, input_json)
+        keys = [str(index + 1) for index in range(len(images))]
+        repairs = {
+            key: self._arepair(image, input_json, answer[key])
+            for key, image in zip(keys, images)
+            if isinstance(answer.get(key), dict) and answer[key]
+        }
+        for key, repaired in zip(repairs, await asyncio.gather(*repairs.values())):
+            answer[key] = repaired
+        return answer
+
+    def __repr__(self) -> str:
+        return f"ValidatedEndpoint({self.inner!r})"
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+# batch_pipeline.py
+#
+# Streaming load -> preprocess -> infer -> rename pipeline for SendTo batches.
+# Preprocessing runs ahead of inference through bounded queues, so image N+1 is
+# being compressed while the request for image N is in flight, and no more than
+# a handful of payloads are ever held in memory. Qt-free; the mini app wraps it
+# in a QThread.
+
+import asyncio
+import contextvars
+import os
+import queue
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.cancellation import CANCEL_POLL_SECONDS, CancelToken, GenerationCancelled, cancel_scope
+from utils.image_hashing import NearDuplicateIndex
+from utils.image_processing import iter_preprocess
+from utils.telemetry import telemetry
+
+
+PIPELINE_QUEUE_SIZE = 4
+
+
+def safe_filename(text: str) -> str:
+    text = text.strip()
+    text = re.sub(r"[^\w\s-]", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text[:100]
+
+
+def rename_to_alt_text(original_path: str, safe_name: str) -> str:
+    """
+    Renames `original_path` to `safe_name` (keeping the extension) in the same
+    folder, widening spaces until the name is free. Returns the new path.
+    """
+    dir_name = os.path.dirname(original_path)
+    ext = os.path.splitext(original_path)[1]
+    new_filename = f"{safe_name}{ext}"
+    new_file_path = os.path.join(dir_name, new_filename)
+    if os.path.normcase(os.path.abspath(new_file_path)) == os.path.normcase(os.path.abspath(original_path)):
+        return original_path
+
+    while os.path.exists(new_file_path):
+        new_filename = new_filename.replace(" ", "  ")
+        new_file_path = os.path.join(dir_name, new_filename)
+        if " " not in new_filename:
+            break
+
+    os.rename(original_path, new_file_path)
+    return new_file_path
+
+
+def first_suggestion(alt_response) -> str:
+    if isinstance(alt_response, dict):
+        return next(iter(alt_response.values()))
+    return alt_response
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Prefetcher:
+    """
+    Runs `iterable` on a background thread and hands its items over through a
+    queue of at most `maxsize` items. The producer blocks when the queue is
+    full (backpressure) and exceptions are re-raised in the consumer.
+    close() stops the producer and closes the source generator; it may be
+    called from another thread, a blocked consumer then stops iterating.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable: Iterable, maxsize: int = PIPELINE_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, args=(iter(iterable),), daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterator) -> None:
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    break
+        except BaseException as e:
+            self._put(_Failure(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._put(self._DONE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            if self._finished:
+                raise StopIteration
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        if item is self._DONE:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self._finished = True
+            raise item.error
+        return item
+
+    def close(self) -> None:
+        self._stop.set()
+        self._finished = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+
+@dataclass
+class BatchReport:
+    renamed: List[Tuple[str, str]] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    saved_calls: int = 0
+    cancelled: List[str] = field(default_factory=list)  # left untouched by cancel()
+
+
+class BatchPipeline:
+    """
+    Preprocessing starts as soon as the pipeline is created, running at most
+    `queue_size` images ahead of inference; run() then infers and renames each
+    image as it comes off the queue, with several requests in flight.
+    cancel() (from any thread) stops it early.
+    """
+
+    def __init__(self, image_paths: List[str], preprocess_options: Dict, cache=None,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, max_workers: Optional[int] = None,
+                 response_cache=None):
+        self.image_paths = image_paths
+        self._results = Prefetcher(
+            iter_preprocess(
+                image_paths,
+                max_workers=max_workers,
+                cache=cache,
+                max_in_flight=queue_size,
+                **preprocess_options,
+            ),
+            maxsize=queue_size,
+        )
+        self.cache = cache
+        self.response_cache = response_cache
+        self._cancel = CancelToken()
+
+    def cancel(self) -> None:
+        """
+        Stops run() within CANCEL_POLL_SECONDS: answers already received are
+        still applied, outstanding requests are abandoned, and the images not
+        renamed yet are listed in BatchReport.cancelled.
+        """
+        self._cancel.cancel()
+        self._results.close()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.cancelled
+
+    def run(self, model: Callable, prompt: str, dedupe_threshold: Optional[int] = None,
+            max_in_flight: int = 1, submit: Optional[Callable[..., Future]] = None,
+            images_per_call: int = 1, bypass_cache: bool = False) -> BatchReport:
+        """
+        Sends the preprocessed images to `model`, keeping up to `max_in_flight`
+        requests running, and renames each file after its first suggestion as
+        soon as its response arrives (in completion order). Renames all happen
+        on this thread, so concurrent results never race for the same name.
+
+        Each request carries up to `images_per_call` images (capped by the
+        model's max_images_per_call). `submit(model, images, input_json)`
+        schedules one request and returns a Future of one response (or
+        exception) per image (e.g. services.batching.submit_batch_generation); by default a thread
+        pool calls the model once per image. Files that cannot be read or renamed are recorded in the report;
+        a failed request marks its images (and their near-duplicates) as failed
+        without stopping the batch.
+        With `dedupe_threshold`, near-duplicates reuse their cluster leader's
+        name with a numeric suffix instead of calling the model. With a
+        response cache, images already answered for this prompt and model are
+        renamed from the cache without a request; `bypass_cache` asks the
+        model for every image anyway and stores the new answers.
+        After cancel(), run() returns the partial report instead.
+        """
+        report = BatchReport()
+        index = NearDuplicateIndex(dedupe_threshold) if dedupe_threshold is not None else None
+        cluster_names: Dict[int, str] = {}
+        cluster_waiting: Dict[int, List[Tuple[str, int]]] = {}
+        cluster_errors: Dict[int, str] = {}
+        pending: Dict[Future, List[Tuple[str, Optional[int], Optional[str]]]] = {}
+        group: List = []
+        group_size = max(1, min(images_per_call, getattr(model, "max_images_per_call", 1)))
+        executor = None
+        if submit is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+
+            def call(m, images, input_json):
+                with cancel_scope(self._cancel):
+                    return [m(image=image, input_json=input_json) for image in images]
+
+            submit = lambda m, images, input_json: executor.submit(
+                contextvars.copy_context().run, call, m, images, input_json
+            )
+
+        def rename(path: str, safe_name: str) -> None:
+            try:
+                with telemetry.span("rename", image=os.path.basename(path)):
+                    new_file_path = rename_to_alt_text(path, safe_name)
+                report.renamed.append((path, new_file_path))
+                print(f"Renamed '{path}' to '{new_file_path}'")
+            except Exception as e:
+                report.failed.append((path, str(e)))
+                print(f"Failed to rename '{path}': {e}")
+
+        def answered(path: str, cluster_id: Optional[int], response) -> None:
+            safe_name = safe_filename(first_suggestion(response))
+            rename(path, safe_name)
+            if cluster_id is not None:
+                cluster_names[cluster_id] = safe_name
+                for duplicate_path, position in cluster_waiting.pop(cluster_id, []):
+                    report.saved_calls += 1
+                    rename(duplicate_path, f"{safe_name} {position + 1}")
+
+        def failed(path: str, cluster_id: Optional[int], error: str) -> None:
+            report.failed.append((path, error))
+            print(f"Failed to process '{path}': {error}")
+            if cluster_id is not None:
+                # Near-duplicates still to come fail the same way instead of waiting forever.
+                cluster_errors[cluster_id] = error
+                for duplicate_path, _ in cluster_waiting.pop(cluster_id, []):
+                    report.failed.append((duplicate_path, error))
+
+        def complete(done: Iterable[Future]) -> None:
+            for future in done:
+                entries = pending.pop(future)
+                try:
+                    responses = future.result()
+                except GenerationCancelled as e:
+                    if self.cancelled:
+                        continue  # listed in report.cancelled
+                    # Cancelled on its own (its cancel scope or deadline), not by cancel().
+                    for path, cluster_id, _ in entries:
+                        failed(path, cluster_id, str(e) or "Request cancelled.")
+                    continue
+                except Exception as e:
+                    for path, cluster_id, _ in entries:
+                        failed(path, cluster_id, str(e))
+                    continue
+                for (path, cluster_id, cache_key), response in zip(entries, responses):
+                    # A batched request can fail for some of its images only.
+                    if isinstance(response, asyncio.CancelledError):
+                        if not self.cancelled:
+                            failed(path, cluster_id, str(response) or "Request cancelled.")
+                        continue  # otherwise listed in report.cancelled
+                    if isinstance(response, BaseException):
+                        failed(path, cluster_id, str(response))
+                        continue
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, model, response)
+                    answered(path, cluster_id, response)
+
+        def flush() -> None:
+            # Telemetry of the request lands in the row of its (first) image.
+            names = [os.path.basename(path) for _, (path, _, _) in group]
+            lane = names[0] if len(names) == 1 else f"{names[0]} (+{len(names) - 1})"
+            with telemetry.tags(image=lane):
+                future = submit(model, [image for image, _ in group], prompt)
+            pending[future] = [entry for _, entry in group]
+            group.clear()
+            if len(pending) >= max_in_flight:
+                complete_some()
+
+        def complete_some() -> None:
+            # Polls, so cancel() is noticed while every request is still in flight.
+            while not self.cancelled:
+                done, _ = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                if done:
+                    complete(done)
+                    return
+
+        try:
+            for result in self._results:
+                if self.cancelled:
+                    break
+                if result.error:
+                    report.failed.append((result.path, result.error))
+                    continue
+                telemetry.record_stages(
+                    result.image.timings,
+                    image=os.path.basename(result.path),
+                    width=result.image.width,
+                    height=result.image.height,
+                )
+
+                cluster_id, position = index.assign(result.image.dhash) if index else (None, 0)
+                if position:
+                    if cluster_id in cluster_names:
+                        report.saved_calls += 1
+                        rename(result.path, f"{cluster_names[cluster_id]} {position + 1}")
+                    elif cluster_id in cluster_errors:
+                        report.failed.append((result.path, cluster_errors[cluster_id]))
+                    else:
+                        cluster_waiting.setdefault(cluster_id, []).append((result.path, position))
+                    continue
+
+                payload = result.image.to_payload()
+                cache_key = None
+                if self.response_cache is not None:
+                    cache_key = self.response_cache.key_for(payload, prompt, model)
+                    cached = None if bypass_cache else self.response_cache.get(cache_key)
+                    if cached:
+                        answered(result.path, cluster_id, cached)
+                        continue
+
+                group.append((payload, (result.path, cluster_id, cache_key)))
+                if len(group) >= group_size:
+                    flush()
+                    if self.cancelled:
+                        break
+
+            if group and not self.cancelled:
+                flush()
+            while pending and not self.cancelled:
+                complete_some()
+            if self.cancelled:
+                # Keep what already came back; everything else stays as it was.
+                complete([future for future in pending if future.done() and not future.cancelled()])
+                handled = {path for path, _ in report.renamed} | {path for path, _ in report.failed}
+                report.cancelled = [path for path in self.image_paths if path not in handled]
+            else:
+                # Duplicates whose leader never got an answer would otherwise vanish from the report.
+                for cluster_id, waiting in cluster_waiting.items():
+                    error = cluster_errors.get(cluster_id, "No answer for the image it duplicates.")
+                    for duplicate_path, _ in waiting:
+                        report.failed.append((duplicate_path, error))
+                cluster_waiting.clear()
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.close()
+        return report
+
+    def close(self) -> None:
+        self._results.close()
+        if self.cache is not None:
+            self.cache.save_stats()
+        if self.response_cache is not None:
+            self.response_cache.save_stats()
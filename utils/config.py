@@ -75,3 +75,164 @@ class Config:
 
     def set_dp_password(self, password: str) -> None:
         self.settings.setValue("dp/password", password)
+
+    # Preprocessing cache
+    def get_preprocess_cache_mb(self) -> int:
+        return self.settings.value("cache/preprocess_size_mb", 256, type=int)
+
+    def set_preprocess_cache_mb(self, size_mb: int) -> None:
+        self.settings.setValue("cache/preprocess_size_mb", size_mb)
+
+    # Near-duplicate detection (mini app batches)
+    def is_dedupe_enabled(self) -> bool:
+        return self.settings.value("batch/dedupe_enabled", False, type=bool)
+
+    def set_dedupe_enabled(self, enabled: bool) -> None:
+        self.settings.setValue("batch/dedupe_enabled", enabled)
+
+    def get_dedupe_threshold(self) -> int:
+        return self.settings.value("batch/dedupe_threshold", 6, type=int)
+
+    def set_dedupe_threshold(self, threshold: int) -> None:
+        self.settings.setValue("batch/dedupe_threshold", threshold)
+
+    # Request concurrency and per-provider rate limits
+    def get_max_concurrent_requests(self) -> int:
+        return self.settings.value("requests/max_concurrent", 4, type=int)
+
+    def set_max_concurrent_requests(self, count: int) -> None:
+        self.settings.setValue("requests/max_concurrent", count)
+
+    def get_rate_limit(self, provider_key: str, default=(0, 0)) -> tuple:
+        """(requests per minute, tokens per minute) for a provider; 0 means unlimited."""
+        rpm = self.settings.value(f"rate_limits/{provider_key}/rpm", default[0], type=int)
+        tpm = self.settings.value(f"rate_limits/{provider_key}/tpm", default[1], type=int)
+        return rpm, tpm
+
+    def set_rate_limit(self, provider_key: str, rpm: int, tpm: int) -> None:
+        self.settings.setValue(f"rate_limits/{provider_key}/rpm", rpm)
+        self.settings.setValue(f"rate_limits/{provider_key}/tpm", tpm)
+
+    # Response cache
+    def get_response_cache_ttl_hours(self) -> int:
+        return self.settings.value("cache/response_ttl_hours", 24 * 7, type=int)
+
+    def set_response_cache_ttl_hours(self, hours: int) -> None:
+        self.settings.setValue("cache/response_ttl_hours", hours)
+
+    # Hedged requests: race a backup model when the selected one is slow
+    def is_hedging_enabled(self) -> bool:
+        return self.settings.value("hedging/enabled", False, type=bool)
+
+    def set_hedging_enabled(self, enabled: bool) -> None:
+        self.settings.setValue("hedging/enabled", enabled)
+
+    def get_hedge_model(self) -> str:
+        return self.settings.value("hedging/model", "Gemini 1.5 Flash", type=str)
+
+    def set_hedge_model(self, model_name: str) -> None:
+        self.settings.setValue("hedging/model", model_name)
+
+    def get_hedge_percentile(self) -> int:
+        return self.settings.value("hedging/percentile", 90, type=int)
+
+    def set_hedge_percentile(self, percentile: int) -> None:
+        self.settings.setValue("hedging/percentile", percentile)
+
+    def get_hedge_default_delay(self) -> float:
+        return self.settings.value("hedging/default_delay_s", 10.0, type=float)
+
+    def set_hedge_default_delay(self, seconds: float) -> None:
+        self.settings.setValue("hedging/default_delay_s", seconds)
+
+    # Fallback chain (model names tried in order after the selected one) and circuit breakers
+    def get_fallback_models(self) -> list:
+        return self.settings.value("resilience/fallback_models", [], type=list)
+
+    def set_fallback_models(self, model_names: list) -> None:
+        self.settings.setValue("resilience/fallback_models", model_names)
+
+    def get_breaker_failure_threshold(self) -> int:
+        return self.settings.value("resilience/failure_threshold", 3, type=int)
+
+    def set_breaker_failure_threshold(self, failures: int) -> None:
+        self.settings.setValue("resilience/failure_threshold", failures)
+
+    def get_breaker_cooldown(self) -> float:
+        return self.settings.value("resilience/cooldown_s", 60.0, type=float)
+
+    def set_breaker_cooldown(self, seconds: float) -> None:
+        self.settings.setValue("resilience/cooldown_s", seconds)
+
+    # Deadline of one model request, for models without their own
+    def get_request_timeout(self) -> float:
+        return self.settings.value("resilience/request_timeout_s", 90.0, type=float)
+
+    def set_request_timeout(self, seconds: float) -> None:
+        self.settings.setValue("resilience/request_timeout_s", seconds)
+
+    # "Auto (fastest healthy)" model selection; empty means every registered model
+    def get_auto_models(self) -> list:
+        return self.settings.value("scheduler/auto_models", [], type=list)
+
+    def set_auto_models(self, model_names: list) -> None:
+        self.settings.setValue("scheduler/auto_models", model_names)
+
+    # Local validation of answers (length, address, French, duplicates); each
+    # re-ask is an extra paid request, so it is opt-in
+    def is_validation_enabled(self) -> bool:
+        return self.settings.value("validation/enabled", False, type=bool)
+
+    def set_validation_enabled(self, enabled: bool) -> None:
+        self.settings.setValue("validation/enabled", enabled)
+
+    def get_validation_length_tolerance(self) -> int:
+        return self.settings.value("validation/length_tolerance", 10, type=int)
+
+    def set_validation_length_tolerance(self, characters: int) -> None:
+        self.settings.setValue("validation/length_tolerance", characters)
+
+    def get_validation_max_followups(self) -> int:
+        return self.settings.value("validation/max_followups", 20, type=int)
+
+    def set_validation_max_followups(self, requests: int) -> None:
+        self.settings.setValue("validation/max_followups", requests)
+
+    # Per-stage timing telemetry (utils.telemetry)
+    def is_telemetry_enabled(self) -> bool:
+        return self.settings.value("telemetry/enabled", True, type=bool)
+
+    def set_telemetry_enabled(self, enabled: bool) -> None:
+        self.settings.setValue("telemetry/enabled", enabled)
+
+    # Self-hosted OpenAI-compatible model (llama.cpp server, vLLM, Ollama)
+    def get_local_base_url(self) -> str:
+        return self.settings.value("local_model/base_url", "", type=str)
+
+    def set_local_base_url(self, base_url: str) -> None:
+        self.settings.setValue("local_model/base_url", base_url)
+
+    def get_local_model(self) -> str:
+        return self.settings.value("local_model/model", "", type=str)
+
+    def set_local_model(self, model: str) -> None:
+        self.settings.setValue("local_model/model", model)
+
+    def get_local_model_name(self) -> str:
+        return self.settings.value("local_model/name", "", type=str)
+
+    def set_local_model_name(self, name: str) -> None:
+        self.settings.setValue("local_model/name", name)
+
+    def get_local_max_concurrency(self) -> int:
+        return self.settings.value("local_model/max_concurrency", 2, type=int)
+
+    def set_local_max_concurrency(self, count: int) -> None:
+        self.settings.setValue("local_model/max_concurrency", count)
+
+    # Multi-image prompts (SendTo batches); 1 sends one image per request
+    def get_images_per_call(self) -> int:
+        return self.settings.value("batch/images_per_call", 1, type=int)
+
+    def set_images_per_call(self, count: int) -> None:
+        self.settings.setValue("batch/images_per_call", count)
@@ -1,4 +1,12 @@
-from services import gemini_services  , huggingface_services , g4f_services
+import os
+from services import gemini_services  , huggingface_services , g4f_services, openai_compatible_services, mock_services
+from services.cancellation import deadlines
+from services.hedging import HedgedEndpoint
+from services.resilience import FallbackChain, circuit_breakers
+from services.scheduler import AdaptiveScheduler, AutoEndpoint
+from services.validation import ValidatedEndpoint
+from utils.config import Config
+from utils.image_processing import ImageProfile
 
 class Constants:
 
@@ -35,6 +43,8 @@ class Constants:
 ]
 
 
+    AUTO_MODEL_NAME = "Auto (fastest healthy)"
+
     ALT_MAX_LENGTH_MIN = 15
     ALT_MAX_LENGTH_MAX = 50
     ALT_MAX_LENGTH_DEFAULT = 25
@@ -60,5 +70,85 @@ class Constants:
         "aya vision 32b (Beta)": huggingface_services.aya_vision_32,
         "aya vision 8b (Beta)" : huggingface_services.aya_vision_8,
         "Gpt O4 (Slow)": g4f_services.gpt_o4_mini,
-    }   
-    
\ No newline at end of file
+    }
+
+    # Image preprocessing profile per model: sized to what each model's vision
+    # encoder actually looks at, so we never upload pixels that get downscaled away.
+    DEFAULT_IMAGE_PROFILE = ImageProfile(max_dimension=MAX_DIMENSION, max_file_size_kb=MAX_FILE_SIZE_KB)
+    MODEL_IMAGE_PROFILES = {
+        # Gemini bills 258 tokens per 768x768 tile.
+        "Gemini 1.5 Flash": ImageProfile(768, 300, "JPEG", 85),
+        "learnlm 2.0": ImageProfile(768, 300, "JPEG", 85),
+        # Llama 4 tiles at 336 px; Groq caps base64 requests at 4 MB.
+        "llama 4 12b": ImageProfile(672, 300, "JPEG", 85),
+        # OpenAI models rescale so the short side is at most 768 px, in 512 px tiles.
+        "Gpt 4o": ImageProfile(768, 300, "JPEG", 85),
+        "Gpt 4.1 Mini": ImageProfile(768, 300, "JPEG", 85),
+        "Gpt O4 (Slow)": ImageProfile(768, 300, "JPEG", 85),
+        # Qwen2-VL spends one token per 28x28 patch, so cost grows with every pixel.
+        "Qwen 2": ImageProfile(672, 250, "JPEG", 80),
+        "Qwen 2.5 Vision 72b": ImageProfile(672, 250, "JPEG", 80),
+        # Gemma 3 (SigLIP) always sees a single 896x896 frame.
+        "gemma 3 27b (Beta)": ImageProfile(896, 300, "JPEG", 85),
+        "gemma 3 4b (Beta)": ImageProfile(896, 300, "JPEG", 85),
+        # Aya Vision tiles at 364 px.
+        "aya vision 32b (Beta)": ImageProfile(728, 300, "JPEG", 85),
+        "aya vision 8b (Beta)": ImageProfile(728, 300, "JPEG", 85),
+    }
+
+    @staticmethod
+    def get_image_profile(model_name: str) -> ImageProfile:
+        return Constants.MODEL_IMAGE_PROFILES.get(model_name, Constants.DEFAULT_IMAGE_PROFILE)
+
+    @staticmethod
+    def get_model(model_name: str):
+        """
+        The registered model as configured in Settings: hedged with the backup
+        model when hedging is enabled, then followed by the fallback models,
+        each behind its provider's circuit breaker. When enabled in Settings,
+        answers are validated locally and failing suggestions re-asked.
+        """
+        model = Constants.AI_MODELS_DICT.get(model_name)
+        if model is None:
+            return None
+        config = Config()
+        circuit_breakers.configure(config.get_breaker_failure_threshold(), config.get_breaker_cooldown())
+        deadlines.configure(config.get_request_timeout())
+
+        primary = model
+        if isinstance(model, AutoEndpoint):
+            model.scheduler.configure(config.get_auto_models())
+        elif config.is_hedging_enabled():
+            backup = Constants.AI_MODELS_DICT.get(config.get_hedge_model())
+            if backup is not None and backup is not model:
+                primary = HedgedEndpoint(
+                    model,
+                    backup,
+                    percentile=config.get_hedge_percentile(),
+                    default_delay=config.get_hedge_default_delay(),
+                )
+
+        fallbacks = [
+            Constants.AI_MODELS_DICT[name]
+            for name in config.get_fallback_models()
+            if name in Constants.AI_MODELS_DICT and Constants.AI_MODELS_DICT[name] is not model
+        ]
+        chain = FallbackChain([primary, *fallbacks])
+        if not config.is_validation_enabled():
+            return chain
+        return ValidatedEndpoint(
+            chain,
+            length_tolerance=config.get_validation_length_tolerance(),
+            max_followups=config.get_validation_max_followups(),
+        )
+
+
+# Self-hosted model configured in Settings (applies after a restart).
+Constants.AI_MODELS_DICT.update(openai_compatible_services.models_from_config())
+
+# Offline simulated models for benchmarks and UI testing.
+if os.environ.get("ALTIFY_MOCK_MODELS"):
+    Constants.AI_MODELS_DICT.update(mock_services.MOCK_MODELS)
+
+# Listed last, so it is only used when picked; schedules over every model registered above.
+Constants.AI_MODELS_DICT[Constants.AUTO_MODEL_NAME] = AutoEndpoint(AdaptiveScheduler(dict(Constants.AI_MODELS_DICT)))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# image_hashing.py
+#
+# Perceptual hashing used to spot near-duplicate shots (bursts) in a batch so
+# the model is called once per group instead of once per file.
+# NumPy is optional: without it HASHING_AVAILABLE is False and callers skip dedupe.
+
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import numpy as np
+    HASHING_AVAILABLE = True
+except ImportError:
+    np = None
+    HASHING_AVAILABLE = False
+
+
+DHASH_SIZE = 8
+DEFAULT_HAMMING_THRESHOLD = 6
+
+
+def dhash(img: Image.Image, hash_size: int = DHASH_SIZE) -> Optional[int]:
+    """
+    Difference hash: the image is shrunk to (hash_size + 1) x hash_size grey
+    pixels and each bit records whether a pixel is brighter than its right
+    neighbour. Returns a hash_size**2-bit int, or None without NumPy.
+    """
+    if not HASHING_AVAILABLE:
+        return None
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateIndex:
+    """
+    Incremental leader clustering of perceptual hashes. Each new hash joins the
+    closest existing cluster within `threshold` bits, otherwise it starts a new
+    cluster and becomes its leader. Works one image at a time, so it can run
+    while the batch is still being preprocessed.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_HAMMING_THRESHOLD):
+        self.threshold = threshold
+        self._leaders: List[Optional[int]] = []
+        self._sizes: List[int] = []
+
+    def assign(self, image_hash: Optional[int]) -> Tuple[int, int]:
+        """
+        Returns (cluster_id, position) where position 0 means the hash leads a
+        new cluster. A None hash always gets its own cluster.
+        """
+        if image_hash is not None:
+            best, best_distance = None, self.threshold + 1
+            for cluster_id, leader in enumerate(self._leaders):
+                if leader is None:
+                    continue
+                distance = hamming_distance(leader, image_hash)
+                if distance < best_distance:
+                    best, best_distance = cluster_id, distance
+            if best is not None:
+                position = self._sizes[best]
+                self._sizes[best] += 1
+                return best, position
+
+        self._leaders.append(image_hash)
+        self._sizes.append(1)
+        return len(self._leaders) - 1, 0
+
+    @property
+    def cluster_count(self) -> int:
+        return len(self._leaders)
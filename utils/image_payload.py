@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# image_payload.py
+#
+# Encoded image bytes plus their MIME type, as handed to the AI model functions.
+# Base64 is only produced when a provider needs a data URL, and then only once.
+
+import base64
+import binascii
+from typing import Dict, Optional, Union
+
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+    "WEBP": "image/webp",
+}
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """Guesses the MIME type from the file signature; defaults to JPEG."""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+class ImagePayload:
+    __slots__ = ("data", "mime_type", "_base64")
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise ValueError("Image payload data must be bytes.")
+        self.data = bytes(data)
+        self.mime_type = mime_type or sniff_mime_type(self.data)
+        self._base64 = None
+
+    @classmethod
+    def from_base64(cls, base64_image_str: str, mime_type: Optional[str] = None) -> "ImagePayload":
+        try:
+            data = base64.b64decode(base64_image_str, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError("Invalid base64 image data.") from e
+        payload = cls(data, mime_type)
+        payload._base64 = base64_image_str
+        return payload
+
+    @classmethod
+    def coerce(cls, image: Union["ImagePayload", bytes, str, Dict]) -> "ImagePayload":
+        """Accepts a payload, raw bytes, a base64 string or {'image': ...}."""
+        if isinstance(image, dict):
+            image = image.get("image")
+        if isinstance(image, cls):
+            return image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return cls(image)
+        if isinstance(image, str):
+            return cls.from_base64(image)
+        raise ValueError("Image must be an ImagePayload, bytes or a base64 string.")
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode("ascii")
+        return self._base64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def __len__(self) -> int:
+        return len(self.data)
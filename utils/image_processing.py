@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# image_processing.py
+#
+# Qt-free image preprocessing shared by the main window and the mini app.
+# Each image is decoded, resized and encoded once; callers get the bytes back
+# together with the stats they need to report what happened.
+
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from utils.image_hashing import dhash
+from utils.image_payload import MIME_TYPES, ImagePayload
+from utils.telemetry import StageClock, telemetry
+
+
+SUPPORTED_OUTPUT_FORMATS = ('PNG', 'JPEG', 'GIF', 'BMP')
+DEFAULT_JPEG_QUALITY = 75
+COMPRESSION_START_QUALITY = 90
+COMPRESSION_MIN_QUALITY = 10
+MAX_BUDGET_ENCODES = 3
+PALETTE_COLORS = (256, 128, 64)
+# For sources that are not JPEG, resize() first shrinks by an integer factor with
+# Image.reduce() as long as the remainder stays above this multiple of the target.
+RESIZE_REDUCING_GAP = 3.0
+# Batches up to this size are preprocessed inline: starting spawned pool workers
+# (well over half a second on Windows) costs more than a few images take.
+INLINE_MAX_IMAGES = 3
+
+# Typical libjpeg output size at each quality, relative to the size at quality 90.
+# Used to predict the quality that fits a byte budget from a single encode.
+_JPEG_RELATIVE_SIZE = (
+    (95, 1.45), (90, 1.0), (85, 0.80), (80, 0.68), (75, 0.60), (70, 0.54),
+    (65, 0.50), (60, 0.46), (50, 0.40), (40, 0.35), (30, 0.29), (20, 0.22), (10, 0.14),
+)
+
+@dataclass
+class ProcessedImage:
+    """Encoded image bytes plus what was done to produce them."""
+    data: bytes
+    format: str
+    width: int
+    height: int
+    original_width: int
+    original_height: int
+    original_size_kb: float
+    resized: bool = False
+    compressed: bool = False
+    quality: Optional[int] = None
+    draft_scale: int = 1
+    dhash: Optional[int] = None
+    # {stage: (wall-clock start, seconds)} for decode/resize/hash/encode, measured
+    # where the work ran (possibly a worker process); empty for cache hits.
+    timings: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+
+    @property
+    def size_kb(self) -> float:
+        return len(self.data) / 1024
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES.get(self.format, 'application/octet-stream')
+
+    def to_payload(self) -> ImagePayload:
+        return ImagePayload(self.data, self.mime_type)
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """
+    How large a payload a model actually benefits from: longest edge in pixels,
+    byte budget, output format (None keeps the source format) and JPEG quality.
+    """
+    max_dimension: int
+    max_file_size_kb: Optional[float] = None
+    output_format: Optional[str] = None
+    quality: Optional[int] = None
+
+    def options(self) -> dict:
+        """preprocess_image keyword arguments for this profile (also the cache key)."""
+        return {
+            'max_dimension': self.max_dimension,
+            'max_file_size_kb': self.max_file_size_kb,
+            'output_format': self.output_format,
+            'quality': self.quality,
+        }
+
+
+@dataclass
+class PreprocessResult:
+    """Outcome of preprocessing one file in a batch; exactly one of image/error is set."""
+    path: str
+    image: Optional[ProcessedImage] = None
+    error: Optional[str] = None
+
+
+def _target_size(width: int, height: int, max_dimension: Optional[int]):
+    if not max_dimension or (width <= max_dimension and height <= max_dimension):
+        return None
+    scaling_factor = min(max_dimension / width, max_dimension / height)
+    return max(1, int(width * scaling_factor)), max(1, int(height * scaling_factor))
+
+
+def _normalize_mode(img: Image.Image, source_format: str, output_format: str) -> Image.Image:
+    """Converts palette/alpha modes to something the output encoder accepts."""
+    if output_format == 'JPEG':
+        if img.mode != 'RGB' and img.mode != 'L':
+            return img.convert('RGB')
+        return img
+    if img.mode == 'P' and source_format != 'GIF':
+        return img.convert('RGBA' if output_format == 'PNG' else 'RGB')
+    if img.mode == 'LA':
+        return img.convert('RGBA')
+    if output_format == 'BMP' and img.mode not in ('1', 'L', 'P', 'RGB', 'RGBA'):
+        return img.convert('RGB')
+    return img
+
+
+def _encode(img: Image.Image, output_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=output_format, **params)
+    return buffer.getvalue()
+
+
+def _relative_jpeg_size(quality: int) -> float:
+    """Interpolates _JPEG_RELATIVE_SIZE for any quality in [10, 95]."""
+    for (q_hi, r_hi), (q_lo, r_lo) in zip(_JPEG_RELATIVE_SIZE, _JPEG_RELATIVE_SIZE[1:]):
+        if q_lo <= quality <= q_hi:
+            return r_lo + (r_hi - r_lo) * (quality - q_lo) / (q_hi - q_lo)
+    return _JPEG_RELATIVE_SIZE[-1][1] if quality < COMPRESSION_MIN_QUALITY else _JPEG_RELATIVE_SIZE[0][1]
+
+
+def _predict_jpeg_quality(observed_quality: int, observed_bytes: int, budget_bytes: float,
+                          low: int, high: int) -> int:
+    """Highest quality in [low, high] whose predicted size fits the budget."""
+    scale = observed_bytes / _relative_jpeg_size(observed_quality)
+    for quality in range(high, low - 1, -1):
+        if scale * _relative_jpeg_size(quality) <= budget_bytes:
+            return quality
+    return low
+
+
+def encode_jpeg_to_budget(img: Image.Image, max_file_size_kb: float,
+                          start_quality: int = COMPRESSION_START_QUALITY,
+                          first_encode: Optional[bytes] = None):
+    """
+    Encodes `img` as JPEG at the highest quality that fits `max_file_size_kb`.
+
+    Starting from one encode at `start_quality` (or `first_encode`, if the caller
+    already has those bytes), the quality is predicted from the typical size curve;
+    each further encode narrows the bracket between the best fitting and the
+    smallest failing quality and re-predicts from the latest observation.
+    At most MAX_BUDGET_ENCODES encodes are made. Returns (bytes, quality); when no
+    quality fits, the smallest encode attempted is returned.
+    """
+    budget = max_file_size_kb * 1024
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    data = first_encode if first_encode is not None else _encode(img, 'JPEG', optimize=True, quality=start_quality)
+    encodes = 1
+    if len(data) <= budget:
+        return data, start_quality
+
+    best = None
+    low, high = COMPRESSION_MIN_QUALITY, start_quality - 1
+    quality = _predict_jpeg_quality(start_quality, len(data), budget, low, high)
+    while encodes < MAX_BUDGET_ENCODES and low <= high:
+        candidate = _encode(img, 'JPEG', optimize=True, quality=quality)
+        encodes += 1
+        if len(candidate) <= budget:
+            best = (candidate, quality)
+            low = quality + 1
+        else:
+            data = candidate
+            high = quality - 1
+        if low > high:
+            break
+        # Re-predict from the closest observation inside the remaining [low, high] bracket.
+        anchor_quality, anchor_size = (best[1], len(best[0])) if best else (quality, len(candidate))
+        quality = _predict_jpeg_quality(anchor_quality, anchor_size, budget * 0.97, low, high)
+
+    return best if best else (data, max(COMPRESSION_MIN_QUALITY, high + 1))
+
+
+def _encode_lossless_to_budget(img: Image.Image, output_format: str, max_file_size_kb: float):
+    """
+    Size reduction for PNG/GIF/BMP output, cheapest strategy first:
+    optimized PNG, then adaptive palettes of decreasing size, then a downscale
+    estimated from the remaining overshoot, repeated (up to MAX_BUDGET_ENCODES
+    times) while the estimate still misses. BMP has no compression, so it is
+    written as PNG. Returns (bytes, format, image).
+    """
+    budget = max_file_size_kb * 1024
+    if output_format == 'BMP':
+        output_format = 'PNG'
+        if img.mode not in ('1', 'L', 'P', 'RGB', 'RGBA'):
+            img = img.convert('RGB')
+
+    data = _encode(img, output_format, optimize=True)
+    if len(data) <= budget:
+        return data, output_format, img
+
+    source = img
+    for colors in PALETTE_COLORS:
+        if img.mode == 'P' and len(img.getpalette() or ()) // 3 <= colors:
+            continue
+        quantize_source = source if source.mode in ('RGB', 'RGBA', 'L', 'P') else source.convert('RGBA')
+        method = Image.Quantize.FASTOCTREE if quantize_source.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+        img = quantize_source.quantize(colors=colors, method=method)
+        data = _encode(img, output_format, optimize=True)
+        if len(data) <= budget:
+            return data, output_format, img
+
+    # Encoded size scales roughly with pixel count; each retry resizes the
+    # unscaled image again from the overshoot of the last attempt.
+    unscaled = img
+    scale = 1.0
+    for _ in range(MAX_BUDGET_ENCODES):
+        scale *= (budget / len(data)) ** 0.5 * 0.95
+        target = (max(1, int(unscaled.width * scale)), max(1, int(unscaled.height * scale)))
+        img = unscaled.resize(target, Image.LANCZOS if unscaled.mode != 'P' else Image.NEAREST)
+        data = _encode(img, output_format, optimize=True)
+        if len(data) <= budget or target == (1, 1):
+            break
+    return data, output_format, img
+
+
+def preprocess_image(
+    path: str,
+    max_dimension: Optional[int] = None,
+    max_file_size_kb: Optional[float] = None,
+    output_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    compute_hash: bool = False,
+) -> ProcessedImage:
+    """
+    Decodes, resizes and encodes the image at `path` in a single pass.
+
+    `output_format` forces an encoder (e.g. 'JPEG'); by default the source format
+    is kept when it is one of SUPPORTED_OUTPUT_FORMATS and PNG is used otherwise.
+    Oversized JPEG sources are decoded at a reduced DCT scale close to the target.
+    With `compute_hash`, a perceptual hash of the resized image is stored in
+    ProcessedImage.dhash for near-duplicate detection.
+    When the encoded result exceeds `max_file_size_kb`, JPEG output is re-encoded
+    at a quality found by encode_jpeg_to_budget and other formats go through
+    palette reduction and, as a last resort, a downscale (BMP is written as PNG).
+    Raises OSError / ValueError when the file cannot be decoded or encoded.
+    """
+    original_size_kb = os.path.getsize(path) / 1024
+    clock = StageClock()
+
+    with Image.open(path) as source:
+        with clock.stage("decode"):
+            source_format = source.format or ''
+            if output_format:
+                final_format = output_format.upper()
+            else:
+                final_format = source_format if source_format in SUPPORTED_OUTPUT_FORMATS else 'PNG'
+
+            original_width, original_height = source.size
+            target = _target_size(original_width, original_height, max_dimension)
+
+            draft_scale = 1
+            if target and source_format == 'JPEG':
+                # Let the JPEG decoder apply DCT scaling (1/2, 1/4, 1/8) so we never
+                # decode more pixels than the target needs; LANCZOS finishes the job.
+                source.draft(source.mode, target)
+                draft_scale = max(1, original_width // source.size[0])
+            source.load()
+
+        with clock.stage("resize"):
+            img = _normalize_mode(source, source_format, final_format)
+            if target:
+                img = img.resize(target, Image.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+    image_hash = None
+    if compute_hash:
+        with clock.stage("hash"):
+            image_hash = dhash(img)
+
+    with clock.stage("encode"):
+        encode_quality = quality if quality is not None else (
+            DEFAULT_JPEG_QUALITY if final_format == 'JPEG' else None
+        )
+        params = {'quality': encode_quality, 'optimize': quality is not None} if final_format == 'JPEG' else {}
+        data = _encode(img, final_format, **params)
+
+        compressed = False
+        if max_file_size_kb and len(data) / 1024 > max_file_size_kb:
+            compressed = True
+            if final_format == 'JPEG':
+                # The first encode already overshoots, so start the search below it.
+                data, encode_quality = encode_jpeg_to_budget(
+                    img, max_file_size_kb, start_quality=encode_quality, first_encode=data
+                )
+            else:
+                data, final_format, img = _encode_lossless_to_budget(img, final_format, max_file_size_kb)
+
+    return ProcessedImage(
+        data=data,
+        format=final_format,
+        width=img.width,
+        height=img.height,
+        original_width=original_width,
+        original_height=original_height,
+        original_size_kb=original_size_kb,
+        resized=target is not None or (img.width, img.height) != (original_width, original_height),
+        compressed=compressed,
+        quality=encode_quality if final_format == 'JPEG' else None,
+        draft_scale=draft_scale,
+        dhash=image_hash,
+        timings=clock.timings,
+    )
+
+
+def _preprocess_job(path: str, **options) -> PreprocessResult:
+    try:
+        return PreprocessResult(path, image=preprocess_image(path, **options))
+    except Exception as e:
+        return PreprocessResult(path, error=f"{type(e).__name__}: {e}")
+
+
+def preprocess_cached(path: str, cache=None, **options) -> ProcessedImage:
+    """preprocess_image with an optional PreprocessCache in front of it."""
+    if cache is None:
+        image = preprocess_image(path, **options)
+    else:
+        key = cache.key_for(path, options)
+        image = cache.get(key)
+        if image is None:
+            image = preprocess_image(path, **options)
+            cache.put(key, image)
+    telemetry.record_stages(image.timings, image=os.path.basename(path), width=image.width, height=image.height)
+    return image
+
+
+def iter_preprocess(paths: List[str], max_workers: Optional[int] = None, cache=None,
+                    max_in_flight: Optional[int] = None, **options) -> Iterator[PreprocessResult]:
+    """
+    Preprocesses `paths` across a process pool sized to the CPU count and yields
+    one PreprocessResult per path, in input order, as soon as each is ready.
+    Failures are returned as results instead of being raised. `options` are
+    passed to preprocess_image. With a PreprocessCache, hits skip Pillow entirely
+    and only misses are sent to the pool; lookups and stores stay in this process.
+
+    At most `max_in_flight` images (default: twice the worker count) are queued
+    or finished-but-unconsumed at any time, so memory stays flat however long
+    the batch is and a slow consumer throttles the pool. Batches of at most
+    INLINE_MAX_IMAGES images (or with a single worker) run inline, skipping
+    pool start-up.
+    """
+    job = partial(_preprocess_job, **options)
+    workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    max_in_flight = max(1, max_in_flight or workers * 2)
+
+    def lookup(path: str):
+        """Returns (cache key, cached result or None)."""
+        if cache is None:
+            return None, None
+        try:
+            key = cache.key_for(path, options)
+        except OSError as e:
+            return None, PreprocessResult(path, error=f"{type(e).__name__}: {e}")
+        image = cache.get(key)
+        return key, PreprocessResult(path, image=image) if image is not None else None
+
+    def store(key: Optional[str], result: PreprocessResult) -> PreprocessResult:
+        if key is not None and result.image is not None:
+            cache.put(key, result.image)
+        return result
+
+    if workers <= 1 or len(paths) <= INLINE_MAX_IMAGES:
+        for path in paths:
+            key, hit = lookup(path)
+            yield hit if hit else store(key, job(path))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(paths)
+
+        def submit_next() -> bool:
+            path = next(remaining, None)
+            if path is None:
+                return False
+            key, hit = lookup(path)
+            pending.append((key, hit if hit else pool.submit(job, path)))
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+        while pending:
+            key, item = pending.popleft()
+            result = item if isinstance(item, PreprocessResult) else store(key, item.result())
+            submit_next()
+            yield result
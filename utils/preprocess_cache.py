@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# preprocess_cache.py
+#
+# Content-addressed on-disk cache of preprocessed image payloads.
+# Entries are keyed by the source file's content hash plus the preprocessing
+# options, so a renamed or moved file still hits and a changed option misses.
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict
+from typing import Dict, Optional
+
+from utils.image_processing import ProcessedImage
+
+
+# Bump when preprocess_image output or the ProcessedImage fields change for the same options.
+# 2: dhash in the header (near-duplicate detection)
+# 3: lossless output re-downscaled until it fits max_file_size_kb
+CACHE_VERSION = 3
+CACHE_FILE_SUFFIX = ".entry"
+STATS_FILE_NAME = "stats.json"
+DEFAULT_CACHE_SIZE_MB = 256
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Altify", "preprocess_cache")
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PreprocessCache:
+    """
+    Size-bounded LRU cache of ProcessedImage results stored on disk.
+    Recency is tracked with file modification times, so it survives restarts.
+    Hit and miss counts are kept per session and accumulated in stats.json.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size_mb: float = DEFAULT_CACHE_SIZE_MB):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def key_for(self, path: str, options: Dict) -> str:
+        """Cache key for preprocessing `path` with `options` (preprocess_image kwargs)."""
+        params = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.sha256(f"{CACHE_VERSION}|{hash_file(path)}|{params}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def _entries(self):
+        """Yields (path, size, mtime) for every cache entry on disk."""
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(CACHE_FILE_SUFFIX):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, key: str) -> Optional[ProcessedImage]:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                header = json.loads(f.readline().decode("utf-8"))
+                data = f.read()
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            image = ProcessedImage(data=data, **header)
+        except TypeError:
+            # Written by a build with other fields; CACHE_VERSION should have changed.
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return image
+
+    def put(self, key: str, image: ProcessedImage) -> None:
+        header = asdict(image)
+        header.pop("data")
+        header.pop("timings")  # a later hit did not decode or encode anything
+        blob = json.dumps(header).encode("utf-8") + b"\n" + image.data
+        if len(blob) > self.max_bytes:
+            return
+
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            previous_size = os.path.getsize(entry_path) if os.path.exists(entry_path) else 0
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"Failed to write preprocess cache entry: {e}")
+            return
+
+        with self._lock:
+            self._total_bytes += len(blob) - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Removes least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for entry_path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self) -> Dict:
+        """Session and lifetime hit/miss counts plus current disk usage."""
+        lifetime = self._load_lifetime_stats()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "lifetime_hits": lifetime.get("hits", 0) + self.hits,
+                "lifetime_misses": lifetime.get("misses", 0) + self.misses,
+                "size_mb": self._total_bytes / (1024 * 1024),
+                "max_size_mb": self.max_bytes / (1024 * 1024),
+            }
+
+    def _load_lifetime_stats(self) -> Dict:
+        try:
+            with open(os.path.join(self.directory, STATS_FILE_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_stats(self) -> None:
+        """Folds this session's counters into stats.json and resets them."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            self.hits = self.misses = 0
+        if not hits and not misses:
+            return
+        lifetime = self._load_lifetime_stats()
+        lifetime["hits"] = lifetime.get("hits", 0) + hits
+        lifetime["misses"] = lifetime.get("misses", 0) + misses
+        try:
+            with open(os.path.join(self.directory, STATS_FILE_NAME), "w", encoding="utf-8") as f:
+                json.dump(lifetime, f)
+        except OSError as e:
+            print(f"Failed to save preprocess cache stats: {e}")
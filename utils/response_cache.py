@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# response_cache.py
+#
+# Persistent cache of model answers, keyed by the image bytes sent, the prompt
+# and the model. A SQLite file keeps answers across sessions; a small in-memory
+# LRU in front of it serves repeats without touching the disk. Entries expire
+# after a TTL so suggestions do not go stale forever.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.image_payload import ImagePayload
+
+
+# Bump when the stored answer format changes.
+CACHE_VERSION = 1
+CACHE_FILE_NAME = "responses.sqlite3"
+DEFAULT_TTL_HOURS = 24 * 7
+DEFAULT_MEMORY_ENTRIES = 256
+
+
+def default_cache_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Altify", CACHE_FILE_NAME)
+
+
+def model_identity(model) -> str:
+    """Stable name of a registered model, e.g. 'gemini:gemini-1.5-flash'."""
+    name = getattr(model, "model", None)
+    if not isinstance(name, str):
+        return repr(model)
+    provider_key = getattr(model, "provider_key", "")
+    return f"{provider_key}:{name}" if provider_key else name
+
+
+class ResponseCache:
+    """
+    SQLite-backed answer cache with an in-memory LRU front and a TTL.
+    Hits (memory or disk) and misses are counted per session and accumulated
+    in the database by save_stats(). Safe to share between threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_hours: float = DEFAULT_TTL_HOURS,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES):
+        self.path = path or default_cache_path()
+        self.ttl_seconds = ttl_hours * 3600
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def key_for(image: ImagePayload, prompt: str, model) -> str:
+        """Cache key for sending `image` with `prompt` to `model`."""
+        digest = hashlib.sha256(f"{CACHE_VERSION}|{model_identity(model)}|{prompt}|".encode("utf-8"))
+        digest.update(ImagePayload.coerce(image).data)
+        return digest.hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(entry[0])
+
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1]):
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            response = json.loads(row[0])
+            self._remember(key, response, row[1])
+            self.disk_hits += 1
+            return dict(response)
+
+    def put(self, key: str, model, response: Dict[str, str]) -> None:
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+                        (key, model_identity(model), json.dumps(response, ensure_ascii=False), created),
+                    )
+            except sqlite3.Error as e:
+                print(f"Failed to write response cache entry: {e}")
+
+    def _remember(self, key: str, response: Dict[str, str], created: float) -> None:
+        self._memory[key] = (dict(response), created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Deletes expired answers; returns how many were removed."""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self._lock, self._db:
+            cursor = self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict:
+        """Session and lifetime hit/miss counts plus the number of stored answers."""
+        with self._lock:
+            lifetime = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "lifetime_hits": lifetime.get("hits", 0) + hits,
+                "lifetime_misses": lifetime.get("misses", 0) + self.misses,
+                "entries": entries,
+            }
+
+    def save_stats(self) -> None:
+        """Folds this session's counters into the database and resets them."""
+        with self._lock:
+            hits, misses = self.memory_hits + self.disk_hits, self.misses
+            self.memory_hits = self.disk_hits = self.misses = 0
+            if not hits and not misses:
+                return
+            try:
+                with self._db:
+                    for name, value in (("hits", hits), ("misses", misses)):
+                        self._db.execute(
+                            "INSERT INTO stats (name, value) VALUES (?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                            (name, value),
+                        )
+            except sqlite3.Error as e:
+                print(f"Failed to save response cache stats: {e}")
+
+    def close(self) -> None:
+        self.save_stats()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# telemetry.py
+#
+# Structured per-stage timings for every generation: preprocessing (decode,
+# resize, encode), payload build, request, time to first token, parse,
+# validation and rename, plus token counts when the backend reports them.
+# Records are JSON lines in a rotating local file, tagged with the model and
+# image of the surrounding request, and can be exported as a Chrome trace
+# (chrome://tracing, Perfetto) to see where a slow batch spent its time.
+# Qt-free; preprocessing workers only measure, the parent process records.
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+TELEMETRY_FILE_NAME = "telemetry.jsonl"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+# Tags of the enclosing request, e.g. {"model": "gemini:gemini-1.5-flash", "image": "IMG_0001.jpg"}.
+# asyncio tasks and asyncio.to_thread() inherit them from the code that scheduled them.
+_tags: contextvars.ContextVar[Dict] = contextvars.ContextVar("altify_telemetry_tags", default={})
+
+# Stage timings measured where the records cannot be written (a worker process):
+# {stage: (wall-clock start, seconds)}
+StageTimings = Dict[str, Tuple[float, float]]
+
+
+def default_telemetry_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Altify", TELEMETRY_FILE_NAME)
+
+
+class StageClock:
+    """Times named stages in a worker process; the timings travel back with its result."""
+
+    def __init__(self):
+        self.timings: StageTimings = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (start, time.perf_counter() - started)
+
+
+class FirstTokenTimer:
+    """Created when a streamed request is sent; chunk() records the first chunk's arrival once."""
+
+    def __init__(self, telemetry: "Telemetry"):
+        self.telemetry = telemetry
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._seen = False
+
+    def chunk(self) -> None:
+        if not self._seen:
+            self._seen = True
+            self.telemetry.record("first_token", self.start, time.perf_counter() - self._started)
+
+
+class Telemetry:
+    def __init__(self, path: Optional[str] = None, enabled: bool = True,
+                 max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        self.path = path or default_telemetry_path()
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._handler: Optional[RotatingFileHandler] = None
+        self._logger = logging.getLogger("altify.telemetry")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool, path: Optional[str] = None) -> None:
+        """Turns recording on or off; a new path takes effect on the next record."""
+        self.enabled = enabled
+        if path is not None and path != self.path:
+            self.close()
+            self.path = path
+
+    def _open(self) -> Optional[RotatingFileHandler]:
+        with self._lock:
+            if self._handler is None:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    handler = RotatingFileHandler(
+                        self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+                    )
+                except OSError as e:
+                    logging.warning("Telemetry disabled, cannot write '%s': %s", self.path, e)
+                    self.enabled = False
+                    return None
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+                self._handler = handler
+            return self._handler
+
+    def _write(self, record: Dict) -> None:
+        if self._open() is not None:
+            self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    @contextlib.contextmanager
+    def tags(self, **tags) -> Iterator[None]:
+        """Adds `tags` to every record made inside the block (and the tasks it schedules)."""
+        token = _tags.set({**_tags.get(), **tags})
+        try:
+            yield
+        finally:
+            _tags.reset(token)
+
+    def record(self, name: str, start: float, seconds: float, **tags) -> None:
+        """One finished stage: `start` is wall-clock (time.time()), `seconds` its duration."""
+        if not self.enabled:
+            return
+        self._write({
+            "name": name,
+            "start": round(start, 6),
+            "ms": round(seconds * 1000, 3),
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            **_tags.get(),
+            **tags,
+        })
+
+    @contextlib.contextmanager
+    def span(self, name: str, **tags) -> Iterator[None]:
+        """Records the block's duration as stage `name`; a raised exception is noted as "error"."""
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.record(name, start, time.perf_counter() - started, error=type(e).__name__, **tags)
+            raise
+        self.record(name, start, time.perf_counter() - started, **tags)
+
+    def record_stages(self, timings: StageTimings, **tags) -> None:
+        for name, (start, seconds) in timings.items():
+            self.record(name, start, seconds, **tags)
+
+    def first_token_timer(self) -> FirstTokenTimer:
+        return FirstTokenTimer(self)
+
+    def tokens(self, prompt_tokens: Optional[int], response_tokens: Optional[int]) -> None:
+        """Token counts of the current request, when the backend reports them."""
+        if prompt_tokens is None and response_tokens is None:
+            return
+        self.record("tokens", time.time(), 0.0, prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handler is not None:
+                self._logger.removeHandler(self._handler)
+                self._handler.close()
+                self._handler = None
+
+
+# Off until the app enables it from Config, so scripts and benchmarks write nothing by default.
+telemetry = Telemetry(enabled=False)
+
+
+def read_records(path: Optional[str] = None) -> List[Dict]:
+    """All records of the log and its rotated backups, oldest file first."""
+    path = path or telemetry.path
+    files = [f"{path}.{index}" for index in range(telemetry.backup_count, 0, -1)] + [path]
+    records = []
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by a crash
+    return records
+
+
+_TRACE_FIELDS = {"name", "start", "ms", "pid", "thread"}
+
+
+def export_chrome_trace(output_path: str, path: Optional[str] = None) -> int:
+    """
+    Writes the telemetry log as a Chrome trace (Trace Event Format) and returns
+    the number of events. Each image (or thread, outside batches) gets its own
+    row, with the model, sizes and token counts as event arguments.
+    """
+    events = []
+    lanes: Dict[Tuple[int, str], int] = {}
+    for record in read_records(path):
+        pid = record.get("pid", 0)
+        lane = record.get("image") or record.get("thread", "main")
+        if (pid, lane) not in lanes:
+            lanes[(pid, lane)] = len(lanes) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": lanes[(pid, lane)],
+                           "args": {"name": lane}})
+        args = {key: value for key, value in record.items() if key not in _TRACE_FIELDS}
+        event = {
+            "name": record["name"],
+            "cat": record.get("model", "app"),
+            "ts": record["start"] * 1e6,
+            "pid": pid,
+            "tid": lanes[(pid, lane)],
+            "args": args,
+        }
+        if record["name"] == "tokens":
+            event.update(ph="i", s="t")
+        else:
+            event.update(ph="X", dur=record["ms"] * 1000)
+        events.append(event)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events) - len(lanes)
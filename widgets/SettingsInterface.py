@@ -1,14 +1,19 @@
+import sqlite3
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QFileDialog
 )
 from qfluentwidgets import (
-    ComboBox, PasswordLineEdit, CaptionLabel, TitleLabel,
-    SubtitleLabel, setFont, PushButton, InfoBar, InfoBarPosition
+    ComboBox, LineEdit, PasswordLineEdit, CaptionLabel, TitleLabel,
+    SubtitleLabel, setFont, PushButton, InfoBar, InfoBarPosition, SwitchButton, SpinBox
 )
 from PySide6.QtGui import QFont
 from utils.config import Config
 from utils.constants import Constants
+from utils.preprocess_cache import PreprocessCache
+from utils.response_cache import ResponseCache
+from utils.telemetry import export_chrome_trace, telemetry
+from services.client_pool import client_pool
 
 
 class SettingsInterface(QWidget):
@@ -24,6 +29,9 @@ class SettingsInterface(QWidget):
         self._add_model_selection_widgets()
         self._add_api_key_widgets()
         self._add_dp_user_pass_widgets()
+        self._add_local_model_widgets()
+        self._add_cache_stats_widgets()
+        self._add_telemetry_widgets()
         self._add_save_button()
         self._connect_signals()
 
@@ -56,6 +64,64 @@ class SettingsInterface(QWidget):
         model_layout.addWidget(self.model_combo)
         self.main_layout.addLayout(model_layout)
 
+        hedge_layout = QHBoxLayout()
+        self.hedging_switch = SwitchButton(self)
+        self.hedging_switch.setText("Race a backup model when the selected one is slow")
+        hedge_model_label = CaptionLabel("Backup Model:")
+        self.hedge_model_combo = ComboBox()
+        self.hedge_model_combo.addItems(Constants.AI_MODELS_DICT.keys())
+        self.hedge_model_combo.setFixedHeight(30)
+        hedge_layout.addWidget(self.hedging_switch)
+        hedge_layout.addStretch(1)
+        hedge_layout.addWidget(hedge_model_label)
+        hedge_layout.addWidget(self.hedge_model_combo)
+        self.main_layout.addLayout(hedge_layout)
+
+        fallback_layout = QHBoxLayout()
+        fallback_label = CaptionLabel("Fallback Models:")
+        self.fallback_models_edit = LineEdit()
+        self.fallback_models_edit.setPlaceholderText("Model names tried in order when the selected one fails, comma-separated")
+        self.fallback_models_edit.setFixedHeight(30)
+        fallback_layout.addWidget(fallback_label)
+        fallback_layout.addWidget(self.fallback_models_edit)
+        self.main_layout.addLayout(fallback_layout)
+
+        auto_layout = QHBoxLayout()
+        auto_label = CaptionLabel("Auto Candidates:")
+        self.auto_models_edit = LineEdit()
+        self.auto_models_edit.setPlaceholderText(
+            f"Models \"{Constants.AUTO_MODEL_NAME}\" may pick from, comma-separated (empty: all)"
+        )
+        self.auto_models_edit.setFixedHeight(30)
+        auto_layout.addWidget(auto_label)
+        auto_layout.addWidget(self.auto_models_edit)
+        self.main_layout.addLayout(auto_layout)
+
+        validation_layout = QHBoxLayout()
+        self.validation_switch = SwitchButton(self)
+        self.validation_switch.setText("Check suggestions locally and re-ask the failing ones (extra requests)")
+        tolerance_label = CaptionLabel("Length Tolerance (chars):")
+        self.length_tolerance_spin = SpinBox(self)
+        self.length_tolerance_spin.setRange(0, 100)
+        followups_label = CaptionLabel("Re-asks per Batch:")
+        self.max_followups_spin = SpinBox(self)
+        self.max_followups_spin.setRange(0, 1000)
+        validation_layout.addWidget(self.validation_switch)
+        validation_layout.addStretch(1)
+        validation_layout.addWidget(tolerance_label)
+        validation_layout.addWidget(self.length_tolerance_spin)
+        validation_layout.addWidget(followups_label)
+        validation_layout.addWidget(self.max_followups_spin)
+        self.main_layout.addLayout(validation_layout)
+
+        timeout_layout = QHBoxLayout()
+        timeout_label = CaptionLabel("Request Timeout (s):")
+        self.request_timeout_spin = SpinBox(self)
+        self.request_timeout_spin.setRange(10, 600)
+        timeout_layout.addWidget(timeout_label)
+        timeout_layout.addWidget(self.request_timeout_spin)
+        self.main_layout.addLayout(timeout_layout)
+
     def _add_api_key_widgets(self) -> None:
         def create_key_layout(label_text, object_name, placeholder):
             layout = QHBoxLayout()
@@ -102,6 +168,131 @@ class SettingsInterface(QWidget):
         dp_pass_layout.addWidget(self.dp_password_edit)
         self.main_layout.addLayout(dp_pass_layout)
 
+    def _add_local_model_widgets(self) -> None:
+        self.main_layout.addSpacing(20)
+
+        local_section_label = SubtitleLabel("Local Model (OpenAI-compatible server)")
+        setFont(local_section_label, 14)
+        self.main_layout.addWidget(local_section_label)
+
+        def create_line_layout(label_text, placeholder):
+            layout = QHBoxLayout()
+            label = CaptionLabel(label_text)
+            line_edit = LineEdit()
+            line_edit.setPlaceholderText(placeholder)
+            line_edit.setFixedHeight(30)
+            layout.addWidget(label)
+            layout.addWidget(line_edit)
+            self.main_layout.addLayout(layout)
+            return line_edit
+
+        self.local_name_edit = create_line_layout("Display Name:", "Shown in the model lists, e.g. Llava (LAN)")
+        self.local_base_url_edit = create_line_layout("Base URL:", "e.g. http://192.168.1.20:8080/v1")
+        self.local_model_edit = create_line_layout("Model:", "Model name sent to the server")
+
+        concurrency_layout = QHBoxLayout()
+        concurrency_label = CaptionLabel("Concurrent Requests:")
+        self.local_concurrency_spin = SpinBox(self)
+        self.local_concurrency_spin.setRange(1, 16)
+        concurrency_layout.addWidget(concurrency_label)
+        concurrency_layout.addWidget(self.local_concurrency_spin)
+        self.main_layout.addLayout(concurrency_layout)
+
+    def _add_cache_stats_widgets(self) -> None:
+        self.main_layout.addSpacing(20)
+
+        cache_section_label = SubtitleLabel("Image Cache")
+        setFont(cache_section_label, 14)
+        self.main_layout.addWidget(cache_section_label)
+
+        self.cache_stats_label = CaptionLabel("")
+        self.main_layout.addWidget(self.cache_stats_label)
+
+        self.response_cache_stats_label = CaptionLabel("")
+        self.main_layout.addWidget(self.response_cache_stats_label)
+
+        self.dedupe_switch = SwitchButton(self)
+        self.dedupe_switch.setText("Reuse results for near-duplicate photos (SendTo batches)")
+        self.main_layout.addWidget(self.dedupe_switch)
+
+        images_per_call_layout = QHBoxLayout()
+        images_per_call_label = CaptionLabel("Images per request (SendTo batches):")
+        self.images_per_call_spin = SpinBox(self)
+        self.images_per_call_spin.setRange(1, 8)
+        images_per_call_layout.addWidget(images_per_call_label)
+        images_per_call_layout.addWidget(self.images_per_call_spin)
+        self.main_layout.addLayout(images_per_call_layout)
+
+    def _add_telemetry_widgets(self) -> None:
+        self.main_layout.addSpacing(20)
+
+        telemetry_section_label = SubtitleLabel("Telemetry")
+        setFont(telemetry_section_label, 14)
+        self.main_layout.addWidget(telemetry_section_label)
+
+        self.telemetry_switch = SwitchButton(self)
+        self.telemetry_switch.setText("Record per-stage timings to a local file")
+        self.main_layout.addWidget(self.telemetry_switch)
+
+        self.export_trace_button = PushButton("Export Chrome Trace...")
+        self.export_trace_button.setFixedHeight(30)
+        self.main_layout.addWidget(self.export_trace_button)
+
+    def _on_export_trace(self) -> None:
+        output_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "altify-trace.json", "Chrome trace (*.json)"
+        )
+        if not output_path:
+            return
+        try:
+            events = export_chrome_trace(output_path)
+        except (OSError, ValueError) as e:
+            InfoBar.error(
+                title="Export Failed",
+                content=str(e),
+                orient=Qt.Horizontal,
+                position=InfoBarPosition.TOP,
+                duration=5000,
+                parent=self
+            ).show()
+            return
+        InfoBar.success(
+            title="Trace Exported",
+            content=f"{events} events written; open the file in chrome://tracing or ui.perfetto.dev.",
+            orient=Qt.Horizontal,
+            position=InfoBarPosition.TOP,
+            duration=5000,
+            parent=self
+        ).show()
+
+    def _refresh_cache_stats(self) -> None:
+        try:
+            stats = PreprocessCache(max_size_mb=self.config.get_preprocess_cache_mb()).stats()
+        except OSError as e:
+            self.cache_stats_label.setText(f"Cache unavailable: {e}")
+            return
+        lookups = stats["lifetime_hits"] + stats["lifetime_misses"]
+        hit_rate = 100 * stats["lifetime_hits"] / lookups if lookups else 0
+        self.cache_stats_label.setText(
+            f"{stats['size_mb']:.1f} / {stats['max_size_mb']:.0f} MB used - "
+            f"{stats['lifetime_hits']} hits, {stats['lifetime_misses']} misses ({hit_rate:.0f}% hit rate)"
+        )
+
+    def _refresh_response_cache_stats(self) -> None:
+        try:
+            cache = ResponseCache(ttl_hours=self.config.get_response_cache_ttl_hours())
+            stats = cache.stats()
+            cache.close()
+        except (OSError, sqlite3.Error) as e:
+            self.response_cache_stats_label.setText(f"Response cache unavailable: {e}")
+            return
+        lookups = stats["lifetime_hits"] + stats["lifetime_misses"]
+        hit_rate = 100 * stats["lifetime_hits"] / lookups if lookups else 0
+        self.response_cache_stats_label.setText(
+            f"{stats['entries']} cached answers - {stats['lifetime_hits']} model calls saved, "
+            f"{stats['lifetime_misses']} misses ({hit_rate:.0f}% hit rate)"
+        )
+
     def _add_save_button(self) -> None:
         self.save_button = PushButton("Save")
         self.save_button.setObjectName("save_button")
@@ -110,20 +301,75 @@ class SettingsInterface(QWidget):
 
     def _connect_signals(self) -> None:
         self.save_button.clicked.connect(self._on_save)
+        self.export_trace_button.clicked.connect(self._on_export_trace)
 
     def load_settings(self) -> None:
         self.model_combo.setCurrentText(self.config.get_default_model())
+        self.hedging_switch.setChecked(self.config.is_hedging_enabled())
+        self.hedge_model_combo.setCurrentText(self.config.get_hedge_model())
+        self.fallback_models_edit.setText(", ".join(self.config.get_fallback_models()))
+        self.auto_models_edit.setText(", ".join(self.config.get_auto_models()))
+        self.validation_switch.setChecked(self.config.is_validation_enabled())
+        self.length_tolerance_spin.setValue(self.config.get_validation_length_tolerance())
+        self.max_followups_spin.setValue(self.config.get_validation_max_followups())
+        self.request_timeout_spin.setValue(int(self.config.get_request_timeout()))
+        self.telemetry_switch.setChecked(self.config.is_telemetry_enabled())
+        self.local_name_edit.setText(self.config.get_local_model_name())
+        self.local_base_url_edit.setText(self.config.get_local_base_url())
+        self.local_model_edit.setText(self.config.get_local_model())
+        self.local_concurrency_spin.setValue(self.config.get_local_max_concurrency())
         self.gemini_key_edit.setText(self.config.get_gemini_key())
         self.huggingface_key_edit.setText(self.config.get_huggingface_key())
         self.dp_username_edit.setText(self.config.get_dp_username())
         self.dp_password_edit.setText(self.config.get_dp_password())
+        self.dedupe_switch.setChecked(self.config.is_dedupe_enabled())
+        self.images_per_call_spin.setValue(self.config.get_images_per_call())
+        self._refresh_cache_stats()
+        self._refresh_response_cache_stats()
+
+    def _read_model_names(self, line_edit: LineEdit, warning_title: str, exclude=()) -> list:
+        """Registered model names from a comma-separated field; warns about the others."""
+        names = [name.strip() for name in line_edit.text().split(",") if name.strip()]
+        unknown_models = [name for name in names if name not in Constants.AI_MODELS_DICT or name in exclude]
+        if unknown_models:
+            InfoBar.warning(
+                title=warning_title,
+                content=f"Ignored: {', '.join(unknown_models)}",
+                orient=Qt.Horizontal,
+                position=InfoBarPosition.TOP,
+                duration=4000,
+                parent=self
+            ).show()
+        return [name for name in names if name not in unknown_models]
 
     def _on_save(self) -> None:
         self.config.set_default_model(self.model_combo.currentText())
+        self.config.set_hedging_enabled(self.hedging_switch.isChecked())
+        self.config.set_hedge_model(self.hedge_model_combo.currentText())
+        self.config.set_fallback_models(self._read_model_names(self.fallback_models_edit, "Unknown Fallback Models"))
+        self.config.set_auto_models(self._read_model_names(
+            self.auto_models_edit, "Unknown Auto Candidates", exclude=(Constants.AUTO_MODEL_NAME,)
+        ))
+        self.config.set_validation_enabled(self.validation_switch.isChecked())
+        self.config.set_validation_length_tolerance(self.length_tolerance_spin.value())
+        self.config.set_validation_max_followups(self.max_followups_spin.value())
+        self.config.set_request_timeout(float(self.request_timeout_spin.value()))
+        self.config.set_local_model_name(self.local_name_edit.text().strip())
+        self.config.set_local_base_url(self.local_base_url_edit.text().strip())
+        self.config.set_local_model(self.local_model_edit.text().strip())
+        self.config.set_local_max_concurrency(self.local_concurrency_spin.value())
         self.config.set_gemini_key(self.gemini_key_edit.text())
         self.config.set_huggingface_key(self.huggingface_key_edit.text())
+        client_pool.update_api_keys(
+            gemini=self.gemini_key_edit.text(),
+            huggingface=self.huggingface_key_edit.text(),
+        )
         self.config.set_dp_username(self.dp_username_edit.text())
         self.config.set_dp_password(self.dp_password_edit.text())
+        self.config.set_dedupe_enabled(self.dedupe_switch.isChecked())
+        self.config.set_images_per_call(self.images_per_call_spin.value())
+        self.config.set_telemetry_enabled(self.telemetry_switch.isChecked())
+        telemetry.configure(self.telemetry_switch.isChecked())
 
         InfoBar.success(
             title="Settings Saved",
@@ -1,6 +1,8 @@
+import asyncio
 import os
 import random
-from PySide6.QtCore import Qt, QTimer
+import sqlite3
+from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QFileDialog, QApplication, QCompleter
@@ -13,17 +15,61 @@ from qfluentwidgets import (PushButton, ToolButton, FluentIcon,
 from typing import List
 from utils.utils import copy_text_to_clipboard
 from utils.constants import Constants
+from utils.config import Config
+from utils.response_cache import ResponseCache
 from .custom_widgets import DragDropLabel
 from services.fetch_dp_services import DPClient
+from services.cancellation import CancelToken, cancel_scope
 
 
 
+# How long closing the window waits for a cancelled generation to wind down.
+CLOSE_GRACE_MS = 3000
+
+
+class GenerationThread(QThread):
+    suggestionSignal = Signal(str, str)  # key, text of a suggestion that has fully streamed in
+    successSignal = Signal(dict)
+    errorSignal = Signal(str)
+    cancelledSignal = Signal()
+
+    def __init__(self, generate, parent=None):
+        super().__init__(parent)
+        self.generate = generate
+        self.cancel_token = CancelToken()
+
+    def run(self):
+        try:
+            with cancel_scope(self.cancel_token):
+                results = self.generate(self.suggestionSignal.emit)
+        except asyncio.CancelledError:
+            self.cancelledSignal.emit()
+        except Exception as e:
+            if self.cancel_token.cancelled:
+                self.cancelledSignal.emit()
+            else:
+                self.errorSignal.emit(str(e))
+        else:
+            self.successSignal.emit(results)
+
+    def cancel(self):
+        """The model call in progress gives up within services.cancellation.CANCEL_POLL_SECONDS."""
+        self.cancel_token.cancel()
+
+
 class AltTextAiInterface(QWidget):
 
     def __init__(self, parent: QWidget = None) -> None:
         super().__init__(parent)
         self.result_items: List[BodyLabel] = []
         self.loading_infobar = None
+        self.generation_thread = None
+        self._streamed_keys: List[str] = []
+        try:
+            self.response_cache = ResponseCache(ttl_hours=Config().get_response_cache_ttl_hours())
+        except (OSError, sqlite3.Error) as e:
+            print(f"Response cache unavailable: {e}")
+            self.response_cache = None
         self._setup_ui() # self.drag_drop_area will be initialized here
 
     def _setup_ui(self) -> None:
@@ -145,6 +191,9 @@ class AltTextAiInterface(QWidget):
         ai_model_label = CaptionLabel("AI Model:")
         self.ai_model_combo = ComboBox()
         self.ai_model_combo.addItems(Constants.AI_MODELS_DICT.keys())
+        default_model = Config().get_default_model()
+        if default_model in Constants.AI_MODELS_DICT:
+            self.ai_model_combo.setCurrentText(default_model)
         self.ai_model_combo.setFixedHeight(30)
         consolidated_settings_line.addWidget(ai_model_label)
         consolidated_settings_line.addWidget(self.ai_model_combo)
@@ -215,21 +264,40 @@ class AltTextAiInterface(QWidget):
         self.bottom_layout.addLayout(self.results_layout)
 
     def _add_regenerate_button(self) -> None:
-        """Adds the regenerate button."""
+        """Adds the regenerate and new suggestions buttons."""
         self.regenerate_btn = PushButton("Regenerate")
         self.regenerate_btn.setFixedHeight(36)
         self.regenerate_btn.clicked.connect(self.regenerate_results_with_loading)
         self.bottom_layout.addWidget(self.regenerate_btn)
 
+        self.new_suggestions_btn = PushButton("New Suggestions")
+        self.new_suggestions_btn.setFixedHeight(36)
+        self.new_suggestions_btn.setToolTip("Ask the AI again instead of reusing the cached answer")
+        self.new_suggestions_btn.clicked.connect(self.new_suggestions_with_loading)
+        self.bottom_layout.addWidget(self.new_suggestions_btn)
+
+        self.cancel_btn = PushButton("Cancel")
+        self.cancel_btn.setFixedHeight(36)
+        self.cancel_btn.clicked.connect(self._cancel_generation)
+        self.cancel_btn.hide()
+        self.bottom_layout.addWidget(self.cancel_btn)
+
     def _connect_signals(self) -> None:
         """Connects signals to their respective slots if not connected directly at creation."""
         self.sage_code_input.searchButton.clicked.connect(self._search_sage_code)
         self.sage_code_input.returnPressed.connect(self._search_sage_code)
+        self.ai_model_combo.currentTextChanged.connect(self._on_model_changed)
+        self._on_model_changed(self.ai_model_combo.currentText())
+
+    def _on_model_changed(self, model_name: str) -> None:
+        """Preprocesses the loaded image with the selected model's image profile."""
+        self.drag_drop_area.set_image_profile(Constants.get_image_profile(model_name))
 
 
     def _set_ui_enabled_state(self, enable: bool) -> None:
         """Enables or disables key UI elements during operations."""
         self.regenerate_btn.setEnabled(enable)
+        self.new_suggestions_btn.setEnabled(enable)
         self.activity_input.setEnabled(enable)
         self.address_input.setEnabled(enable)
         self.keywords_input.setEnabled(enable)
@@ -337,8 +405,8 @@ class AltTextAiInterface(QWidget):
 
             if hasattr(self, 'drag_drop_area'):
                 self.drag_drop_area.current_original_image_path = new_path
-                # Optionally clear processed base64 if needed
-                # self.drag_drop_area.current_processed_image_base64 = ""
+                # Optionally clear the processed payload if needed
+                # self.drag_drop_area.current_image_payload = None
 
             InfoBar.success(
                 title="File Renamed!",
@@ -371,6 +439,11 @@ class AltTextAiInterface(QWidget):
         # Simulate AI processing delay
         QTimer.singleShot(100, self._run_generation_logic)# Reduced delay for quicker testing
 
+    def new_suggestions_with_loading(self) -> None:
+        """Like regenerate_results_with_loading, but skips the response cache."""
+        self._show_loading_infobar("Generating Alt Text...", "Please wait while the AI generates new suggestions.")
+        QTimer.singleShot(100, lambda: self._run_generation_logic(bypass_cache=True))
+
     def _construct_prompt(self) -> str:
         """Constructs a prompt from the user input."""
         parts = []
@@ -396,50 +469,126 @@ class AltTextAiInterface(QWidget):
 
         return " | ".join(parts) if parts else "Describe the image."
 
-    def _run_generation_logic(self) -> None:
-        """Runs the alt text generation and updates the UI."""
+    def _run_generation_logic(self, bypass_cache: bool = False) -> None:
+        """Starts the alt text generation; suggestions fill the labels as they stream in."""
         try:
             prompt = self._construct_prompt()
 
-            if not hasattr(self, 'drag_drop_area') or not self.drag_drop_area.current_processed_image_base64:
+            if hasattr(self, 'drag_drop_area') and self.drag_drop_area.is_loading:
+                raise ValueError("The image is still being processed. Please try again in a moment.")
+            if not hasattr(self, 'drag_drop_area') or not self.drag_drop_area.current_image_payload:
                 raise ValueError("No image uploaded or processed. Please upload an image first.")
 
             # Get the selected AI model
             selected_model = self.ai_model_combo.currentText()
-            model = Constants.AI_MODELS_DICT.get(selected_model, "gemini-1.5-pro")
+            model = Constants.get_model(selected_model)
+            image = self.drag_drop_area.current_image_payload
+        except Exception as e:
+            self._on_generation_error(str(e))
+            return
 
-            results = model(input_json=prompt, base64_image_str=self.drag_drop_area.current_processed_image_base64)
+        self._streamed_keys = []
+        for label in self.result_items:
+            label.setText("...")
 
-            for i, (key, value) in enumerate(results.items()):
-                if i < len(self.result_items):
-                    self.result_items[i].setText(value)
-                else:
-                    # If there are more results than labels, we can either ignore or create new labels
-                    new_label = BodyLabel(value)
-                    new_label.setWordWrap(True)
-                    self.results_layout.addWidget(new_label)
-                    self.result_items.append(new_label)
+        self.generation_thread = GenerationThread(
+            lambda on_suggestion: self._generate_with_cache(model, image, prompt, on_suggestion, bypass_cache), self
+        )
+        self.generation_thread.suggestionSignal.connect(self._on_suggestion_streamed)
+        self.generation_thread.successSignal.connect(self._on_generation_success)
+        self.generation_thread.errorSignal.connect(self._on_generation_error)
+        self.generation_thread.cancelledSignal.connect(self._on_generation_cancelled)
+        self.generation_thread.start()
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.show()
+
+    def _cancel_generation(self) -> None:
+        if self.generation_thread is not None and self.generation_thread.isRunning():
+            self.cancel_btn.setEnabled(False)
+            self.generation_thread.cancel()
+
+    def stop_generation(self) -> None:
+        """Called when the window closes: cancels a running generation and waits briefly for it."""
+        if self.generation_thread is not None and self.generation_thread.isRunning():
+            self.generation_thread.cancel()
+            self.generation_thread.wait(CLOSE_GRACE_MS)
+
+    def _on_suggestion_streamed(self, key: str, text: str) -> None:
+        """Shows a suggestion as soon as its text is complete."""
+        if key not in self._streamed_keys:
+            self._streamed_keys.append(key)
+        index = self._streamed_keys.index(key)
+        if index < len(self.result_items):
+            self.result_items[index].setText(text)
+
+    def _on_generation_success(self, results: dict) -> None:
+        for i, (key, value) in enumerate(results.items()):
+            if i < len(self.result_items):
+                self.result_items[i].setText(value)
+            else:
+                # If there are more results than labels, we can either ignore or create new labels
+                new_label = BodyLabel(value)
+                new_label.setWordWrap(True)
+                self.results_layout.addWidget(new_label)
+                self.result_items.append(new_label)
+        for label in self.result_items[len(results):]:
+            label.setText("")
 
-            InfoBar.success(
-                title="Done",
-                content="Alt text successfully generated!",
-                duration=3000,
-                position=InfoBarPosition.TOP,
-                parent=self
-            )
-        except Exception as e:
-            InfoBar.error(
-                title="Error",
-                content=str(e),
-                duration=5000,
-                position=InfoBarPosition.TOP,
-                parent=self
-            )
-        finally:
-            self._set_ui_enabled_state(True)
-            if self.loading_infobar:
-                self.loading_infobar.close()
-                self.loading_infobar = None
+        InfoBar.success(
+            title="Done",
+            content="Alt text successfully generated!",
+            duration=3000,
+            position=InfoBarPosition.TOP,
+            parent=self
+        )
+        self._finish_generation()
+
+    def _on_generation_error(self, message: str) -> None:
+        InfoBar.error(
+            title="Error",
+            content=message,
+            duration=5000,
+            position=InfoBarPosition.TOP,
+            parent=self
+        )
+        self._finish_generation()
+
+    def _on_generation_cancelled(self) -> None:
+        """Suggestions that already streamed in stay; the placeholders are cleared."""
+        for label in self.result_items[len(self._streamed_keys):]:
+            label.setText("")
+        InfoBar.warning(
+            title="Cancelled",
+            content="Generation cancelled.",
+            duration=3000,
+            position=InfoBarPosition.TOP,
+            parent=self
+        )
+        self._finish_generation()
+
+    def _finish_generation(self) -> None:
+        self.cancel_btn.hide()
+        self._set_ui_enabled_state(True)
+        if self.loading_infobar:
+            self.loading_infobar.close()
+            self.loading_infobar = None
+
+    def _generate_with_cache(self, model, image, prompt: str, on_suggestion=None, bypass_cache: bool = False):
+        """
+        Serves the answer from the response cache when possible. With
+        `bypass_cache` (New Suggestions) the model is asked again and its
+        answer replaces the cached one. Runs on the generation thread.
+        """
+        if self.response_cache is None:
+            return model(image=image, input_json=prompt, on_suggestion=on_suggestion)
+
+        key = self.response_cache.key_for(image, prompt, model)
+        results = None if bypass_cache else self.response_cache.get(key)
+        if results is None:
+            results = model(image=image, input_json=prompt, on_suggestion=on_suggestion)
+            self.response_cache.put(key, model, results)
+        self.response_cache.save_stats()
+        return results
 
     def _search_sage_code(self) -> None:
         """
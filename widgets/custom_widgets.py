@@ -1,23 +1,25 @@
 
 import os
-import base64 
-import io 
+import threading
 
-from PySide6.QtCore import Qt, QUrl
-from PySide6.QtGui import QPixmap, QImage, QDragEnterEvent, QDropEvent, QMouseEvent
+from PySide6.QtCore import Qt, QUrl, QObject, QRunnable, QSize, QThreadPool, Signal
+from PySide6.QtGui import QPixmap, QImage, QImageReader, QDragEnterEvent, QDropEvent, QMouseEvent
 from PySide6.QtWidgets import QWidget, QFileDialog, QLabel 
 from qfluentwidgets import BodyLabel, InfoBar, InfoBarPosition, isDarkTheme 
 from typing import List
-from PIL import Image
 
 
 from utils.constants import Constants 
+from utils.config import Config
+from utils.image_payload import ImagePayload
+from utils.image_processing import ImageProfile, ProcessedImage, preprocess_cached
+from utils.preprocess_cache import PreprocessCache
 
 class DragDropLabel(BodyLabel):
     """
     A QLabel subclass that accepts drag & drop of image files and allows clicking
     to open a file dialog for image selection.
-    Processed image is stored as base64.
+    Processed image is stored as an ImagePayload (encoded bytes + MIME type).
     """
 
     def __init__(self, parent: QWidget = None) -> None:
@@ -26,7 +28,17 @@ class DragDropLabel(BodyLabel):
         self._set_default_style()
         self.pixmap: QPixmap = None
         self.current_original_image_path: str = ""
-        self.current_processed_image_base64: str = "" # To store the processed image as base64
+        self.current_image_payload: ImagePayload | None = None # Processed image bytes sent to the models
+        try:
+            self.preprocess_cache = PreprocessCache(max_size_mb=Config().get_preprocess_cache_mb())
+        except OSError as e:
+            print(f"Preprocess cache unavailable: {e}")
+            self.preprocess_cache = None
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self._load_request_id = 0
+        self._active_load_task: ImageLoadTask | None = None
+        self.image_profile: ImageProfile = Constants.DEFAULT_IMAGE_PROFILE
 
     def _setup_ui(self) -> None:
         """Sets up the initial UI properties of the label."""
@@ -114,9 +126,10 @@ class DragDropLabel(BodyLabel):
 
     def load_image(self, path: str) -> None:
         """
-        Loads an image from the given path, scales it, and updates the label.
-        Attempts to process/compress the image and stores it as base64.
-        If processing fails, stores the original image as base64.
+        Starts loading the image at the given path on the thread pool.
+        A scaled preview is shown as soon as it is decoded; the processed
+        ImagePayload (or the original bytes, if processing fails) arrives later.
+        Any load still in flight for a previous file is cancelled.
         """
         if not os.path.exists(path):
             InfoBar.warning(
@@ -125,159 +138,158 @@ class DragDropLabel(BodyLabel):
             ).show()
             return
 
-        pixmap = QPixmap(path)
-        if not pixmap.isNull():
-            self._set_pixmap_from_image(pixmap)
-            self.current_original_image_path = path
-            self.current_processed_image_base64 = "" # Reset
+        if self._active_load_task is not None:
+            self._active_load_task.cancel()
 
-            processed_base64_data = self._process_and_compress_image(path)
+        self._load_request_id += 1
+        self.current_image_payload = None # Reset
+        task = ImageLoadTask(self._load_request_id, path, self.size(), self.preprocess_cache, self.image_profile)
+        task.signals.previewReady.connect(self._on_preview_ready)
+        task.signals.processed.connect(self._on_image_processed)
+        task.signals.failed.connect(self._on_image_load_failed)
+        self._active_load_task = task
+        self.thread_pool.start(task)
 
-            if processed_base64_data:
-                self.current_processed_image_base64 = processed_base64_data
-                # Success InfoBars for resize/compress are shown within _process_and_compress_image
-                # For debugging: print(f"Successfully processed image stored as base64 (first 100 chars): {self.current_processed_image_base64[:100]}")
-            else:
-                # Processing failed, attempt to load original image as base64
-                print(f"Image processing failed for '{os.path.basename(path)}'. Attempting to load and encode original image as a fallback.")
-                try:
-                    with open(path, "rb") as image_file:
-                        original_image_bytes = image_file.read()
-                    self.current_processed_image_base64 = base64.b64encode(original_image_bytes).decode('utf-8')
-                    InfoBar.warning(
-                        title="Processing Fallback",
-                        content="Image processing steps failed. Original image has been loaded as base64.",
-                        orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3500, parent=self.window()
-                    ).show()
-                    # For debugging: print(f"Fallback: Original image stored as base64 (first 100 chars): {self.current_processed_image_base64[:100]}")
-                except Exception as e_fallback:
-                    self.current_processed_image_base64 = "" # Ensure it's cleared if fallback also fails
-                    InfoBar.error(
-                        title="Image Load Failed",
-                        content=f"Could not load or process the image. Error: {e_fallback}",
-                        orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=4000, parent=self.window()
-                    ).show()
-                    print(f"Error during fallback to load original image '{os.path.basename(path)}': {e_fallback}")
-        else:
+    def set_image_profile(self, profile: ImageProfile) -> None:
+        """Switches the preprocessing profile, re-processing the current image if it differs."""
+        if profile == self.image_profile:
+            return
+        self.image_profile = profile
+        if self.current_original_image_path and os.path.exists(self.current_original_image_path):
+            self.load_image(self.current_original_image_path)
+
+    @property
+    def is_loading(self) -> bool:
+        """True while a dropped image is still being decoded or processed."""
+        return self._active_load_task is not None
+
+    def _is_stale(self, request_id: int) -> bool:
+        return request_id != self._load_request_id
+
+    def _on_preview_ready(self, request_id: int, image: QImage, path: str) -> None:
+        if self._is_stale(request_id):
+            return
+        self._set_pixmap_from_image(QPixmap.fromImage(image))
+        self.current_original_image_path = path
+
+    def _on_image_load_failed(self, request_id: int, path: str, message: str) -> None:
+        if self._is_stale(request_id):
+            return
+        self._active_load_task = None
+        self.current_image_payload = None # Ensure cleared if not a valid image
+        InfoBar.warning(
+            title="Invalid Image", content=f"The file '{os.path.basename(path)}' is not a valid image.",
+            orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
+        ).show()
+        print(f"Failed to load '{os.path.basename(path)}': {message}")
+
+    def _on_image_processed(self, request_id: int, path: str, processed, fallback_payload, error: str) -> None:
+        if self._is_stale(request_id):
+            return
+        self._active_load_task = None
+
+        if processed is not None:
+            self.current_image_payload = processed.to_payload()
+            self._show_processing_infobars(processed)
+        elif fallback_payload is not None:
+            print(f"Image processing failed for '{os.path.basename(path)}': {error}. Using the original image as a fallback.")
+            self.current_image_payload = fallback_payload
             InfoBar.warning(
-                title="Invalid Image", content=f"The file '{os.path.basename(path)}' is not a valid image.",
+                title="Processing Fallback",
+                content="Image processing steps failed. Original image has been loaded instead.",
+                orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3500, parent=self.window()
+            ).show()
+        else:
+            self.current_image_payload = None # Ensure it's cleared if fallback also fails
+            InfoBar.error(
+                title="Image Load Failed",
+                content=f"Could not load or process the image. Error: {error}",
+                orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=4000, parent=self.window()
+            ).show()
+            print(f"Error during fallback to load original image '{os.path.basename(path)}': {error}")
+
+    def _show_processing_infobars(self, processed: ProcessedImage) -> None:
+        """Shows InfoBars for the resize/compression steps applied to the image."""
+        if processed.resized:
+            InfoBar.info(
+                title="Image Resized",
+                content=f"Dimensions reduced to {processed.width}x{processed.height}.",
                 orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
             ).show()
-            self.current_processed_image_base64 = "" # Ensure cleared if not a valid pixmap
 
-    def _process_and_compress_image(self, original_path: str) -> str | None:
-        """
-        Attempts to process an image (resize, compress) and returns it as a base64 string.
-        Shows InfoBars for successful resize/compression steps.
-        Returns the base64 string of the processed image, or None on any processing failure.
-        """
-        try:
-            img = Image.open(original_path)
-            original_format = img.format 
-            
-            if original_format == 'JPEG':
-                if img.mode == 'RGBA' or img.mode == 'P':
-                    img = img.convert('RGB')
-            elif img.mode == 'P' and original_format != 'GIF':
-                 img = img.convert('RGBA' if original_format == 'PNG' else 'RGB')
-            elif img.mode == 'LA': 
-                img = img.convert('RGBA')
-
-            original_size_kb = os.path.getsize(original_path) / 1024
-            original_width, original_height = img.size
-
-            needs_resize = original_width > Constants.MAX_DIMENSION or \
-                           original_height > Constants.MAX_DIMENSION
-            
-            temp_buffer_for_size_check = io.BytesIO()
-            img_for_size_check = img.copy()
-
-            if needs_resize:
-                scaling_factor = min(Constants.MAX_DIMENSION / original_width,
-                                     Constants.MAX_DIMENSION / original_height)
-                new_width = int(original_width * scaling_factor)
-                new_height = int(original_height * scaling_factor)
-                img_for_size_check = img_for_size_check.resize((new_width, new_height), Image.LANCZOS)
-            
-            try:
-                save_format_check = original_format if original_format in ['PNG', 'JPEG', 'GIF', 'BMP'] else 'PNG'
-                if save_format_check == 'JPEG' and img_for_size_check.mode == 'RGBA':
-                     img_for_size_check_converted = img_for_size_check.convert('RGB')
-                     img_for_size_check_converted.save(temp_buffer_for_size_check, format='JPEG')
-                else:
-                    img_for_size_check.save(temp_buffer_for_size_check, format=save_format_check)
-                current_size_kb = len(temp_buffer_for_size_check.getvalue()) / 1024
-            except Exception as e_save_check:
-                print(f"Size check save failed for format {original_format}: {e_save_check}. Falling back to PNG for size check.")
-                temp_buffer_for_size_check = io.BytesIO() 
-                img_for_size_check.save(temp_buffer_for_size_check, format='PNG') 
-                current_size_kb = len(temp_buffer_for_size_check.getvalue()) / 1024
-                original_format = 'PNG' 
-            
-            needs_compress = current_size_kb > Constants.MAX_FILE_SIZE_KB
-            
-            if needs_resize:
-                scaling_factor = min(Constants.MAX_DIMENSION / original_width,
-                                     Constants.MAX_DIMENSION / original_height)
-                new_width = int(original_width * scaling_factor)
-                new_height = int(original_height * scaling_factor)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+        if processed.compressed:
+            if processed.format == 'JPEG':
+                InfoBar.info(
+                    title=f"Image Compressed ({processed.format})",
+                    content=f"Size reduced from {processed.original_size_kb:.2f}KB to {processed.size_kb:.2f}KB at quality {processed.quality}.",
+                    orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
+                ).show()
+            else:
                 InfoBar.info(
-                    title="Image Resized",
-                    content=f"Dimensions reduced to {new_width}x{new_height}.",
+                    title=f"Image Processed ({processed.format})",
+                    content=f"Original: {processed.original_size_kb:.2f}KB, New: {processed.size_kb:.2f}KB.",
                     orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
                 ).show()
 
-            image_buffer = io.BytesIO()
-            final_format = original_format if original_format in ['PNG', 'JPEG', 'GIF', 'BMP'] else 'PNG'
-            
-            if final_format == 'JPEG' and img.mode in ['RGBA', 'P', 'LA']:
-                img = img.convert('RGB')
-
-            if needs_compress:
-                quality = 90 
-                if final_format == 'JPEG':
-                    while True:
-                        image_buffer.seek(0) 
-                        image_buffer.truncate() 
-                        try:
-                            img.save(image_buffer, format='JPEG', optimize=True, quality=quality)
-                            compressed_size_kb = len(image_buffer.getvalue()) / 1024
-                            if compressed_size_kb <= Constants.MAX_FILE_SIZE_KB or quality <= 10:
-                                break
-                            quality -= 10
-                        except Exception as e_jpeg_save:
-                            print(f"Error saving image at quality {quality} for JPEG: {e_jpeg_save}")
-                            image_buffer.seek(0)
-                            image_buffer.truncate()
-                            # Attempt to re-convert to RGB just in case mode was an issue for this specific save attempt
-                            img_rgb_fallback = img.convert('RGB') if img.mode != 'RGB' else img
-                            img_rgb_fallback.save(image_buffer, format='PNG') 
-                            final_format = 'PNG' 
-                            compressed_size_kb = len(image_buffer.getvalue()) / 1024
-                            print(f"JPEG save loop failed, fell back to PNG. Size: {compressed_size_kb:.2f}KB")
-                            break 
-                    
-                    InfoBar.info(
-                        title=f"Image Compressed ({final_format})",
-                        content=f"Size reduced from {original_size_kb:.2f}KB to {compressed_size_kb:.2f}KB (before base64).",
-                        orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
-                    ).show()
-                else: 
-                    img.save(image_buffer, format=final_format, optimize=True) 
-                    compressed_size_kb = len(image_buffer.getvalue()) / 1024
-                    InfoBar.info(
-                        title=f"Image Processed ({final_format})",
-                        content=f"Original: {original_size_kb:.2f}KB, New: {compressed_size_kb:.2f}KB (before base64).",
-                        orient=Qt.Horizontal, isClosable=True, position=InfoBarPosition.TOP, duration=3000, parent=self.window()
-                    ).show()
-            else: 
-                img.save(image_buffer, format=final_format)
-            
-            image_bytes = image_buffer.getvalue()
-            base64_encoded_string = base64.b64encode(image_bytes).decode('utf-8')
-            return base64_encoded_string
 
+class ImageLoadSignals(QObject):
+    previewReady = Signal(int, QImage, str)
+    processed = Signal(int, str, object, object, str)  # id, path, ProcessedImage, fallback ImagePayload, error
+    failed = Signal(int, str, str)
+
+
+class ImageLoadTask(QRunnable):
+    """
+    Decodes a scaled preview and preprocesses one image off the GUI thread.
+    Results are tagged with the request id so the label can drop stale loads;
+    cancel() makes the task stop at its next checkpoint.
+    """
+
+    def __init__(self, request_id: int, path: str, preview_size: QSize, cache: PreprocessCache | None,
+                 profile: ImageProfile):
+        super().__init__()
+        self.request_id = request_id
+        self.path = path
+        self.preview_size = preview_size
+        self.cache = cache
+        self.profile = profile
+        self.signals = ImageLoadSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def run(self) -> None:
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        source_size = reader.size()
+        if source_size.isValid() and self.preview_size.isValid():
+            # Let the decoder scale down (JPEG DCT scaling) instead of decoding full size.
+            reader.setScaledSize(source_size.scaled(self.preview_size, Qt.KeepAspectRatio))
+        preview = reader.read()
+        if self._cancelled.is_set():
+            return
+        if preview.isNull():
+            self.signals.failed.emit(self.request_id, self.path, reader.errorString())
+            return
+        self.signals.previewReady.emit(self.request_id, preview, self.path)
+
+        if self._cancelled.is_set():
+            return
+        processed, fallback_payload, error = None, None, ""
+        try:
+            processed = preprocess_cached(self.path, cache=self.cache, **self.profile.options())
         except Exception as e:
-            print(f"Error during image processing steps for '{os.path.basename(original_path)}': {e}")
-            return None
\ No newline at end of file
+            error = str(e)
+            try:
+                with open(self.path, "rb") as image_file:
+                    fallback_payload = ImagePayload(image_file.read())
+            except Exception as e_fallback:
+                error = str(e_fallback)
+        finally:
+            if self.cache is not None:
+                self.cache.save_stats()
+
+        if self._cancelled.is_set():
+            return
+        self.signals.processed.emit(self.request_id, self.path, processed, fallback_payload, error)
@@ -1,8 +1,5 @@
 import os
-import base64
-import io
-import re
-from PIL import Image
+import sqlite3
 from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
@@ -12,11 +9,17 @@ from PySide6.QtGui import QFont
 
 from qfluentwidgets import (
     PushButton, TitleLabel,
-    SubtitleLabel, setFont, LineEdit, SearchLineEdit
+    SubtitleLabel, setFont, LineEdit, SearchLineEdit, SwitchButton
 )
 from services.fetch_dp_services import DPClient
+from services.async_runner import async_runner
+from services.batching import submit_batch_generation
 from utils.constants import Constants
 from utils.config import Config
+from utils.batch_pipeline import BatchPipeline
+from utils.preprocess_cache import PreprocessCache
+from utils.response_cache import ResponseCache
+from utils.image_hashing import HASHING_AVAILABLE
 import sys
 from win10toast import ToastNotifier
 
@@ -25,77 +28,67 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-def safe_filename(text: str) -> str:
-    text = text.strip()
-    text = re.sub(r"[^\w\s-]", "", text)
-    text = re.sub(r"\s+", " ", text)
-    return text[:100]
-
+# How long closing the window waits for a cancelled batch to wind down.
+CLOSE_GRACE_MS = 3000
 
 
 class WorkerThread(QThread):
-    successSignal = Signal(int) 
+    # renamed images, unprocessed images, model calls saved by dedupe, images left untouched by a cancel
+    successSignal = Signal(int, int, int, int)
     errorSignal = Signal(str)
     finishedSignal = Signal()
 
-    def __init__(self, processed_images, default_model, prompt):
+    def __init__(self, pipeline, default_model, prompt, dedupe_threshold=None, max_in_flight=1, images_per_call=1,
+                 bypass_cache=False):
         super().__init__()
-        self.processed_images = processed_images
+        self.pipeline = pipeline
         self.default_model = default_model
         self.prompt = prompt
+        self.dedupe_threshold = dedupe_threshold
+        self.max_in_flight = max_in_flight
+        self.images_per_call = images_per_call
+        self.bypass_cache = bypass_cache
 
     def run(self):
         try:
-            for original_path, base64image in self.processed_images:
-                alt_response = self.default_model(base64_image_str=base64image, input_json=self.prompt)
-                if isinstance(alt_response, dict):
-                    alt_text = next(iter(alt_response.values()))
-                else:
-                    alt_text = alt_response
-
-                dir_name = os.path.dirname(original_path)
-                ext = os.path.splitext(original_path)[1]
-                safe_name = safe_filename(alt_text)
-                new_filename = f"{safe_name}{ext}"
-                new_file_path = os.path.join(dir_name, new_filename)
-
-
-                while os.path.exists(new_file_path):
-                    new_filename = new_filename.replace(" ", "  ")
-                    new_file_path = os.path.join(dir_name, new_filename)
-                    if " " not in new_filename:
-                        break
-
-                try:
-                    os.rename(original_path, new_file_path)
-                    print(f"Renamed '{original_path}' to '{new_file_path}'")
-                except Exception as e:
-                    print(f"Failed to rename '{original_path}' to '{new_file_path}': {e}")
-
-
-            self.successSignal.emit(len(self.processed_images))
+            report = self.pipeline.run(
+                self.default_model,
+                self.prompt,
+                self.dedupe_threshold,
+                max_in_flight=self.max_in_flight,
+                submit=submit_batch_generation,
+                images_per_call=self.images_per_call,
+                bypass_cache=self.bypass_cache,
+            )
+            self.successSignal.emit(
+                len(report.renamed), len(report.failed), report.saved_calls, len(report.cancelled)
+            )
         except Exception as e:
             self.errorSignal.emit(str(e))
         finally:
             self.finishedSignal.emit()
 
+    def cancel(self):
+        """Asks the pipeline to stop; run() then reports what was done so far."""
+        self.pipeline.cancel()
+
 
 class MiniAltInterface(QWidget):
     def __init__(self, parent: QWidget = None, image_paths=None) -> None:
         super().__init__(parent)
         self.image_paths = image_paths or []
         self.filter_image_paths()
-        self.processed_images = []  
+        self.pipeline = None
         self.config = Config()
-        self.default_model = Constants.AI_MODELS_DICT.get(self.config.get_default_model() )
+        self.default_model = Constants.get_model(self.config.get_default_model())
         self.notifier = ToastNotifier()
         self.worker = None
+        self.followups_before = 0
         self.icon_path = resource_path(os.path.join("assets", "Logo", "logo-fill.ico"))
     
 
         self.setup_ui()
-        if self.image_paths:
-            self.compress_and_store_images()
+        self.compress_and_store_images()
 
     def filter_image_paths(self):
         supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.gif' , '.webp')
@@ -165,67 +158,113 @@ class MiniAltInterface(QWidget):
         self.main_layout.addLayout(self.top_input_layout)
 
     def add_regenerate_button(self) -> None:
+        self.new_suggestions_switch = SwitchButton(self)
+        self.new_suggestions_switch.setText("New suggestions (ignore cached answers)")
+        self.main_layout.addWidget(self.new_suggestions_switch)
+
         self.regenerate_btn = PushButton("Generate Data")
         self.regenerate_btn.setFixedHeight(36)
-        self.regenerate_btn.clicked.connect(self.generate_data_with_loading)
+        self.regenerate_btn.clicked.connect(self.on_generate_clicked)
         self.main_layout.addWidget(self.regenerate_btn)
 
     def connect_signals(self) -> None:
         self.sage_code_input.searchButton.clicked.connect(self.search_sage_code)
         self.sage_code_input.returnPressed.connect(self.search_sage_code)
 
+    def on_generate_clicked(self) -> None:
+        """The button reads "Cancel" while a batch is running."""
+        if self.worker is not None and self.worker.isRunning():
+            self.cancel_generation()
+        else:
+            self.generate_data_with_loading()
+
+    def cancel_generation(self) -> None:
+        self.regenerate_btn.setText("Cancelling...")
+        self.regenerate_btn.setEnabled(False)
+        self.worker.cancel()
+
+    def stop_generation(self) -> None:
+        """Called when the window closes: cancels a running batch and waits briefly for it."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait(CLOSE_GRACE_MS)
+
     def set_ui_enabled_state(self, enable: bool) -> None:
         self.regenerate_btn.setEnabled(enable)
         self.activity_input.setEnabled(enable)
         self.address_input.setEnabled(enable)
         self.keywords_input.setEnabled(enable)
         self.sage_code_input.setEnabled(enable)
+        self.new_suggestions_switch.setEnabled(enable)
 
     def compress_and_store_images(self) -> None:
-        self.processed_images.clear()
-        for img_path in self.image_paths:
-            try:
-                img = Image.open(img_path)
-                if img.mode in ("RGBA", "P", "LA"):
-                    img = img.convert("RGB")
-                max_dim = 1024
-                w, h = img.size
-                if w > max_dim or h > max_dim:
-                    scale = min(max_dim / w, max_dim / h)
-                    new_w = int(w * scale)
-                    new_h = int(h * scale)
-                    img = img.resize((new_w, new_h), Image.LANCZOS)
-                buffer = io.BytesIO()
-                img.save(buffer, format="JPEG", optimize=True, quality=85)
-                img_bytes = buffer.getvalue()
-                b64_str = base64.b64encode(img_bytes).decode("utf-8")
-                self.processed_images.append((img_path, b64_str))
-            except Exception as e:
-                print(f"Error processing {img_path}: {e}")
+        """Starts preprocessing in the background; it runs a few images ahead of inference."""
+        try:
+            cache = PreprocessCache(max_size_mb=self.config.get_preprocess_cache_mb())
+        except OSError as e:
+            print(f"Preprocess cache unavailable: {e}")
+            cache = None
+        try:
+            response_cache = ResponseCache(ttl_hours=self.config.get_response_cache_ttl_hours())
+        except (OSError, sqlite3.Error) as e:
+            print(f"Response cache unavailable: {e}")
+            response_cache = None
+        self.pipeline = BatchPipeline(
+            self.image_paths,
+            preprocess_options={
+                **Constants.get_image_profile(self.config.get_default_model()).options(),
+                "compute_hash": self.dedupe_enabled(),
+            },
+            cache=cache,
+            response_cache=response_cache,
+        )
 
-    def generate_data_with_loading(self) -> None:
-        self.window().hide()
-        QApplication.processEvents() 
+    def dedupe_enabled(self) -> bool:
+        return HASHING_AVAILABLE and self.config.is_dedupe_enabled()
 
-        self.notifier.show_toast(
-            "Altify",
-            "Generating data in background...",
-            duration=2,
-            threaded=True,
-            icon_path=self.icon_path
-        )
+    def generate_data_with_loading(self) -> None:
+        self.set_ui_enabled_state(False)
+        self.regenerate_btn.setText("Cancel")
+        self.regenerate_btn.setEnabled(True)
+        QApplication.processEvents()
 
         prompt = self.construct_prompt()
-        self.worker = WorkerThread(self.processed_images, self.default_model, prompt)
-        self.worker.successSignal.connect(lambda count: self.on_generation_success(count))
+        dedupe_threshold = self.config.get_dedupe_threshold() if self.dedupe_enabled() else None
+        max_in_flight = self.config.get_max_concurrent_requests()
+        async_runner.set_max_concurrency(max_in_flight)
+        self.followups_before = getattr(self.default_model, "followups", 0)
+        self.worker = WorkerThread(
+            self.pipeline,
+            self.default_model,
+            prompt,
+            dedupe_threshold,
+            max_in_flight,
+            self.config.get_images_per_call(),
+            self.new_suggestions_switch.isChecked(),
+        )
+        self.worker.successSignal.connect(
+            lambda count, failed, saved_calls, cancelled: self.on_generation_success(
+                count, failed, saved_calls, cancelled
+            )
+        )
         self.worker.errorSignal.connect(lambda msg: self.on_generation_error(msg))
         self.worker.finishedSignal.connect(self.on_generation_finished)
         self.worker.start()
 
-    def on_generation_success(self, count):
+    def on_generation_success(self, count, failed=0, saved_calls=0, cancelled=0):
+        message = f"Generated data for {count} images."
+        if saved_calls:
+            message += f" {saved_calls} near-duplicates reused a previous result."
+        if failed:
+            message += f" {failed} could not be processed."
+        followups = getattr(self.default_model, "followups", 0) - self.followups_before
+        if followups:
+            message += f" {followups} answers needed a follow-up request."
+        if cancelled:
+            message = f"Cancelled. {message} {cancelled} left unchanged."
         self.notifier.show_toast(
             "Altify",
-            f"Generated data for {count} images.",
+            message,
             duration=5,
             threaded=True,
             icon_path=self.icon_path
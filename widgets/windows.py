@@ -0,0 +1,97 @@
+# Top-level windows of the full app and of the SendTo mini app. Kept out of
+# main.py, so preprocessing worker processes (which re-import __main__ on
+# Windows) do not load Qt and the provider SDKs.
+
+import os
+import sys
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QFrame, QVBoxLayout
+from PySide6.QtGui import QIcon
+from qfluentwidgets import (
+    SplitFluentWindow, FluentIcon, NavigationItemPosition, isDarkTheme, SwitchButton
+)
+from qframelesswindow import FramelessWindow
+from utils.theme_utils import apply_theme
+from widgets.altTextAiInterface import AltTextAiInterface
+from widgets.SettingsInterface import SettingsInterface
+from widgets.mini_alt import MiniAltInterface
+
+
+def resource_path(relative_path):
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+
+class HomeWidget(QFrame):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("homeInterface")
+
+        self.altTextInterface = AltTextAiInterface(self)
+
+        self.themeSwitch = SwitchButton("Dark Mode", self)
+        self.themeSwitch.setChecked(isDarkTheme())
+        self.themeSwitch.checkedChanged.connect(self.toggleTheme)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 48, 0, 0)
+        layout.addWidget(self.altTextInterface)
+        layout.addWidget(self.themeSwitch, alignment=Qt.AlignCenter)
+
+    def toggleTheme(self, checked: bool):
+        apply_theme(checked)
+
+
+class SettingsWidget(QFrame):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("settingsInterface")
+
+        self.settingsInterface = SettingsInterface(self)
+        self.settingsInterface.setObjectName("settingsInterface")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 48, 0, 0)
+        layout.addWidget(self.settingsInterface)
+
+
+class Window(SplitFluentWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle('Altify App')
+        icon_path = resource_path("assets/Logo/logo.png")
+        self.setWindowIcon(QIcon(icon_path))
+
+        self.resize(900, 700)
+
+        self.homeInterface = HomeWidget(self)
+        self.settingsInterface = SettingsWidget(self)
+        self.addSubInterface(self.homeInterface, FluentIcon.HOME, "Home")
+        self.addSubInterface(self.settingsInterface, FluentIcon.SETTING, "Settings", NavigationItemPosition.BOTTOM)
+
+    def closeEvent(self, event):
+        self.homeInterface.altTextInterface.stop_generation()
+        super().closeEvent(event)
+
+
+class MiniWindow(FramelessWindow):
+    def __init__(self, image_paths=None):
+        super().__init__()
+        self.setWindowTitle('Altify App')
+        icon_path = resource_path("assets/Logo/logo.png")
+        self.setWindowIcon(QIcon(icon_path))
+        self.setFixedSize(700, 250)
+        self.titleBar.maxBtn.hide()
+        self.titleBar.minBtn.hide()
+        self.titleBar.closeBtn.raise_()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        self.homeInterface = MiniAltInterface(self, image_paths)
+        layout.addWidget(self.homeInterface)
+
+    def closeEvent(self, event):
+        # Closing mid-batch cancels it instead of leaving a worker blocked on a socket.
+        self.homeInterface.stop_generation()
+        super().closeEvent(event)